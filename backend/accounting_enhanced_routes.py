@@ -5,11 +5,13 @@ Payment Processing, Bank Reconciliation, Expense Claims, and Budget Management
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Optional
-from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime, timezone
 import uuid
 
-from server import get_current_user, db, serialize_datetime
+from server import get_current_user, db, serialize_datetime, sequences
+from pagination import PageParams, page_params, fetch_page
+from responses import trusted_list_response
+from storage import NATIVE_DATETIMES, storage_now
 from models import User
 from accounting_enhanced_models import (
     PaymentBatch, PaymentBatchCreate, PaymentStatus,
@@ -30,6 +32,8 @@ router = APIRouter(prefix="/api/accounting", tags=["accounting-enhanced"])
 
 def prepare_for_mongo(data: dict) -> dict:
     """Prepare data for MongoDB storage by converting dates to ISO strings"""
+    if NATIVE_DATETIMES:
+        return data
     if isinstance(data.get('batch_date'), datetime):
         data['batch_date'] = data['batch_date'].isoformat()
     if isinstance(data.get('processed_date'), datetime):
@@ -83,22 +87,6 @@ def prepare_for_mongo(data: dict) -> dict:
     return data
 
 
-async def get_next_number(db: AsyncIOMotorDatabase, company_id: str, prefix: str, collection_name: str) -> str:
-    """Generate next sequential number for documents"""
-    last_doc = await db[collection_name].find_one(
-        {"company_id": company_id},
-        sort=[("created_at", -1)]
-    )
-    
-    if last_doc and last_doc.get(f"{prefix.lower()}_number"):
-        last_number = int(last_doc[f"{prefix.lower()}_number"].split("-")[1])
-        next_number = last_number + 1
-    else:
-        next_number = 1
-    
-    return f"{prefix}-{next_number:06d}"
-
-
 # ============================================================================
 # BANK ACCOUNTS
 # ============================================================================
@@ -132,17 +120,20 @@ async def create_bank_account(
 
 @router.get("/bank-accounts", response_model=List[BankAccount])
 async def get_bank_accounts(
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all bank accounts for the company"""
     if not current_user.has_permission("accounting", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view bank accounts")
     
-    accounts = await db.bank_accounts.find(
-        {"company_id": current_user.company_id}
-    ).to_list(length=None)
+    accounts = await fetch_page(
+        db.bank_accounts,
+        {"company_id": current_user.company_id},
+        "created_at", page, model=BankAccount
+    )
     
-    return [BankAccount(**account) for account in accounts]
+    return trusted_list_response(BankAccount, accounts)
 
 
 @router.get("/bank-accounts/{account_id}", response_model=BankAccount)
@@ -188,7 +179,7 @@ async def create_bank_statement(
         raise HTTPException(status_code=404, detail="Bank account not found")
     
     # Generate statement number
-    statement_number = await get_next_number(db, current_user.company_id, "STMT", "bank_statements")
+    statement_number = await sequences.next_number(current_user.company_id, "bank_statements")
     
     statement_data = BankStatement(
         id=str(uuid.uuid4()),
@@ -209,6 +200,7 @@ async def create_bank_statement(
 @router.get("/bank-statements", response_model=List[BankStatement])
 async def get_bank_statements(
     bank_account_id: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all bank statements for the company"""
@@ -219,9 +211,9 @@ async def get_bank_statements(
     if bank_account_id:
         query["bank_account_id"] = bank_account_id
     
-    statements = await db.bank_statements.find(query).to_list(length=None)
+    statements = await fetch_page(db.bank_statements, query, "created_at", page, model=BankStatement)
     
-    return [BankStatement(**stmt) for stmt in statements]
+    return trusted_list_response(BankStatement, statements)
 
 
 # ============================================================================
@@ -247,7 +239,7 @@ async def create_bank_reconciliation(
         raise HTTPException(status_code=404, detail="Bank statement not found")
     
     # Generate reconciliation number
-    recon_number = await get_next_number(db, current_user.company_id, "RECON", "bank_reconciliations")
+    recon_number = await sequences.next_number(current_user.company_id, "bank_reconciliations")
     
     # For MVP, we'll create basic reconciliation structure
     # In production, this would fetch GL transactions and match them
@@ -274,6 +266,7 @@ async def create_bank_reconciliation(
 @router.get("/bank-reconciliations", response_model=List[BankReconciliation])
 async def get_bank_reconciliations(
     bank_account_id: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all bank reconciliations"""
@@ -284,9 +277,9 @@ async def get_bank_reconciliations(
     if bank_account_id:
         query["bank_account_id"] = bank_account_id
     
-    reconciliations = await db.bank_reconciliations.find(query).to_list(length=None)
+    reconciliations = await fetch_page(db.bank_reconciliations, query, "created_at", page, model=BankReconciliation)
     
-    return [BankReconciliation(**recon) for recon in reconciliations]
+    return trusted_list_response(BankReconciliation, reconciliations)
 
 
 @router.post("/bank-reconciliations/{recon_id}/complete")
@@ -304,7 +297,7 @@ async def complete_reconciliation(
             "$set": {
                 "is_reconciled": True,
                 "reconciled_by": current_user.id,
-                "reconciled_date": datetime.now(timezone.utc).isoformat()
+                "reconciled_date": storage_now()
             }
         }
     )
@@ -326,7 +319,7 @@ async def create_expense_claim(
 ):
     """Create a new expense claim"""
     # Generate claim number
-    claim_number = await get_next_number(db, current_user.company_id, "EXP", "expense_claims")
+    claim_number = await sequences.next_number(current_user.company_id, "expense_claims")
     
     # Calculate totals
     total_amount = sum(line.amount for line in claim.lines)
@@ -360,6 +353,7 @@ async def create_expense_claim(
 async def get_expense_claims(
     employee_id: Optional[str] = None,
     status: Optional[ExpenseClaimStatus] = None,
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all expense claims"""
@@ -369,9 +363,9 @@ async def get_expense_claims(
     if status:
         query["status"] = status.value
     
-    claims = await db.expense_claims.find(query).to_list(length=None)
+    claims = await fetch_page(db.expense_claims, query, "created_at", page, model=ExpenseClaim)
     
-    return [ExpenseClaim(**claim) for claim in claims]
+    return trusted_list_response(ExpenseClaim, claims)
 
 
 @router.get("/expense-claims/{claim_id}", response_model=ExpenseClaim)
@@ -402,7 +396,7 @@ async def submit_expense_claim(
         {
             "$set": {
                 "status": ExpenseClaimStatus.SUBMITTED.value,
-                "submitted_date": datetime.now(timezone.utc).isoformat()
+                "submitted_date": storage_now()
             }
         }
     )
@@ -425,7 +419,7 @@ async def approve_expense_claim(
             "$set": {
                 "status": ExpenseClaimStatus.APPROVED.value,
                 "approved_by": current_user.id,
-                "approved_date": datetime.now(timezone.utc).isoformat()
+                "approved_date": storage_now()
             }
         }
     )
@@ -450,7 +444,7 @@ async def reject_expense_claim(
                 "status": ExpenseClaimStatus.REJECTED.value,
                 "rejection_reason": reason,
                 "approved_by": current_user.id,
-                "approved_date": datetime.now(timezone.utc).isoformat()
+                "approved_date": storage_now()
             }
         }
     )
@@ -472,7 +466,7 @@ async def create_budget(
 ):
     """Create a new budget"""
     # Generate budget number
-    budget_number = await get_next_number(db, current_user.company_id, "BUD", "budgets")
+    budget_number = await sequences.next_number(current_user.company_id, "budgets")
     
     # Calculate totals
     total_budget = sum(line.budgeted_amount for line in budget.lines)
@@ -497,6 +491,7 @@ async def create_budget(
 async def get_budgets(
     fiscal_year: Optional[int] = None,
     department_id: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all budgets"""
@@ -506,9 +501,9 @@ async def get_budgets(
     if department_id:
         query["department_id"] = department_id
     
-    budgets = await db.budgets.find(query).to_list(length=None)
+    budgets = await fetch_page(db.budgets, query, "created_at", page, model=Budget)
     
-    return [Budget(**budget) for budget in budgets]
+    return trusted_list_response(Budget, budgets)
 
 
 @router.get("/budgets/{budget_id}", response_model=Budget)
@@ -569,7 +564,7 @@ async def approve_budget(
             "$set": {
                 "status": "approved",
                 "approved_by": current_user.id,
-                "approved_date": datetime.now(timezone.utc).isoformat()
+                "approved_date": storage_now()
             }
         }
     )
@@ -606,14 +601,17 @@ async def create_payment_term(
 
 @router.get("/payment-terms", response_model=List[PaymentTerm])
 async def get_payment_terms(
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all payment terms"""
-    terms = await db.payment_terms.find(
-        {"company_id": current_user.company_id, "is_active": True}
-    ).to_list(length=None)
+    terms = await fetch_page(
+        db.payment_terms,
+        {"company_id": current_user.company_id, "is_active": True},
+        "created_at", page, model=PaymentTerm
+    )
     
-    return [PaymentTerm(**term) for term in terms]
+    return trusted_list_response(PaymentTerm, terms)
 
 
 
@@ -632,7 +630,7 @@ async def create_payment_batch(
         raise HTTPException(status_code=403, detail="You don't have permission to create payment batches")
     
     # Generate batch number
-    batch_number = await get_next_number(db, current_user.current_company_id, "PBATCH", "payment_batches")
+    batch_number = await sequences.next_number(current_user.current_company_id, "payment_batches")
     
     # Calculate batch totals
     total_amount = sum(payment.amount for payment in batch.payments)
@@ -658,6 +656,7 @@ async def create_payment_batch(
 @router.get("/payment-batches", response_model=List[PaymentBatch])
 async def get_payment_batches(
     status: Optional[PaymentStatus] = None,
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all payment batches"""
@@ -668,9 +667,9 @@ async def get_payment_batches(
     if status:
         query["status"] = status.value
     
-    batches = await db.payment_batches.find(query).to_list(length=None)
+    batches = await fetch_page(db.payment_batches, query, "created_at", page, model=PaymentBatch)
     
-    return [PaymentBatch(**batch) for batch in batches]
+    return trusted_list_response(PaymentBatch, batches)
 
 
 @router.get("/payment-batches/{batch_id}", response_model=PaymentBatch)
@@ -707,7 +706,7 @@ async def process_payment_batch(
         {
             "$set": {
                 "status": PaymentStatus.PROCESSING.value,
-                "processed_date": datetime.now(timezone.utc).isoformat(),
+                "processed_date": storage_now(),
                 "processed_by": current_user.id
             }
         }
@@ -733,7 +732,7 @@ async def complete_payment_batch(
         {
             "$set": {
                 "status": PaymentStatus.COMPLETED.value,
-                "completed_date": datetime.now(timezone.utc).isoformat()
+                "completed_date": storage_now()
             }
         }
     )
@@ -10,7 +10,10 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from accounting_models import *
 from models import User, UserRole
-from server import get_current_user, db, serialize_datetime, deserialize_datetime
+from server import get_current_user, db, serialize_datetime, deserialize_datetime, sequences
+from pagination import PageParams, page_params, fetch_page
+from responses import trusted_list_response
+from storage import to_storage, storage_now
 
 # Create accounting router
 accounting_router = APIRouter(prefix="/api/accounting", tags=["Accounting"])
@@ -50,6 +53,7 @@ async def create_account(account_data: AccountCreate, user: User = Depends(get_c
 async def get_chart_of_accounts(
     account_type: Optional[AccountType] = None,
     is_active: Optional[bool] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get chart of accounts"""
@@ -65,12 +69,9 @@ async def get_chart_of_accounts(
     if is_active is not None:
         query["is_active"] = is_active
     
-    accounts_list = await db.accounts.find(query, {"_id": 0}).sort("account_code", 1).to_list(1000)
+    accounts_list = await fetch_page(db.accounts, query, "account_code", page, model=Account)
     
-    for account in accounts_list:
-        deserialize_datetime(account, ['created_at', 'updated_at'])
-    
-    return accounts_list
+    return trusted_list_response(Account, accounts_list)
 
 @accounting_router.get("/chart-of-accounts/{account_id}", response_model=Account)
 async def get_account(account_id: str, user: User = Depends(get_current_user)):
@@ -103,7 +104,7 @@ async def update_account(account_id: str, account_data: dict, user: User = Depen
     if not account_doc:
         raise HTTPException(status_code=404, detail="Account not found")
     
-    account_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    account_data['updated_at'] = storage_now()
     serialize_datetime(account_data)
     
     await db.accounts.update_one({"id": account_id}, {"$set": account_data})
@@ -134,8 +135,7 @@ async def create_journal_entry(entry_data: JournalEntryCreate, user: User = Depe
         raise HTTPException(status_code=400, detail=f"Debits ({total_debit}) must equal credits ({total_credit})")
     
     # Generate entry number
-    count = await db.journal_entries.count_documents({"company_id": user.current_company_id})
-    entry_number = f"JE-{count + 1:06d}"
+    entry_number = await sequences.next_number(user.current_company_id, "journal_entries")
     
     entry_obj = JournalEntry(
         **entry_data.model_dump(),
@@ -157,6 +157,7 @@ async def get_journal_entries(
     status: Optional[JournalEntryStatus] = None,
     from_date: Optional[datetime] = None,
     to_date: Optional[datetime] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get journal entries"""
@@ -170,19 +171,16 @@ async def get_journal_entries(
     if status:
         query["status"] = status
     if from_date:
-        query["entry_date"] = {"$gte": from_date.isoformat()}
+        query["entry_date"] = {"$gte": to_storage(from_date)}
     if to_date:
         if "entry_date" in query:
-            query["entry_date"]["$lte"] = to_date.isoformat()
+            query["entry_date"]["$lte"] = to_storage(to_date)
         else:
-            query["entry_date"] = {"$lte": to_date.isoformat()}
-    
-    entries_list = await db.journal_entries.find(query, {"_id": 0}).sort("entry_date", -1).to_list(1000)
+            query["entry_date"] = {"$lte": to_storage(to_date)}
     
-    for entry in entries_list:
-        deserialize_datetime(entry, ['entry_date', 'posting_date', 'reversal_date', 'created_at', 'updated_at'])
+    entries_list = await fetch_page(db.journal_entries, query, "entry_date", page, direction=-1, model=JournalEntry)
     
-    return entries_list
+    return trusted_list_response(JournalEntry, entries_list)
 
 @accounting_router.post("/journal-entries/{entry_id}/post")
 async def post_journal_entry(entry_id: str, user: User = Depends(get_current_user)):
@@ -224,7 +222,7 @@ async def post_journal_entry(entry_id: str, user: User = Depends(get_current_use
         
         await db.accounts.update_one(
             {"id": line['account_id']},
-            {"$set": {"current_balance": new_balance, "updated_at": datetime.now(timezone.utc).isoformat()}}
+            {"$set": {"current_balance": new_balance, "updated_at": storage_now()}}
         )
     
     # Update entry status
@@ -232,9 +230,9 @@ async def post_journal_entry(entry_id: str, user: User = Depends(get_current_use
         {"id": entry_id},
         {"$set": {
             "status": JournalEntryStatus.POSTED,
-            "posting_date": datetime.now(timezone.utc).isoformat(),
+            "posting_date": storage_now(),
             "posted_by": user.username,
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "updated_at": storage_now()
         }}
     )
     
@@ -273,6 +271,7 @@ async def create_vendor(vendor_data: VendorCreate, user: User = Depends(get_curr
 async def get_vendors(
     is_active: Optional[bool] = None,
     vendor_type: Optional[VendorType] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get vendors list"""
@@ -288,12 +287,9 @@ async def get_vendors(
     if vendor_type:
         query["vendor_type"] = vendor_type
     
-    vendors_list = await db.vendors.find(query, {"_id": 0}).sort("vendor_name", 1).to_list(1000)
-    
-    for vendor in vendors_list:
-        deserialize_datetime(vendor, ['created_at', 'updated_at'])
+    vendors_list = await fetch_page(db.vendors, query, "vendor_name", page, model=Vendor)
     
-    return vendors_list
+    return trusted_list_response(Vendor, vendors_list)
 
 
 # ============================================================================
@@ -315,8 +311,7 @@ async def create_vendor_bill(bill_data: VendorBillCreate, user: User = Depends(g
         raise HTTPException(status_code=404, detail="Vendor not found")
     
     # Generate bill number
-    count = await db.vendor_bills.count_documents({"company_id": user.current_company_id})
-    bill_number = f"BILL-{count + 1:06d}"
+    bill_number = await sequences.next_number(user.current_company_id, "vendor_bills")
     
     # Calculate totals
     subtotal = sum(line.amount for line in bill_data.lines)
@@ -352,6 +347,7 @@ async def create_vendor_bill(bill_data: VendorBillCreate, user: User = Depends(g
 async def get_vendor_bills(
     vendor_id: Optional[str] = None,
     status: Optional[BillStatus] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get vendor bills"""
@@ -367,12 +363,9 @@ async def get_vendor_bills(
     if status:
         query["status"] = status
     
-    bills_list = await db.vendor_bills.find(query, {"_id": 0}).sort("bill_date", -1).to_list(1000)
+    bills_list = await fetch_page(db.vendor_bills, query, "bill_date", page, direction=-1, model=VendorBill)
     
-    for bill in bills_list:
-        deserialize_datetime(bill, ['bill_date', 'due_date', 'approved_date', 'created_at', 'updated_at'])
-    
-    return bills_list
+    return trusted_list_response(VendorBill, bills_list)
 
 
 # ============================================================================
@@ -407,6 +400,7 @@ async def create_customer(customer_data: CustomerCreate, user: User = Depends(ge
 async def get_customers(
     is_active: Optional[bool] = None,
     customer_type: Optional[CustomerType] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get customers list"""
@@ -422,12 +416,9 @@ async def get_customers(
     if customer_type:
         query["customer_type"] = customer_type
     
-    customers_list = await db.customers.find(query, {"_id": 0}).sort("customer_name", 1).to_list(1000)
-    
-    for customer in customers_list:
-        deserialize_datetime(customer, ['created_at', 'updated_at'])
+    customers_list = await fetch_page(db.customers, query, "customer_name", page, model=Customer)
     
-    return customers_list
+    return trusted_list_response(Customer, customers_list)
 
 
 # ============================================================================
@@ -449,8 +440,7 @@ async def create_ar_invoice(invoice_data: ARInvoiceCreate, user: User = Depends(
         raise HTTPException(status_code=404, detail="Customer not found")
     
     # Generate invoice number
-    count = await db.ar_invoices.count_documents({"company_id": user.current_company_id})
-    invoice_number = f"INV-{count + 1:06d}"
+    invoice_number = await sequences.next_number(user.current_company_id, "ar_invoices")
     
     # Calculate totals
     subtotal = sum(line.amount for line in invoice_data.lines)
@@ -486,6 +476,7 @@ async def create_ar_invoice(invoice_data: ARInvoiceCreate, user: User = Depends(
 async def get_ar_invoices(
     customer_id: Optional[str] = None,
     status: Optional[ARInvoiceStatus] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get AR invoices"""
@@ -501,12 +492,9 @@ async def get_ar_invoices(
     if status:
         query["status"] = status
     
-    invoices_list = await db.ar_invoices.find(query, {"_id": 0}).sort("invoice_date", -1).to_list(1000)
+    invoices_list = await fetch_page(db.ar_invoices, query, "invoice_date", page, direction=-1, model=ARInvoice)
     
-    for invoice in invoices_list:
-        deserialize_datetime(invoice, ['invoice_date', 'due_date', 'sent_date', 'created_at', 'updated_at'])
-    
-    return invoices_list
+    return trusted_list_response(ARInvoice, invoices_list)
 
 
 # ============================================================================
@@ -549,6 +537,7 @@ async def create_fixed_asset(asset_data: FixedAssetCreate, user: User = Depends(
 async def get_fixed_assets(
     status: Optional[AssetStatus] = None,
     category: Optional[AssetCategory] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get fixed assets"""
@@ -564,15 +553,9 @@ async def get_fixed_assets(
     if category:
         query["asset_category"] = category
     
-    assets_list = await db.fixed_assets.find(query, {"_id": 0}).sort("asset_code", 1).to_list(1000)
-    
-    for asset in assets_list:
-        deserialize_datetime(asset, [
-            'purchase_date', 'depreciation_start_date', 'disposal_date',
-            'last_maintenance_date', 'next_maintenance_date', 'created_at', 'updated_at'
-        ])
+    assets_list = await fetch_page(db.fixed_assets, query, "asset_code", page, model=FixedAsset)
     
-    return assets_list
+    return trusted_list_response(FixedAsset, assets_list)
 
 
 # ============================================================================
@@ -598,6 +581,7 @@ async def create_tax_config(tax_data: TaxConfigurationCreate, user: User = Depen
 @accounting_router.get("/tax-configuration", response_model=List[TaxConfiguration])
 async def get_tax_configurations(
     is_active: Optional[bool] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get tax configurations"""
@@ -611,12 +595,9 @@ async def get_tax_configurations(
     if is_active is not None:
         query["is_active"] = is_active
     
-    tax_list = await db.tax_configuration.find(query, {"_id": 0}).to_list(100)
+    tax_list = await fetch_page(db.tax_configuration, query, "created_at", page, model=TaxConfiguration)
     
-    for tax in tax_list:
-        deserialize_datetime(tax, ['effective_from', 'effective_to', 'created_at', 'updated_at'])
-    
-    return tax_list
+    return trusted_list_response(TaxConfiguration, tax_list)
 
 
 # ============================================================================
@@ -643,6 +624,7 @@ async def create_exchange_rate(rate_data: ExchangeRateCreate, user: User = Depen
 async def get_exchange_rates(
     from_currency: Optional[str] = None,
     to_currency: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get exchange rates"""
@@ -658,12 +640,9 @@ async def get_exchange_rates(
     if to_currency:
         query["to_currency"] = to_currency
     
-    rates_list = await db.exchange_rates.find(query, {"_id": 0}).sort("effective_date", -1).to_list(1000)
-    
-    for rate in rates_list:
-        deserialize_datetime(rate, ['effective_date', 'created_at', 'updated_at'])
+    rates_list = await fetch_page(db.exchange_rates, query, "effective_date", page, direction=-1, model=ExchangeRate)
     
-    return rates_list
+    return trusted_list_response(ExchangeRate, rates_list)
 
 
 # ============================================================================
@@ -0,0 +1,152 @@
+"""
+Platform Administration API Routes
+Operational endpoints for super admins (database indexes, caches, diagnostics)
+"""
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from pymongo import ReturnDocument
+from typing import Optional
+
+from models import User, UserRole
+from server import (
+    get_current_user, db, principal_cache, company_cache, dashboard_cache,
+    invalidate_user_cache, invalidate_company_cache, invalidate_dashboard_cache, token_versions
+)
+from indexes import ensure_indexes, index_report
+import passwords
+from slow_queries import slow_operations, SLOW_OPERATIONS_COLLECTION
+from org_tree import department_tree_cache
+
+admin_router = APIRouter(prefix="/api/admin", tags=["Admin"])
+
+
+def require_superadmin(user: User = Depends(get_current_user)) -> User:
+    if user.role != UserRole.SUPERADMIN:
+        raise HTTPException(status_code=403, detail="Super admin access required")
+    return user
+
+
+# ============================================================================
+# DATABASE INDEXES
+# ============================================================================
+
+@admin_router.get("/indexes")
+async def get_index_report(user: User = Depends(require_superadmin)):
+    """Report missing, unmanaged and unused indexes against the registry"""
+    return await index_report(db)
+
+
+@admin_router.post("/indexes/reconcile")
+async def reconcile_indexes(user: User = Depends(require_superadmin)):
+    """Create any registry index that is missing"""
+    return await ensure_indexes(db)
+
+
+# ============================================================================
+# CACHES
+# ============================================================================
+
+@admin_router.get("/caches")
+async def get_cache_stats(user: User = Depends(require_superadmin)):
+    """Hit/miss statistics for in-process caches"""
+    return {
+        "principals": principal_cache.stats(),
+        "companies": company_cache.stats(),
+        "dashboard": dashboard_cache.stats(),
+        "department_tree": department_tree_cache.stats()
+    }
+
+
+@admin_router.post("/caches/invalidate")
+async def invalidate_caches(
+    username: Optional[str] = None,
+    company_id: Optional[str] = None,
+    user: User = Depends(require_superadmin)
+):
+    """Invalidate cached principals after out-of-band user or company changes.
+
+    Without parameters every cached principal and company is dropped.
+    """
+    if username is None and company_id is None:
+        principal_cache.clear()
+        company_cache.clear()
+        dashboard_cache.clear()
+        department_tree_cache.clear()
+        return {"success": True, "message": "All caches cleared"}
+    if username:
+        invalidate_user_cache(username=username)
+    if company_id:
+        invalidate_company_cache(company_id)
+        invalidate_dashboard_cache(company_id)
+        department_tree_cache.invalidate_where(lambda key, value: key[0] == company_id)
+    return {"success": True, "message": "Cache entries invalidated"}
+
+
+# ============================================================================
+# TOKENS
+# ============================================================================
+
+@admin_router.get("/tokens")
+async def get_token_stats(user: User = Depends(require_superadmin)):
+    """Embedded-claims mode and revocation list status"""
+    return token_versions.stats()
+
+
+@admin_router.post("/users/{username}/revoke-tokens")
+async def revoke_user_tokens(username: str, user: User = Depends(require_superadmin)):
+    """Revoke every token issued to a user by bumping their token version.
+
+    Use after changing a user's role or company membership so tokens carrying
+    the old claims stop being accepted.
+    """
+    user_doc = await db.users.find_one_and_update(
+        {"username": username},
+        {"$inc": {"token_version": 1}},
+        projection={"_id": 0, "username": 1, "token_version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not user_doc:
+        raise HTTPException(status_code=404, detail="User not found")
+    token_versions.set(username, user_doc["token_version"])
+    invalidate_user_cache(username=username)
+    return {"success": True, "token_version": user_doc["token_version"]}
+
+
+# ============================================================================
+# PASSWORD HASHING
+# ============================================================================
+
+@admin_router.get("/password-hashing")
+async def get_password_hashing_stats(user: User = Depends(require_superadmin)):
+    """Throughput and queueing of the bcrypt worker pool"""
+    return passwords.stats.as_dict()
+
+
+# ============================================================================
+# SLOW OPERATIONS
+# ============================================================================
+
+@admin_router.get("/slow-operations")
+async def get_slow_operations(
+    collection: Optional[str] = None,
+    company_id: Optional[str] = None,
+    route: Optional[str] = None,
+    min_duration_ms: Optional[float] = None,
+    explained_only: bool = False,
+    limit: int = Query(50, ge=1, le=500),
+    user: User = Depends(require_superadmin)
+):
+    """Most recent slow MongoDB commands, newest first"""
+    query = {}
+    if collection:
+        query["collection"] = collection
+    if company_id:
+        query["company_id"] = company_id
+    if route:
+        query["route"] = route
+    if min_duration_ms is not None:
+        query["duration_ms"] = {"$gte": min_duration_ms}
+    if explained_only:
+        query["explain"] = {"$ne": None}
+    operations = await db[SLOW_OPERATIONS_COLLECTION].find(query, {"_id": 0}).sort("$natural", -1).to_list(limit)
+    return {"recorder": slow_operations.stats(), "operations": operations}
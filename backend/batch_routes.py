@@ -0,0 +1,165 @@
+"""
+Batch API Routes
+Run several read requests in one round trip under a single authentication
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.security import HTTPAuthorizationCredentials
+from pydantic import BaseModel, Field
+
+from models import User
+from server import get_current_user, security, authenticated_principal
+from responses import FastJSONResponse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api", tags=["Batch"])
+
+# Most sub-requests accepted in one batch, and how many of them run at once
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', 8))
+# A sub-request still running after this long is cancelled and answered with a 504
+BATCH_REQUEST_TIMEOUT_SECONDS = float(os.environ.get('BATCH_REQUEST_TIMEOUT_SECONDS', 10))
+
+# Request headers that describe the batch body rather than the sub-request
+_SKIPPED_HEADERS = {b"content-length", b"content-type", b"transfer-encoding", b"accept-encoding"}
+
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str = Field(..., description="API path with optional query string, e.g. /api/vehicles?limit=20")
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+
+
+def _validate_item(item: BatchItem) -> Optional[str]:
+    if item.method.upper() != "GET":
+        return "Only GET sub-requests are supported"
+    path = urlsplit(item.path).path
+    if not path.startswith("/api/"):
+        return "Path must start with /api/"
+    if path.rstrip("/") == "/api/batch":
+        return "Batches cannot be nested"
+    return None
+
+
+async def _dispatch(request: Request, item: BatchItem) -> Dict[str, Any]:
+    """Run one GET through the application in-process and capture its response"""
+    url = urlsplit(item.path)
+    headers = [(name, value) for name, value in request.scope["headers"] if name not in _SKIPPED_HEADERS]
+    scope = {
+        "type": "http",
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": "GET",
+        "scheme": request.scope.get("scheme", "http"),
+        "root_path": request.scope.get("root_path", ""),
+        "path": url.path,
+        "raw_path": url.path.encode(),
+        "query_string": url.query.encode(),
+        "headers": headers,
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+    }
+
+    done = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    response: Dict[str, Any] = {"status": 500, "headers": {}}
+    chunks: List[bytes] = []
+    streaming = False
+
+    async def send(message):
+        nonlocal streaming
+        if streaming:
+            return
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {
+                name.decode("latin-1"): value.decode("latin-1")
+                for name, value in message.get("headers", [])
+                if name.lower() != b"content-length"
+            }
+            # An event stream never completes; report the client as gone so the endpoint stops
+            if response["headers"].get("content-type", "").startswith("text/event-stream"):
+                streaming = True
+                done.set()
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await request.app(scope, receive, send)
+    finally:
+        done.set()
+
+    if streaming:
+        return {"status": 400, "headers": {}, "body": {"detail": "Streaming endpoints are not supported in a batch"}}
+    body = b"".join(chunks)
+    content_type = response["headers"].get("content-type", "")
+    if not body:
+        content = None
+    elif content_type.startswith("application/json"):
+        content = orjson.loads(body)
+    else:
+        content = body.decode("utf-8", errors="replace")
+    return {"status": response["status"], "headers": response["headers"], "body": content}
+
+
+@router.post("/batch")
+async def run_batch(
+    batch: BatchRequest,
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: User = Depends(get_current_user)
+):
+    """Execute read sub-requests concurrently and return their responses in order.
+
+    The token is verified once; sub-requests carrying the same token reuse
+    the authenticated user instead of decoding and looking it up again.
+    Each sub-request still goes through its own permission checks.
+    """
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_REQUESTS} requests per batch")
+
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def run(index: int, item: BatchItem) -> Dict[str, Any]:
+        item_id = item.id if item.id is not None else str(index)
+        error = _validate_item(item)
+        if error:
+            return {"id": item_id, "status": 400, "headers": {}, "body": {"detail": error}}
+        async with semaphore:
+            try:
+                result = await asyncio.wait_for(_dispatch(request, item), BATCH_REQUEST_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                return {"id": item_id, "status": 504, "headers": {}, "body": {"detail": "Sub-request timed out"}}
+            except Exception:
+                logger.exception(f"Batch sub-request {item.path} failed")
+                return {"id": item_id, "status": 500, "headers": {}, "body": {"detail": "Internal server error"}}
+        return {"id": item_id, **result}
+
+    # Tasks created by gather copy this context, so every sub-request sees the principal
+    token = authenticated_principal.set((credentials.credentials, user))
+    try:
+        responses = await asyncio.gather(*(run(index, item) for index, item in enumerate(batch.requests)))
+    finally:
+        authenticated_principal.reset(token)
+    return FastJSONResponse({"responses": responses})
@@ -0,0 +1,384 @@
+"""
+API Benchmark
+Boots the app in-process against a local mongod, seeds tenants and reports latency percentiles
+
+The app is driven through httpx's ASGI transport, so the numbers cover routing,
+auth, validation, serialization and MongoDB round trips without any network
+hop. Seed data goes to a dedicated database (<DB_NAME>_bench by default) that
+is dropped before every run.
+
+Usage:
+    python benchmark.py --companies 3 --records 2000 --output results.json
+    python benchmark.py --scenario dashboard_stats --scenario list_invoices
+    python benchmark.py --output new.json --compare results.json --max-regression 0.2
+"""
+
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import typer
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+BENCH_PASSWORD = "bench-password"
+
+app = typer.Typer(help="In-process latency and throughput benchmark for the API")
+
+
+# ============================================================================
+# SEEDING
+# ============================================================================
+
+async def seed_tenants(server, companies: int, records: int) -> List[dict]:
+    """Create `companies` tenants with `records` documents per hot collection.
+
+    Documents are built from the API models and stored the way the handlers
+    store them, then the number counters are raised past the seeded numbers.
+    """
+    from models import Company, User, UserRole, Invoice
+    from accounting_models import Account, AccountType, AccountSubType, JournalEntry, JournalEntryLine, EntryType
+    from warehouse_models import Warehouse, WarehouseType, Product, ProductType, UnitOfMeasure, StockMovement, MovementType
+    from sequences import seed_counters
+
+    db = server.db
+    hashed_password = server.hash_password(BENCH_PASSWORD)
+    now = datetime.now(timezone.utc)
+    tenants = []
+
+    def stored(obj) -> dict:
+        doc = obj.model_dump()
+        server.serialize_datetime(doc)
+        return doc
+
+    for n in range(1, companies + 1):
+        company = Company(name=f"شركة الاختبار {n}", name_en=f"Bench Company {n}")
+        owner = User(
+            username=f"bench_owner_{n}", email=f"owner{n}@bench.local", full_name=f"Bench Owner {n}",
+            company_id=company.id, companies=[company.id], role=UserRole.OWNER
+        )
+        await db.companies.insert_one(stored(company))
+        await db.users.insert_one({**stored(owner), "hashed_password": hashed_password})
+
+        cash = Account(
+            company_id=company.id, account_code="1100", account_name="Cash", account_name_ar="النقد",
+            account_type=AccountType.ASSET, account_subtype=AccountSubType.CURRENT_ASSET
+        )
+        revenue = Account(
+            company_id=company.id, account_code="4100", account_name="Sales", account_name_ar="المبيعات",
+            account_type=AccountType.REVENUE, account_subtype=AccountSubType.OPERATING_REVENUE
+        )
+        warehouse = Warehouse(
+            company_id=company.id, warehouse_code="WH-01", warehouse_name="Main Warehouse",
+            warehouse_type=WarehouseType.MAIN
+        )
+        products = [
+            Product(
+                company_id=company.id, product_code=f"P-{i:04d}", product_name=f"Product {i}",
+                product_type=ProductType.RAW_MATERIAL, unit_of_measure=UnitOfMeasure.TON, unit_cost=10.0 + i
+            )
+            for i in range(1, 21)
+        ]
+        await db.accounts.insert_many([stored(cash), stored(revenue)])
+        await db.warehouses.insert_one(stored(warehouse))
+        await db.products.insert_many([stored(product) for product in products])
+
+        def lines(amount: float) -> List[JournalEntryLine]:
+            return [
+                JournalEntryLine(account_id=cash.id, account_code=cash.account_code, account_name=cash.account_name,
+                                 entry_type=EntryType.DEBIT, amount=amount, amount_base_currency=amount),
+                JournalEntryLine(account_id=revenue.id, account_code=revenue.account_code, account_name=revenue.account_name,
+                                 entry_type=EntryType.CREDIT, amount=amount, amount_base_currency=amount),
+            ]
+
+        entries, movements, invoices = [], [], []
+        for i in range(1, records + 1):
+            day = now - timedelta(days=random.randint(0, 365))
+            amount = round(random.uniform(100, 10000), 2)
+            product = random.choice(products)
+            entries.append(JournalEntry(
+                company_id=company.id, entry_number=f"JE-{i:06d}", entry_date=day, description=f"Bench entry {i}",
+                lines=lines(amount), total_debit=amount, total_credit=amount, created_by=owner.username
+            ))
+            movements.append(StockMovement(
+                company_id=company.id, movement_number=f"MOV-{i:06d}", movement_date=day,
+                movement_type=MovementType.RECEIPT, product_id=product.id, product_code=product.product_code,
+                product_name=product.product_name, to_warehouse_id=warehouse.id, quantity=10,
+                unit_cost=product.unit_cost, total_cost=10 * product.unit_cost, created_by=owner.username
+            ))
+            invoices.append(Invoice(
+                company_id=company.id, date=day, invoice_number=f"B-{n}-{i:06d}", type="sale",
+                client_name=f"Client {i % 50}", amount=amount, total_amount=amount
+            ))
+        for collection, objs in (("journal_entries", entries), ("stock_movements", movements), ("invoices", invoices)):
+            if objs:
+                await db[collection].insert_many([stored(obj) for obj in objs], ordered=False)
+
+        tenants.append({
+            "company_id": company.id, "username": owner.username,
+            "accounts": [cash, revenue], "warehouse_id": warehouse.id,
+            "product_ids": [product.id for product in products],
+        })
+
+    await seed_counters(db, ["journal_entries", "stock_movements"])
+    return tenants
+
+
+# ============================================================================
+# SCENARIOS
+# ============================================================================
+
+Scenario = Callable[["httpx.AsyncClient", dict], Awaitable[None]]
+
+
+def _check(response) -> None:
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.method} {response.request.url.path}: "
+                           f"{response.status_code} {response.text[:200]}")
+
+
+async def login(client, tenant):
+    _check(await client.post("/api/login", json={"username": tenant["username"], "password": BENCH_PASSWORD}))
+
+
+async def dashboard_stats(client, tenant):
+    _check(await client.get("/api/dashboard/stats", headers=tenant["headers"]))
+
+
+async def journal_posting(client, tenant):
+    """Create a balanced draft entry and post it to the ledger"""
+    cash, revenue = tenant["accounts"]
+    amount = round(random.uniform(100, 10000), 2)
+    body = {
+        "entry_date": datetime.now(timezone.utc).isoformat(),
+        "description": "Bench posting",
+        "lines": [
+            {"account_id": cash.id, "account_code": cash.account_code, "account_name": cash.account_name,
+             "entry_type": "debit", "amount": amount, "amount_base_currency": amount},
+            {"account_id": revenue.id, "account_code": revenue.account_code, "account_name": revenue.account_name,
+             "entry_type": "credit", "amount": amount, "amount_base_currency": amount},
+        ],
+    }
+    response = await client.post("/api/accounting/journal-entries", json=body, headers=tenant["headers"])
+    _check(response)
+    entry_id = response.json()["id"]
+    _check(await client.post(f"/api/accounting/journal-entries/{entry_id}/post", headers=tenant["headers"]))
+
+
+async def stock_movement(client, tenant):
+    body = {
+        "movement_date": datetime.now(timezone.utc).isoformat(),
+        "movement_type": "receipt",
+        "product_id": random.choice(tenant["product_ids"]),
+        "to_warehouse_id": tenant["warehouse_id"],
+        "quantity": 5,
+        "unit_cost": 12.5,
+    }
+    _check(await client.post("/api/warehouse/stock-movements", json=body, headers=tenant["headers"]))
+
+
+def list_endpoint(path: str) -> Scenario:
+    async def scenario(client, tenant):
+        _check(await client.get(path, params={"limit": 50}, headers=tenant["headers"]))
+    return scenario
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "login": login,
+    "dashboard_stats": dashboard_stats,
+    "journal_posting": journal_posting,
+    "stock_movement": stock_movement,
+    "list_invoices": list_endpoint("/api/invoices"),
+    "list_journal_entries": list_endpoint("/api/accounting/journal-entries"),
+    "list_stock_movements": list_endpoint("/api/warehouse/stock-movements"),
+    "list_products": list_endpoint("/api/warehouse/products"),
+}
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "mean_ms": ms(sum(values) / len(values)) if values else 0.0,
+        "max_ms": ms(values[-1]) if values else 0.0,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+async def run_scenario(client, scenario: Scenario, tenants: List[dict], requests: int,
+                       concurrency: int, warmup: int) -> dict:
+    for i in range(warmup):
+        await scenario(client, tenants[i % len(tenants)])
+
+    latencies: List[float] = []
+    errors = 0
+    issued = 0
+    first_error: Optional[str] = None
+
+    async def worker():
+        nonlocal issued, errors, first_error
+        while issued < requests:
+            tenant = tenants[issued % len(tenants)]
+            issued += 1
+            started_at = time.perf_counter()
+            try:
+                await scenario(client, tenant)
+            except Exception as e:
+                errors += 1
+                first_error = first_error or str(e)
+                continue
+            latencies.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = summarize(latencies, errors, time.perf_counter() - started_at)
+    if first_error:
+        result["first_error"] = first_error
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run_benchmark(names: List[str], companies: int, records: int, requests: int,
+                        concurrency: int, warmup: int, keep: bool) -> dict:
+    # Imported here so DB_NAME points at the benchmark database first
+    import httpx
+    import server
+    from indexes import ensure_indexes
+
+    await server.client.drop_database(os.environ['DB_NAME'])
+    await ensure_indexes(server.db)
+    seed_started = time.perf_counter()
+    tenants = await seed_tenants(server, companies, records)
+    typer.echo(f"Seeded {companies} companies x {records} records in {time.perf_counter() - seed_started:.1f}s")
+
+    transport = httpx.ASGITransport(app=server.app)
+    results = {}
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for tenant in tenants:
+                response = await client.post("/api/login", json={"username": tenant["username"], "password": BENCH_PASSWORD})
+                _check(response)
+                tenant["headers"] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+            for name in names:
+                results[name] = await run_scenario(client, SCENARIOS[name], tenants, requests, concurrency, warmup)
+                r = results[name]
+                typer.echo(f"{name:<24} p50 {r['p50_ms']:>9.2f}ms  p95 {r['p95_ms']:>9.2f}ms  "
+                           f"p99 {r['p99_ms']:>9.2f}ms  {r['throughput_rps']:>8.1f} req/s  errors {r['errors']}")
+    finally:
+        if not keep:
+            await server.client.drop_database(os.environ['DB_NAME'])
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "companies": companies,
+            "records": records,
+            "requests": requests,
+            "concurrency": concurrency,
+            "datetime_storage": os.environ.get('DATETIME_STORAGE', 'iso'),
+        },
+        "scenarios": results,
+    }
+
+
+def compare_results(current: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Print p95/throughput deltas against a baseline; returns regressed scenarios"""
+    regressed = []
+    typer.echo(f"\n{'scenario':<24} {'p95 base':>10} {'p95 now':>10} {'delta':>8} {'rps delta':>10}")
+    for name, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base or not base["p95_ms"]:
+            continue
+        p95_delta = result["p95_ms"] / base["p95_ms"] - 1
+        rps_delta = result["throughput_rps"] / base["throughput_rps"] - 1 if base["throughput_rps"] else 0.0
+        marker = ""
+        if p95_delta > max_regression:
+            regressed.append(name)
+            marker = "  REGRESSED"
+        typer.echo(f"{name:<24} {base['p95_ms']:>10.2f} {result['p95_ms']:>10.2f} "
+                   f"{p95_delta:>+8.1%} {rps_delta:>+10.1%}{marker}")
+    return regressed
+
+
+@app.command()
+def run(
+    scenario: Optional[List[str]] = typer.Option(None, "--scenario", "-s", help="Scenario to run (repeatable); default all"),
+    companies: int = typer.Option(3, help="Tenants to seed"),
+    records: int = typer.Option(1000, help="Documents per hot collection per tenant"),
+    requests: int = typer.Option(200, help="Measured requests per scenario"),
+    concurrency: int = typer.Option(10, help="Concurrent in-flight requests"),
+    warmup: int = typer.Option(10, help="Unmeasured requests per scenario"),
+    db_name: Optional[str] = typer.Option(None, help="Benchmark database (default <DB_NAME>_bench)"),
+    output: Optional[Path] = typer.Option(None, help="Write results as JSON"),
+    compare: Optional[Path] = typer.Option(None, help="Baseline results JSON to compare against"),
+    max_regression: float = typer.Option(0.25, help="Fail when a p95 grows by more than this fraction"),
+    keep: bool = typer.Option(False, "--keep", help="Keep the benchmark database afterwards"),
+    seed: int = typer.Option(42, help="Random seed for generated data"),
+):
+    """Seed a benchmark database and measure the hot endpoints"""
+    names = scenario or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise typer.BadParameter(f"Unknown scenario(s): {', '.join(unknown)}")
+
+    bench_db = db_name or f"{os.environ['DB_NAME']}_bench"
+    if bench_db == os.environ['DB_NAME']:
+        raise typer.BadParameter("The benchmark database is dropped on every run; use a dedicated --db-name")
+    os.environ['DB_NAME'] = bench_db
+    os.environ['ENSURE_INDEXES_ON_STARTUP'] = 'false'
+    random.seed(seed)
+
+    results = asyncio.run(run_benchmark(names, companies, records, requests, concurrency, warmup, keep))
+
+    if output:
+        output.write_text(json.dumps(results, indent=2))
+        typer.echo(f"Results written to {output}")
+    if compare:
+        regressed = compare_results(results, json.loads(compare.read_text()), max_regression)
+        if regressed:
+            typer.echo(f"p95 regression over {max_regression:.0%}: {', '.join(regressed)}")
+            raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
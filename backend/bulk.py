@@ -0,0 +1,93 @@
+"""
+Bulk Creation
+Validate arrays of create payloads in one pass and insert them with a single insert_many
+"""
+
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from pymongo.errors import BulkWriteError
+
+# Largest array accepted by a bulk endpoint
+BULK_MAX_ROWS = int(os.environ.get('BULK_MAX_ROWS', 1000))
+
+
+class BulkRowResult(BaseModel):
+    index: int
+    success: bool
+    id: Optional[str] = None
+    errors: List[str] = []
+
+
+class BulkCreateResult(BaseModel):
+    inserted: int
+    failed: int
+    results: List[BulkRowResult]
+
+
+def _validation_messages(error: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}" for e in error.errors()]
+
+
+def build_rows(
+    rows: List[Any],
+    create_model: Type[BaseModel],
+    build: Callable[[BaseModel], BaseModel]
+) -> Tuple[List[Tuple[int, BaseModel]], Dict[int, BulkRowResult]]:
+    """Validate every row and build its stored object.
+
+    Returns the (index, object) pairs that passed and the failed rows by index;
+    one bad row never rejects the others.
+    """
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ROWS} rows per request")
+
+    valid: List[Tuple[int, BaseModel]] = []
+    results_by_index: Dict[int, BulkRowResult] = {}
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, build(create_model.model_validate(row))))
+        except ValidationError as e:
+            results_by_index[index] = BulkRowResult(index=index, success=False, errors=_validation_messages(e))
+        except (ValueError, HTTPException) as e:
+            results_by_index[index] = BulkRowResult(index=index, success=False, errors=[getattr(e, "detail", None) or str(e)])
+    return valid, results_by_index
+
+
+async def insert_rows(
+    collection,
+    valid: List[Tuple[int, BaseModel]],
+    results_by_index: Dict[int, BulkRowResult],
+    serialize: Callable[[dict], Any],
+    total: int
+) -> Tuple[BulkCreateResult, List[BaseModel]]:
+    """insert_many(ordered=False) the valid rows and report a result per input row.
+
+    Returns the result and the objects that were actually written.
+    """
+    write_errors: Dict[int, str] = {}
+    if valid:
+        docs = []
+        for _, obj in valid:
+            doc = obj.model_dump()
+            serialize(doc)
+            docs.append(doc)
+        try:
+            await collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # writeErrors index into docs, i.e. into `valid`
+            for error in e.details.get("writeErrors", []):
+                write_errors[error["index"]] = error.get("errmsg", "Write failed")
+
+    inserted = []
+    for position, (index, obj) in enumerate(valid):
+        if position in write_errors:
+            results_by_index[index] = BulkRowResult(index=index, success=False, errors=[write_errors[position]])
+        else:
+            results_by_index[index] = BulkRowResult(index=index, success=True, id=obj.id)
+            inserted.append(obj)
+
+    results = [results_by_index[index] for index in range(total)]
+    return BulkCreateResult(inserted=len(inserted), failed=total - len(inserted), results=results), inserted
@@ -0,0 +1,119 @@
+"""
+Token Claims
+Self-contained JWT claims so requests can be authorized without a user lookup
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Callable, Dict, Optional
+
+from models import User, UserRole, ROLE_PERMISSIONS
+
+# Embed role, company membership and a permissions version in issued tokens
+JWT_EMBED_CLAIMS = os.environ.get('JWT_EMBED_CLAIMS', 'false').lower() in ('1', 'true', 'yes')
+
+# How stale the in-process token version list may get before it is reloaded
+TOKEN_VERSION_REFRESH_SECONDS = float(os.environ.get('TOKEN_VERSION_REFRESH_SECONDS', 30))
+
+
+def _permissions_version() -> str:
+    """Fingerprint of ROLE_PERMISSIONS; changes whenever the role matrix does"""
+    matrix = {
+        role.value: {resource: sorted(actions) for resource, actions in permissions.items()}
+        for role, permissions in ROLE_PERMISSIONS.items()
+    }
+    raw = json.dumps(matrix, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+PERMISSIONS_VERSION = _permissions_version()
+
+
+def principal_claims(user: User) -> dict:
+    """Claims describing the user, added to the token next to sub/company_id/tv"""
+    return {
+        "uid": user.id,
+        "role": user.role.value,
+        "companies": list(user.companies or []),
+        "home_company_id": user.company_id,
+        "name": user.full_name,
+        "email": user.email,
+        "pv": PERMISSIONS_VERSION
+    }
+
+
+def user_from_claims(payload: dict) -> Optional[User]:
+    """Build the principal from token claims.
+
+    Returns None when the token carries no embedded claims or was issued
+    against a different permissions matrix; callers then fall back to a
+    database lookup.
+    """
+    if payload.get("pv") != PERMISSIONS_VERSION:
+        return None
+    try:
+        role = UserRole(payload["role"])
+        return User.model_construct(
+            id=payload["uid"],
+            username=payload["sub"],
+            email=payload.get("email") or "",
+            full_name=payload.get("name") or "",
+            company_id=payload.get("home_company_id"),
+            companies=list(payload.get("companies") or []),
+            role=role,
+            token_version=payload.get("tv", 0)
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenVersionList:
+    """In-process copy of every user's token version.
+
+    Users whose token_version was bumped have every older token revoked. The
+    list is reloaded from MongoDB lazily, at most once per `refresh_seconds`,
+    so authorizing a request normally needs no I/O at all.
+    """
+
+    def __init__(self, refresh_seconds: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.refresh_seconds = refresh_seconds
+        self._clock = clock
+        self._versions: Dict[str, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.refreshes = 0
+
+    def _is_stale(self) -> bool:
+        return self._loaded_at is None or self._clock() - self._loaded_at >= self.refresh_seconds
+
+    async def refresh(self, db) -> None:
+        docs = await db.users.find(
+            {"token_version": {"$gt": 0}},
+            {"_id": 0, "username": 1, "token_version": 1}
+        ).to_list(None)
+        self._versions = {doc["username"]: doc["token_version"] for doc in docs}
+        self._loaded_at = self._clock()
+        self.refreshes += 1
+
+    async def current_version(self, db, username: str) -> int:
+        if self._is_stale():
+            async with self._lock:
+                if self._is_stale():
+                    await self.refresh(db)
+        return self._versions.get(username, 0)
+
+    def set(self, username: str, version: int) -> None:
+        """Record a version bump made by this process without waiting for a refresh"""
+        self._versions[username] = version
+
+    def stats(self) -> dict:
+        return {
+            "enabled": JWT_EMBED_CLAIMS,
+            "permissions_version": PERMISSIONS_VERSION,
+            "revoked_users": len(self._versions),
+            "refresh_seconds": self.refresh_seconds,
+            "refreshes": self.refreshes
+        }
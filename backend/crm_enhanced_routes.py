@@ -8,7 +8,10 @@ from typing import List, Optional
 from datetime import datetime, timezone
 import uuid
 
-from server import get_current_user, db, serialize_datetime
+from server import get_current_user, db, serialize_datetime, sequences
+from pagination import PageParams, page_params, fetch_page
+from responses import trusted_list_response
+from storage import NATIVE_DATETIMES, storage_now
 from models import User
 from crm_enhanced_models import (
     Task, TaskCreate, TaskStatus, TaskPriority,
@@ -29,6 +32,8 @@ router = APIRouter(prefix="/api/crm", tags=["crm-enhanced"])
 
 def prepare_for_mongo(data: dict) -> dict:
     """Prepare data for MongoDB storage by converting dates to ISO strings"""
+    if NATIVE_DATETIMES:
+        return data
     datetime_fields = [
         'due_date', 'start_date', 'reminder_date', 'completion_date',
         'activity_date', 'completed_date', 'start_date', 'end_date',
@@ -43,23 +48,6 @@ def prepare_for_mongo(data: dict) -> dict:
     return data
 
 
-async def get_next_number(company_id: str, prefix: str, collection_name: str) -> str:
-    """Generate next sequential number for documents"""
-    last_doc = await db[collection_name].find_one(
-        {"company_id": company_id},
-        sort=[("created_at", -1)]
-    )
-    
-    field_name = f"{prefix.lower()}_number"
-    if last_doc and last_doc.get(field_name):
-        last_number = int(last_doc[field_name].split("-")[1])
-        next_number = last_number + 1
-    else:
-        next_number = 1
-    
-    return f"{prefix}-{next_number:06d}"
-
-
 # ============================================================================
 # TASKS
 # ============================================================================
@@ -74,7 +62,7 @@ async def create_task(
         raise HTTPException(status_code=403, detail="You don't have permission to create tasks")
     
     # Generate task number
-    task_number = await get_next_number(current_user.current_company_id, "TASK", "tasks")
+    task_number = await sequences.next_number(current_user.current_company_id, "tasks")
     
     # Get assigned user name
     assigned_user = await db.users.find_one({"id": task.assigned_to})
@@ -121,6 +109,7 @@ async def get_tasks(
     status: Optional[TaskStatus] = None,
     related_to_type: Optional[str] = None,
     related_to_id: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all tasks"""
@@ -137,9 +126,9 @@ async def get_tasks(
     if related_to_id:
         query["related_to_id"] = related_to_id
     
-    tasks = await db.tasks.find(query).to_list(length=None)
+    tasks = await fetch_page(db.tasks, query, "created_at", page, model=Task)
     
-    return [Task(**task) for task in tasks]
+    return trusted_list_response(Task, tasks)
 
 
 @router.get("/tasks/{task_id}", response_model=Task)
@@ -177,7 +166,7 @@ async def complete_task(
         {
             "$set": {
                 "status": TaskStatus.COMPLETED.value,
-                "completion_date": datetime.now(timezone.utc).isoformat(),
+                "completion_date": storage_now(),
                 "completion_notes": completion_notes
             }
         }
@@ -203,7 +192,7 @@ async def create_activity(
         raise HTTPException(status_code=403, detail="You don't have permission to create activities")
     
     # Generate activity number
-    activity_number = await get_next_number(current_user.current_company_id, "ACT", "activities")
+    activity_number = await sequences.next_number(current_user.current_company_id, "activities")
     
     # Get related record name
     collection_map = {
@@ -244,6 +233,7 @@ async def get_activities(
     related_to_type: Optional[str] = None,
     related_to_id: Optional[str] = None,
     activity_type: Optional[ActivityType] = None,
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all activities"""
@@ -258,9 +248,9 @@ async def get_activities(
     if activity_type:
         query["activity_type"] = activity_type.value
     
-    activities = await db.activities.find(query).to_list(length=None)
+    activities = await fetch_page(db.activities, query, "created_at", page, model=Activity)
     
-    return [Activity(**activity) for activity in activities]
+    return trusted_list_response(Activity, activities)
 
 
 # ============================================================================
@@ -302,6 +292,7 @@ async def create_product(
 async def get_products(
     product_family: Optional[str] = None,
     is_active: Optional[bool] = True,
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all CRM products"""
@@ -314,9 +305,9 @@ async def get_products(
     if is_active is not None:
         query["is_active"] = is_active
     
-    products = await db.crm_products.find(query).to_list(length=None)
+    products = await fetch_page(db.crm_products, query, "created_at", page, model=CRMProduct)
     
-    return [CRMProduct(**product) for product in products]
+    return trusted_list_response(CRMProduct, products)
 
 
 # ============================================================================
@@ -333,7 +324,7 @@ async def create_contract(
         raise HTTPException(status_code=403, detail="You don't have permission to create contracts")
     
     # Generate contract number
-    contract_number = await get_next_number(current_user.current_company_id, "CONT", "contracts")
+    contract_number = await sequences.next_number(current_user.current_company_id, "contracts")
     
     # Get account name
     account = await db.accounts.find_one({"id": contract.account_id})
@@ -372,6 +363,7 @@ async def create_contract(
 async def get_contracts(
     account_id: Optional[str] = None,
     status: Optional[ContractStatus] = None,
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all contracts"""
@@ -384,9 +376,9 @@ async def get_contracts(
     if status:
         query["status"] = status.value
     
-    contracts = await db.contracts.find(query).to_list(length=None)
+    contracts = await fetch_page(db.contracts, query, "created_at", page, model=Contract)
     
-    return [Contract(**contract) for contract in contracts]
+    return trusted_list_response(Contract, contracts)
 
 
 @router.post("/contracts/{contract_id}/activate")
@@ -403,7 +395,7 @@ async def activate_contract(
         {
             "$set": {
                 "status": ContractStatus.ACTIVE.value,
-                "signed_date": datetime.now(timezone.utc).isoformat(),
+                "signed_date": storage_now(),
                 "signed_by_company": current_user.full_name
             }
         }
@@ -453,6 +445,7 @@ async def create_email_template(
 @router.get("/email-templates", response_model=List[EmailTemplate])
 async def get_email_templates(
     is_active: Optional[bool] = True,
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all email templates"""
@@ -463,9 +456,9 @@ async def get_email_templates(
     if is_active is not None:
         query["is_active"] = is_active
     
-    templates = await db.email_templates.find(query).to_list(length=None)
+    templates = await fetch_page(db.email_templates, query, "created_at", page, model=EmailTemplate)
     
-    return [EmailTemplate(**template) for template in templates]
+    return trusted_list_response(EmailTemplate, templates)
 
 
 @router.post("/emails", response_model=Email)
@@ -478,7 +471,7 @@ async def create_email(
         raise HTTPException(status_code=403, detail="You don't have permission to create emails")
     
     # Generate email number
-    email_number = await get_next_number(current_user.current_company_id, "EMAIL", "emails")
+    email_number = await sequences.next_number(current_user.current_company_id, "emails")
     
     # Get related record name if provided
     related_to_name = None
@@ -517,6 +510,7 @@ async def create_email(
 async def get_emails(
     related_to_type: Optional[str] = None,
     related_to_id: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all emails"""
@@ -529,9 +523,9 @@ async def get_emails(
     if related_to_id:
         query["related_to_id"] = related_to_id
     
-    emails = await db.emails.find(query).to_list(length=None)
+    emails = await fetch_page(db.emails, query, "created_at", page, model=Email)
     
-    return [Email(**email) for email in emails]
+    return trusted_list_response(Email, emails)
 
 
 # ============================================================================
@@ -548,7 +542,7 @@ async def create_forecast(
         raise HTTPException(status_code=403, detail="You don't have permission to create forecasts")
     
     # Generate forecast number
-    forecast_number = await get_next_number(current_user.current_company_id, "FCST", "forecasts")
+    forecast_number = await sequences.next_number(current_user.current_company_id, "forecasts")
     
     # Get owner name if provided
     owner_name = None
@@ -577,6 +571,7 @@ async def create_forecast(
 async def get_forecasts(
     fiscal_year: Optional[int] = None,
     period: Optional[ForecastPeriod] = None,
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """Get all sales forecasts"""
@@ -589,9 +584,9 @@ async def get_forecasts(
     if period:
         query["period"] = period.value
     
-    forecasts = await db.forecasts.find(query).to_list(length=None)
+    forecasts = await fetch_page(db.forecasts, query, "created_at", page, model=SalesForecast)
     
-    return [SalesForecast(**forecast) for forecast in forecasts]
+    return trusted_list_response(SalesForecast, forecasts)
 
 
 @router.get("/forecasts/{forecast_id}", response_model=SalesForecast)
@@ -11,7 +11,10 @@ import io
 
 from crm_models import *
 from models import User, UserRole
-from server import get_current_user, db, serialize_datetime, deserialize_datetime
+from server import get_current_user, db, serialize_datetime, sequences
+from pagination import PageParams, page_params, fetch_page
+from responses import trusted_list_response
+from storage import storage_now
 
 # Create CRM router
 crm_router = APIRouter(prefix="/api/crm", tags=["CRM"])
@@ -31,8 +34,7 @@ async def create_lead(lead_data: LeadCreate, user: User = Depends(get_current_us
         raise HTTPException(status_code=400, detail="No company context")
     
     # Generate lead number
-    count = await db.leads.count_documents({"company_id": user.current_company_id})
-    lead_number = f"LEAD-{count + 1:06d}"
+    lead_number = await sequences.next_number(user.current_company_id, "leads")
     
     # Create full name
     full_name = f"{lead_data.first_name} {lead_data.last_name}"
@@ -55,6 +57,7 @@ async def get_leads(
     status: Optional[LeadStatus] = None,
     source: Optional[LeadSource] = None,
     assigned_to: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get leads list"""
@@ -72,12 +75,9 @@ async def get_leads(
     if assigned_to:
         query["assigned_to"] = assigned_to
     
-    leads_list = await db.leads.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
+    leads_list = await fetch_page(db.leads, query, "created_at", page, direction=-1, model=Lead)
     
-    for lead in leads_list:
-        deserialize_datetime(lead, ['created_at', 'updated_at', 'expected_close_date', 'converted_date', 'last_contacted', 'next_follow_up'])
-    
-    return leads_list
+    return trusted_list_response(Lead, leads_list)
 
 @crm_router.post("/leads/{lead_id}/convert")
 async def convert_lead(lead_id: str, user: User = Depends(get_current_user)):
@@ -93,10 +93,10 @@ async def convert_lead(lead_id: str, user: User = Depends(get_current_user)):
         raise HTTPException(status_code=400, detail="Lead already converted")
     
     # Create Account
-    account_count = await db.crm_accounts.count_documents({"company_id": user.current_company_id})
+    account_number = await sequences.next_number(user.current_company_id, "crm_accounts")
     account = Account(
         company_id=user.current_company_id,
-        account_number=f"ACC-{account_count + 1:06d}",
+        account_number=account_number,
         account_name=lead_doc.get('company') or lead_doc['full_name'],
         phone=lead_doc.get('phone'),
         email=lead_doc.get('email'),
@@ -109,10 +109,10 @@ async def convert_lead(lead_id: str, user: User = Depends(get_current_user)):
     await db.crm_accounts.insert_one(account_dict)
     
     # Create Contact
-    contact_count = await db.crm_contacts.count_documents({"company_id": user.current_company_id})
+    contact_number = await sequences.next_number(user.current_company_id, "crm_contacts")
     contact = Contact(
         company_id=user.current_company_id,
-        contact_number=f"CON-{contact_count + 1:06d}",
+        contact_number=contact_number,
         account_id=account.id,
         account_name=account.account_name,
         first_name=lead_doc['first_name'],
@@ -132,10 +132,10 @@ async def convert_lead(lead_id: str, user: User = Depends(get_current_user)):
     # Create Opportunity if estimated value exists
     opportunity_id = None
     if lead_doc.get('estimated_value'):
-        opp_count = await db.opportunities.count_documents({"company_id": user.current_company_id})
+        opportunity_number = await sequences.next_number(user.current_company_id, "opportunities")
         opportunity = Opportunity(
             company_id=user.current_company_id,
-            opportunity_number=f"OPP-{opp_count + 1:06d}",
+            opportunity_number=opportunity_number,
             opportunity_name=f"Opportunity - {lead_doc['full_name']}",
             account_id=account.id,
             account_name=account.account_name,
@@ -159,11 +159,11 @@ async def convert_lead(lead_id: str, user: User = Depends(get_current_user)):
         {"$set": {
             "is_converted": True,
             "status": LeadStatus.CONVERTED,
-            "converted_date": datetime.now(timezone.utc).isoformat(),
+            "converted_date": storage_now(),
             "converted_account_id": account.id,
             "converted_contact_id": contact.id,
             "converted_opportunity_id": opportunity_id,
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "updated_at": storage_now()
         }}
     )
     
@@ -189,8 +189,7 @@ async def create_account(account_data: AccountCreate, user: User = Depends(get_c
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
-    count = await db.crm_accounts.count_documents({"company_id": user.current_company_id})
-    account_number = f"ACC-{count + 1:06d}"
+    account_number = await sequences.next_number(user.current_company_id, "crm_accounts")
     
     account_obj = Account(
         **account_data.model_dump(),
@@ -208,6 +207,7 @@ async def create_account(account_data: AccountCreate, user: User = Depends(get_c
 async def get_accounts(
     account_type: Optional[AccountType] = None,
     is_active: Optional[bool] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get accounts list"""
@@ -223,12 +223,9 @@ async def get_accounts(
     if is_active is not None:
         query["is_active"] = is_active
     
-    accounts_list = await db.crm_accounts.find(query, {"_id": 0}).sort("account_name", 1).to_list(1000)
+    accounts_list = await fetch_page(db.crm_accounts, query, "account_name", page, model=Account)
     
-    for account in accounts_list:
-        deserialize_datetime(account, ['created_at', 'updated_at'])
-    
-    return accounts_list
+    return trusted_list_response(Account, accounts_list)
 
 
 # ============================================================================
@@ -249,8 +246,7 @@ async def create_contact(contact_data: ContactCreate, user: User = Depends(get_c
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
     
-    count = await db.crm_contacts.count_documents({"company_id": user.current_company_id})
-    contact_number = f"CON-{count + 1:06d}"
+    contact_number = await sequences.next_number(user.current_company_id, "crm_contacts")
     
     full_name = f"{contact_data.first_name} {contact_data.last_name}"
     
@@ -272,6 +268,7 @@ async def create_contact(contact_data: ContactCreate, user: User = Depends(get_c
 async def get_contacts(
     account_id: Optional[str] = None,
     is_active: Optional[bool] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get contacts list"""
@@ -287,12 +284,9 @@ async def get_contacts(
     if is_active is not None:
         query["is_active"] = is_active
     
-    contacts_list = await db.crm_contacts.find(query, {"_id": 0}).sort("last_name", 1).to_list(1000)
-    
-    for contact in contacts_list:
-        deserialize_datetime(contact, ['created_at', 'updated_at', 'date_of_birth'])
+    contacts_list = await fetch_page(db.crm_contacts, query, "last_name", page, model=Contact)
     
-    return contacts_list
+    return trusted_list_response(Contact, contacts_list)
 
 
 # ============================================================================
@@ -313,8 +307,7 @@ async def create_opportunity(opp_data: OpportunityCreate, user: User = Depends(g
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
     
-    count = await db.opportunities.count_documents({"company_id": user.current_company_id})
-    opp_number = f"OPP-{count + 1:06d}"
+    opp_number = await sequences.next_number(user.current_company_id, "opportunities")
     
     # Calculate expected revenue
     expected_revenue = opp_data.amount * (opp_data.probability / 100)
@@ -338,6 +331,7 @@ async def get_opportunities(
     stage: Optional[OpportunityStage] = None,
     account_id: Optional[str] = None,
     is_closed: Optional[bool] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get opportunities list"""
@@ -355,12 +349,9 @@ async def get_opportunities(
     if is_closed is not None:
         query["is_closed"] = is_closed
     
-    opps_list = await db.opportunities.find(query, {"_id": 0}).sort("close_date", 1).to_list(1000)
+    opps_list = await fetch_page(db.opportunities, query, "close_date", page, model=Opportunity)
     
-    for opp in opps_list:
-        deserialize_datetime(opp, ['close_date', 'closed_date', 'created_at', 'updated_at'])
-    
-    return opps_list
+    return trusted_list_response(Opportunity, opps_list)
 
 
 # ============================================================================
@@ -376,8 +367,7 @@ async def create_case(case_data: CaseCreate, user: User = Depends(get_current_us
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
-    count = await db.cases.count_documents({"company_id": user.current_company_id})
-    case_number = f"CASE-{count + 1:06d}"
+    case_number = await sequences.next_number(user.current_company_id, "cases")
     
     case_obj = Case(
         **case_data.model_dump(),
@@ -398,6 +388,7 @@ async def get_cases(
     status: Optional[CaseStatus] = None,
     priority: Optional[CasePriority] = None,
     account_id: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get cases list"""
@@ -415,12 +406,9 @@ async def get_cases(
     if account_id:
         query["account_id"] = account_id
     
-    cases_list = await db.cases.find(query, {"_id": 0}).sort("opened_date", -1).to_list(1000)
-    
-    for case in cases_list:
-        deserialize_datetime(case, ['opened_date', 'closed_date', 'response_due_date', 'resolution_due_date', 'escalated_date', 'created_at', 'updated_at'])
+    cases_list = await fetch_page(db.cases, query, "opened_date", page, direction=-1, model=Case)
     
-    return cases_list
+    return trusted_list_response(Case, cases_list)
 
 
 # ============================================================================
@@ -436,8 +424,7 @@ async def create_campaign(campaign_data: CampaignCreate, user: User = Depends(ge
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
-    count = await db.campaigns.count_documents({"company_id": user.current_company_id})
-    campaign_number = f"CAMP-{count + 1:06d}"
+    campaign_number = await sequences.next_number(user.current_company_id, "campaigns")
     
     campaign_obj = Campaign(
         **campaign_data.model_dump(),
@@ -455,6 +442,7 @@ async def create_campaign(campaign_data: CampaignCreate, user: User = Depends(ge
 async def get_campaigns(
     status: Optional[CampaignStatus] = None,
     campaign_type: Optional[CampaignType] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     """Get campaigns list"""
@@ -470,12 +458,9 @@ async def get_campaigns(
     if campaign_type:
         query["campaign_type"] = campaign_type
     
-    campaigns_list = await db.campaigns.find(query, {"_id": 0}).sort("start_date", -1).to_list(1000)
-    
-    for campaign in campaigns_list:
-        deserialize_datetime(campaign, ['start_date', 'end_date', 'created_at', 'updated_at'])
+    campaigns_list = await fetch_page(db.campaigns, query, "start_date", page, direction=-1, model=Campaign)
     
-    return campaigns_list
+    return trusted_list_response(Campaign, campaigns_list)
 
 
 # ============================================================================
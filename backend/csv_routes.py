@@ -11,7 +11,8 @@ import csv
 import io
 import uuid
 
-from server import get_current_user, db
+from server import get_current_user, db, invalidate_dashboard_cache, DASHBOARD_COLLECTIONS
+from rollups import ROLLUP_SOURCES, apply_rollup
 from models import User
 
 router = APIRouter(prefix="/api/csv", tags=["csv"])
@@ -76,11 +77,16 @@ async def import_csv_data(
                 
                 # Insert into database
                 await db[collection_name].insert_one(doc)
+                if collection_name in ROLLUP_SOURCES:
+                    await apply_rollup(db, collection_name, company_id, doc)
                 imported_count += 1
                 
             except Exception as e:
                 errors.append(f"Row {row_num}: {str(e)}")
         
+        if imported_count and collection_name in DASHBOARD_COLLECTIONS:
+            invalidate_dashboard_cache(company_id)
+        
         return {
             "success": True,
             "imported_count": imported_count,
@@ -0,0 +1,59 @@
+"""
+Sparse Fieldsets
+?fields= support for list endpoints: validation, Mongo projections and partial models
+"""
+
+from typing import Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, create_model
+
+# Always returned so clients can address the records they receive
+ALWAYS_INCLUDED = ("id",)
+
+
+def parse_fields(raw: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated ?fields= value; None when absent or empty"""
+    if not raw:
+        return None
+    fields = [field.strip() for field in raw.split(",") if field.strip()]
+    return fields or None
+
+
+def select_fields(model: Type[BaseModel], requested: List[str]) -> List[str]:
+    """Validate requested fields against a model.
+
+    Returns them in model declaration order with the always-included fields
+    added. Unknown fields are rejected with a 400.
+    """
+    unknown = [field for field in requested if field not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    wanted = set(requested) | {field for field in ALWAYS_INCLUDED if field in model.model_fields}
+    return [field for field in model.model_fields if field in wanted]
+
+
+def fields_projection(fields: List[str], sort_keys: List[Tuple[str, int]]) -> dict:
+    """Mongo projection for the selected fields plus the keys needed for the cursor"""
+    projection = {"_id": 0}
+    for field in fields:
+        projection[field] = 1
+    for field, _ in sort_keys:
+        projection[field] = 1
+    return projection
+
+
+_partial_models: Dict[Tuple[Type[BaseModel], Tuple[str, ...]], Type[BaseModel]] = {}
+
+
+def partial_model(model: Type[BaseModel], fields: List[str]) -> Type[BaseModel]:
+    """Cached model with only the selected fields, all optional"""
+    key = (model, tuple(fields))
+    partial = _partial_models.get(key)
+    if partial is None:
+        partial = create_model(
+            f"{model.__name__}Partial",
+            **{field: (Optional[model.model_fields[field].annotation], None) for field in fields}
+        )
+        _partial_models[key] = partial
+    return partial
@@ -4,45 +4,38 @@ MinIO-based file upload, preview, and download functionality
 """
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 from typing import List, Optional
 from datetime import datetime, timezone, timedelta
+import asyncio
 import uuid
 import io
 import os
-from minio import Minio
 from minio.error import S3Error
 
 from server import get_current_user, db
+from pagination import PageParams, page_params, fetch_page
+from responses import trusted_list_response
 from models import User, CompanyBaseModel
+from object_storage import storage, MINIO_BUCKET
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/files", tags=["files"])
 
-# MinIO Configuration (using local MinIO)
-MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
-MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
-MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
-MINIO_SECURE = os.getenv("MINIO_SECURE", "false").lower() == "true"
-MINIO_BUCKET = os.getenv("MINIO_BUCKET", "khairit-files")
+# MinIO is connected on first use (see object_storage.py). With
+# MINIO_WARMUP=true a background connection attempt starts with the app,
+# without delaying startup.
+MINIO_WARMUP = os.getenv("MINIO_WARMUP", "true").lower() == "true"
+
+_warmup_tasks = set()
 
-# Initialize MinIO client
-try:
-    minio_client = Minio(
-        MINIO_ENDPOINT,
-        access_key=MINIO_ACCESS_KEY,
-        secret_key=MINIO_SECRET_KEY,
-        secure=MINIO_SECURE
-    )
-    
-    # Ensure bucket exists
-    if not minio_client.bucket_exists(MINIO_BUCKET):
-        minio_client.make_bucket(MINIO_BUCKET)
-        print(f"Created bucket: {MINIO_BUCKET}")
-except Exception as e:
-    print(f"MinIO initialization warning: {e}")
-    print("File upload will use fallback method if MinIO is not available")
-    minio_client = None
+
+@router.on_event("startup")
+async def warm_up_storage():
+    if MINIO_WARMUP:
+        task = asyncio.create_task(storage.client())
+        _warmup_tasks.add(task)
+        task.add_done_callback(_warmup_tasks.discard)
 
 
 class FileMetadata(CompanyBaseModel):
@@ -101,18 +94,15 @@ async def upload_file(
         file_size = len(file_content)
         
         # Upload to MinIO if available
-        if minio_client:
-            try:
-                minio_client.put_object(
-                    MINIO_BUCKET,
-                    object_path,
-                    io.BytesIO(file_content),
-                    file_size,
-                    content_type=file.content_type or "application/octet-stream"
-                )
-            except S3Error as e:
-                raise HTTPException(status_code=500, detail=f"MinIO upload failed: {str(e)}")
-        else:
+        try:
+            uploaded = await storage.put_object(
+                object_path,
+                file_content,
+                file.content_type or "application/octet-stream"
+            )
+        except S3Error as e:
+            raise HTTPException(status_code=500, detail=f"MinIO upload failed: {str(e)}")
+        if not uploaded:
             # Fallback: store in local filesystem
             upload_dir = f"/app/uploads/{current_user.current_company_id}"
             os.makedirs(upload_dir, exist_ok=True)
@@ -154,6 +144,18 @@ async def upload_file(
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
 
 
+# ============================================================================
+# STORAGE READINESS
+# ============================================================================
+
+@router.get("/ready")
+async def storage_ready():
+    """Readiness probe for object storage; 503 while uploads use the local fallback"""
+    await storage.client()
+    body = storage.status()
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+
 # ============================================================================
 # FILE DOWNLOAD
 # ============================================================================
@@ -176,17 +178,11 @@ async def download_file(
     
     try:
         # Try MinIO first
-        if minio_client:
-            try:
-                response = minio_client.get_object(MINIO_BUCKET, file_meta['object_path'])
-                file_content = response.read()
-                response.close()
-            except S3Error:
-                # Fallback to local filesystem
-                file_path = f"/app/uploads/{current_user.current_company_id}/{file_meta['stored_filename']}"
-                with open(file_path, "rb") as f:
-                    file_content = f.read()
-        else:
+        try:
+            file_content = await storage.get_object(file_meta['object_path'])
+        except S3Error:
+            file_content = None
+        if file_content is None:
             # Local filesystem
             file_path = f"/app/uploads/{current_user.current_company_id}/{file_meta['stored_filename']}"
             with open(file_path, "rb") as f:
@@ -212,6 +208,7 @@ async def download_file(
 async def list_files(
     related_to_type: Optional[str] = None,
     related_to_id: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user)
 ):
     """List all files for the company"""
@@ -225,9 +222,9 @@ async def list_files(
     if related_to_id:
         query["related_to_id"] = related_to_id
     
-    files = await db.file_metadata.find(query).to_list(length=None)
+    files = await fetch_page(db.file_metadata, query, "upload_date", page, direction=-1, model=FileMetadata)
     
-    return [FileMetadata(**file) for file in files]
+    return trusted_list_response(FileMetadata, files)
 
 
 @router.get("/{file_id}", response_model=FileMetadata)
@@ -0,0 +1,108 @@
+"""
+Live Fleet Feed
+Per-company broadcast of vehicle position changes to Server-Sent Events subscribers
+"""
+
+import asyncio
+import os
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+import orjson
+
+# Idle interval after which a keep-alive comment is sent
+FLEET_FEED_HEARTBEAT_SECONDS = float(os.environ.get('FLEET_FEED_HEARTBEAT_SECONDS', 15))
+# Open streams allowed per company
+FLEET_FEED_MAX_SUBSCRIBERS = int(os.environ.get('FLEET_FEED_MAX_SUBSCRIBERS', 200))
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data, option=orjson.OPT_UTC_Z) + b"\n\n"
+
+
+class Subscription:
+    """One client's pending updates, coalesced per vehicle.
+
+    A slow client never accumulates a backlog: a vehicle that moves several
+    times before the client reads again is delivered once, at its latest
+    position. When vehicle_ids is given, only those vehicles are delivered.
+    """
+
+    def __init__(self, company_id: str, vehicle_ids: Optional[Set[str]] = None):
+        self.company_id = company_id
+        self.vehicle_ids = vehicle_ids
+        self.pending: Dict[str, dict] = {}
+        self.wakeup = asyncio.Event()
+
+    def offer(self, vehicle_id: str, position: dict) -> None:
+        if self.vehicle_ids is not None and vehicle_id not in self.vehicle_ids:
+            return
+        self.pending[vehicle_id] = position
+        self.wakeup.set()
+
+    def take(self) -> Dict[str, dict]:
+        pending, self.pending = self.pending, {}
+        self.wakeup.clear()
+        return pending
+
+
+class FleetFeed:
+    """In-process fan-out of position updates.
+
+    Only writes handled by this process reach its subscribers, so with
+    several workers the stream has to be pinned to the worker that ingests
+    the company's GPS traffic (or run a single worker for the feed).
+    """
+
+    def __init__(self):
+        self._subscriptions: Dict[str, Set[Subscription]] = defaultdict(set)
+        self.published = 0
+
+    def subscribe(self, company_id: str, vehicle_ids: Optional[Set[str]] = None) -> Optional[Subscription]:
+        """A new subscription, or None when the company is at FLEET_FEED_MAX_SUBSCRIBERS"""
+        if len(self._subscriptions[company_id]) >= FLEET_FEED_MAX_SUBSCRIBERS:
+            return None
+        subscription = Subscription(company_id, vehicle_ids)
+        self._subscriptions[company_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.company_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.company_id]
+
+    def publish(self, company_id: str, vehicle_id: str, position: dict) -> None:
+        """Hand a vehicle's new position to every subscriber of its company"""
+        subscriptions = self._subscriptions.get(company_id)
+        if not subscriptions:
+            return
+        self.published += 1
+        for subscription in subscriptions:
+            subscription.offer(vehicle_id, position)
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    async def stream(self, subscription: Subscription, snapshot: list, is_disconnected) -> AsyncIterator[bytes]:
+        """SSE byte stream: the current snapshot, then coalesced position events"""
+        try:
+            yield b"retry: 5000\n\n"
+            yield sse_event("snapshot", snapshot)
+            while True:
+                try:
+                    await asyncio.wait_for(subscription.wakeup.wait(), FLEET_FEED_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        return
+                    yield b": keep-alive\n\n"
+                    continue
+                for position in subscription.take().values():
+                    yield sse_event("position", position)
+        finally:
+            self.unsubscribe(subscription)
+
+
+fleet_feed = FleetFeed()
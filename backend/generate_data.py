@@ -0,0 +1,450 @@
+"""
+Synthetic Data Generator
+Production-like volumes of referentially consistent tenant data for performance work
+
+Each generated company gets users, departments and employees, a chart of
+accounts with balanced journal entries (account balances match the posted
+lines), warehouses and products with stock movements (stock balances match the
+movements), daily attendance, vehicles with GPS tracks, and CRM leads.
+Documents are written with insert_many in parallel batches.
+
+Usage:
+    python generate_data.py --companies 5 --journal-entries 200000 --gps-points 50000
+    python generate_data.py --db-name khairat_perf --companies 1 --stock-movements 1000000
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import typer
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Project modules read settings at import time, so .env is loaded first
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from models import Company, User, UserRole, Department, Employee, Attendance, Vehicle, GeoPoint
+from accounting_models import (
+    Account, AccountType, AccountSubType, JournalEntry, JournalEntryLine, JournalEntryStatus, EntryType
+)
+from warehouse_models import (
+    Warehouse, WarehouseType, Product, ProductType, UnitOfMeasure, StockBalance, StockMovement, MovementType
+)
+from crm_models import Lead, LeadSource, LeadStatus
+from passwords import pwd_context
+from sequences import seed_counters
+from storage import to_storage
+from indexes import ensure_collections, ensure_indexes
+from vehicle_tracking import POSITIONS_COLLECTION, GpsPoint, position_document
+
+app = typer.Typer(help="Generate production-like data volumes")
+
+FIRST_NAMES = ["Ahmad", "Mohammad", "Omar", "Khalid", "Fatima", "Layla", "Sara", "Yousef", "Hassan", "Rania",
+               "Ali", "Noor", "Zaid", "Huda", "Tariq", "Mona", "Samer", "Dana", "Faisal", "Reem"]
+LAST_NAMES = ["Al-Tarawneh", "Haddad", "Khoury", "Nasser", "Saleh", "Odeh", "Qasem", "Zoubi", "Majali", "Shami"]
+CITIES = ["Amman", "Irbid", "Zarqa", "Aqaba", "Mafraq", "Karak", "Riyadh", "Jeddah", "Dammam"]
+DEPARTMENTS = [("Operations", "العمليات", "OPS"), ("Finance", "المالية", "FIN"), ("Sales", "المبيعات", "SLS"),
+               ("Logistics", "الخدمات اللوجستية", "LOG"), ("Maintenance", "الصيانة", "MNT")]
+
+# (code, name, name_ar, type, subtype); journal lines pick debit/credit pairs from these
+CHART_OF_ACCOUNTS = [
+    ("1100", "Cash", "النقد", AccountType.ASSET, AccountSubType.CURRENT_ASSET),
+    ("1200", "Accounts Receivable", "الذمم المدينة", AccountType.ASSET, AccountSubType.CURRENT_ASSET),
+    ("1300", "Inventory", "المخزون", AccountType.ASSET, AccountSubType.CURRENT_ASSET),
+    ("2100", "Accounts Payable", "الذمم الدائنة", AccountType.LIABILITY, AccountSubType.CURRENT_LIABILITY),
+    ("3100", "Owner Equity", "حقوق الملكية", AccountType.EQUITY, AccountSubType.OWNER_EQUITY),
+    ("4100", "Sales Revenue", "إيرادات المبيعات", AccountType.REVENUE, AccountSubType.OPERATING_REVENUE),
+    ("5100", "Fuel Expense", "مصروف الوقود", AccountType.EXPENSE, AccountSubType.OPERATING_EXPENSE),
+    ("5200", "Salaries Expense", "مصروف الرواتب", AccountType.EXPENSE, AccountSubType.OPERATING_EXPENSE),
+]
+
+# Base coordinates (Amman) for generated GPS tracks
+BASE_LAT, BASE_LNG = 31.9454, 35.9284
+
+
+# ============================================================================
+# BATCH WRITER
+# ============================================================================
+
+class BatchWriter:
+    """Buffers documents per collection and writes them with insert_many.
+
+    Up to `workers` batches are in flight at once; add() waits for a free
+    slot when that limit is reached, so memory stays bounded by
+    batch_size * workers documents.
+    """
+
+    def __init__(self, db, batch_size: int, workers: int):
+        self.db = db
+        self.batch_size = batch_size
+        self._buffers: Dict[str, List[dict]] = defaultdict(list)
+        self._slots = asyncio.Semaphore(workers)
+        self._tasks: set = set()
+        self.written: Dict[str, int] = defaultdict(int)
+
+    async def add(self, collection: str, doc: dict) -> None:
+        buffer = self._buffers[collection]
+        buffer.append(doc)
+        if len(buffer) >= self.batch_size:
+            self._buffers[collection] = []
+            await self._submit(collection, buffer)
+
+    async def _submit(self, collection: str, docs: List[dict]) -> None:
+        await self._slots.acquire()
+        task = asyncio.create_task(self._write(collection, docs))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, collection: str, docs: List[dict]) -> None:
+        try:
+            await self.db[collection].insert_many(docs, ordered=False)
+            self.written[collection] += len(docs)
+        finally:
+            self._slots.release()
+
+    async def flush(self) -> None:
+        for collection, docs in list(self._buffers.items()):
+            if docs:
+                self._buffers[collection] = []
+                await self._submit(collection, docs)
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+
+def stored(obj) -> dict:
+    """Model dump with datetimes in the configured storage representation"""
+    return _convert(obj.model_dump())
+
+
+def _convert(value):
+    if isinstance(value, datetime):
+        return to_storage(value)
+    if isinstance(value, dict):
+        return {key: _convert(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_convert(item) for item in value]
+    return value
+
+
+# ============================================================================
+# GENERATORS
+# ============================================================================
+
+class CompanyGenerator:
+    """Generates one company's data; every reference points at a generated document"""
+
+    def __init__(self, writer: BatchWriter, number: int, options: dict, hashed_password: str, seed: int):
+        self.writer = writer
+        self.number = number
+        self.options = options
+        self.hashed_password = hashed_password
+        self.rng = random.Random(seed * 1000 + number)
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.company = Company(
+            name=f"شركة البيانات التجريبية {number}", name_en=f"Generated Company {number}",
+            city=self.rng.choice(CITIES), max_users=10000, max_equipment=10000
+        )
+        self.owner: Optional[User] = None
+        self.employees: List[Employee] = []
+
+    @property
+    def company_id(self) -> str:
+        return self.company.id
+
+    def _days_ago(self, max_days: int) -> datetime:
+        return self.now - timedelta(days=self.rng.randint(0, max_days), seconds=self.rng.randint(0, 86399))
+
+    def _name(self):
+        return self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+
+    async def run(self) -> None:
+        await self.writer.add("companies", stored(self.company))
+        await self.people()
+        await self.accounting()
+        await self.warehouse()
+        await self.attendance()
+        await self.fleet()
+        await self.leads()
+
+    async def people(self) -> None:
+        prefix = f"gen{self.number}"
+        self.owner = User(
+            username=f"{prefix}_owner", email=f"owner@{prefix}.local", full_name=f"Owner {self.number}",
+            company_id=self.company_id, companies=[self.company_id], role=UserRole.OWNER
+        )
+        await self.writer.add("users", {**stored(self.owner), "hashed_password": self.hashed_password})
+
+        departments = [
+            Department(company_id=self.company_id, name=name, name_ar=name_ar, code=code, path=code)
+            for name, name_ar, code in DEPARTMENTS
+        ]
+        counts = defaultdict(int)
+        roles = [UserRole.DRIVER, UserRole.DRIVER, UserRole.FOREMAN, UserRole.GUARD, UserRole.ACCOUNTANT, UserRole.MANAGER]
+        for i in range(1, self.options["employees"] + 1):
+            first, last = self._name()
+            department = departments[i % len(departments)]
+            user = User(
+                username=f"{prefix}_emp{i}", email=f"emp{i}@{prefix}.local", full_name=f"{first} {last}",
+                company_id=self.company_id, companies=[self.company_id], role=self.rng.choice(roles)
+            )
+            employee = Employee(
+                company_id=self.company_id, user_id=user.id, employee_number=f"EMP-{i:05d}",
+                full_name=user.full_name, full_name_ar=user.full_name, phone=f"+9627{self.rng.randint(70000000, 99999999)}",
+                department_id=department.id, department_name=department.name,
+                position_title=user.role.value.title(), position_title_ar=user.role.value,
+                hire_date=self._days_ago(3650), base_salary=float(self.rng.randrange(400, 3000, 50))
+            )
+            counts[department.id] += 1
+            self.employees.append(employee)
+            await self.writer.add("users", {**stored(user), "hashed_password": self.hashed_password})
+            await self.writer.add("employees", stored(employee))
+        # No bump_tree_version: companies are always new here, so no server has cached their tree
+        for department in departments:
+            department.employee_count = counts[department.id]
+            await self.writer.add("departments", stored(department))
+
+    async def accounting(self) -> None:
+        accounts = [
+            Account(company_id=self.company_id, account_code=code, account_name=name, account_name_ar=name_ar,
+                    account_type=account_type, account_subtype=subtype)
+            for code, name, name_ar, account_type, subtype in CHART_OF_ACCOUNTS
+        ]
+        balances = defaultdict(float)
+        entries = self.options["journal_entries"]
+        for i in range(1, entries + 1):
+            entry_date = self._days_ago(730)
+            debit, credit = self.rng.sample(accounts, 2)
+            amount = round(self.rng.uniform(50, 25000), 2)
+            line_amounts = [(debit, EntryType.DEBIT, amount)]
+            # Split the credit side over one to three lines
+            parts = self.rng.randint(1, 3)
+            remaining = amount
+            for part in range(parts):
+                share = remaining if part == parts - 1 else round(remaining * self.rng.uniform(0.2, 0.6), 2)
+                remaining = round(remaining - share, 2)
+                line_amounts.append((credit if part == 0 else self.rng.choice(accounts), EntryType.CREDIT, share))
+
+            lines = [
+                JournalEntryLine(account_id=account.id, account_code=account.account_code, account_name=account.account_name,
+                                 entry_type=entry_type, amount=value, amount_base_currency=value)
+                for account, entry_type, value in line_amounts
+            ]
+            # Everything older than a week is posted; recent entries stay draft
+            posted = entry_date < self.now - timedelta(days=7)
+            entry = JournalEntry(
+                company_id=self.company_id, entry_number=f"JE-{i:06d}", entry_date=entry_date,
+                description=f"Generated entry {i}", lines=lines, total_debit=amount, total_credit=amount,
+                status=JournalEntryStatus.POSTED if posted else JournalEntryStatus.DRAFT,
+                posting_date=entry_date if posted else None, posted_by=self.owner.username if posted else None,
+                created_by=self.owner.username, created_at=entry_date, updated_at=entry_date
+            )
+            if posted:
+                for account, entry_type, value in line_amounts:
+                    increases = (entry_type == EntryType.DEBIT) == (account.account_type in (AccountType.ASSET, AccountType.EXPENSE))
+                    balances[account.id] += value if increases else -value
+            await self.writer.add("journal_entries", stored(entry))
+
+        for account in accounts:
+            account.current_balance = round(balances[account.id], 2)
+            await self.writer.add("accounts", stored(account))
+
+    async def warehouse(self) -> None:
+        warehouses = [
+            Warehouse(company_id=self.company_id, warehouse_code=f"WH-{i:02d}", warehouse_name=f"Warehouse {i}",
+                      warehouse_type=WarehouseType.MAIN if i == 1 else WarehouseType.REGIONAL)
+            for i in range(1, self.options["warehouses"] + 1)
+        ]
+        products = [
+            Product(company_id=self.company_id, product_code=f"P-{i:05d}", product_name=f"Product {i}",
+                    product_type=self.rng.choice(list(ProductType)), unit_of_measure=self.rng.choice(list(UnitOfMeasure)),
+                    unit_cost=round(self.rng.uniform(1, 500), 2))
+            for i in range(1, self.options["products"] + 1)
+        ]
+        for warehouse in warehouses:
+            await self.writer.add("warehouses", stored(warehouse))
+        for product in products:
+            await self.writer.add("products", stored(product))
+
+        on_hand = defaultdict(float)
+        movements = self.options["stock_movements"]
+        # Chronological so issues never take stock below zero
+        dates = sorted(self._days_ago(365) for _ in range(movements))
+        for i, movement_date in enumerate(dates, start=1):
+            product = self.rng.choice(products)
+            warehouse = self.rng.choice(warehouses)
+            key = (product.id, warehouse.id)
+            quantity = float(self.rng.randint(1, 100))
+            if on_hand[key] >= quantity and self.rng.random() < 0.45:
+                movement_type = MovementType.ISSUE
+                on_hand[key] -= quantity
+                source, destination = warehouse.id, None
+            else:
+                movement_type = MovementType.RECEIPT
+                on_hand[key] += quantity
+                source, destination = None, warehouse.id
+            movement = StockMovement(
+                company_id=self.company_id, movement_number=f"MOV-{i:06d}", movement_date=movement_date,
+                movement_type=movement_type, product_id=product.id, product_code=product.product_code,
+                product_name=product.product_name, from_warehouse_id=source, to_warehouse_id=destination,
+                quantity=quantity, unit_cost=product.unit_cost, total_cost=round(quantity * product.unit_cost, 2),
+                created_by=self.owner.username, created_at=movement_date, updated_at=movement_date
+            )
+            await self.writer.add("stock_movements", stored(movement))
+
+        products_by_id = {product.id: product for product in products}
+        warehouses_by_id = {warehouse.id: warehouse for warehouse in warehouses}
+        for (product_id, warehouse_id), quantity in on_hand.items():
+            product, warehouse = products_by_id[product_id], warehouses_by_id[warehouse_id]
+            balance = StockBalance(
+                company_id=self.company_id, product_id=product.id, product_code=product.product_code,
+                product_name=product.product_name, warehouse_id=warehouse.id, warehouse_name=warehouse.warehouse_name,
+                quantity_on_hand=quantity, quantity_available=quantity, unit_cost=product.unit_cost,
+                total_value=round(quantity * product.unit_cost, 2)
+            )
+            await self.writer.add("stock_balance", stored(balance))
+
+    async def attendance(self) -> None:
+        today = self.now.replace(hour=0, minute=0, second=0)
+        for day in range(self.options["attendance_days"], 0, -1):
+            date = today - timedelta(days=day)
+            if date.weekday() == 4:  # Friday
+                continue
+            for employee in self.employees:
+                if self.rng.random() < 0.05:  # Absent
+                    continue
+                check_in = date + timedelta(hours=self.rng.uniform(5, 7))
+                hours = round(self.rng.uniform(7.5, 10.5), 2)
+                row = Attendance(
+                    company_id=self.company_id, employee_name=employee.full_name, employee_id=employee.id,
+                    department=employee.department_name, date=date, check_in=check_in,
+                    check_out=check_in + timedelta(hours=hours), hours_worked=hours,
+                    overtime_hours=round(max(0.0, hours - 8), 2), break_hours=1.0
+                )
+                await self.writer.add("attendance", stored(row))
+
+    async def fleet(self) -> None:
+        drivers = self.employees or [None]
+        points = self.options["gps_points"]
+        interval = timedelta(seconds=30)
+        for i in range(1, self.options["vehicles"] + 1):
+            driver = self.rng.choice(drivers)
+            vehicle = Vehicle(
+                company_id=self.company_id, vehicle_number=f"V-{i:04d}", vehicle_type=self.rng.choice(["truck", "loader", "excavator"]),
+                make=self.rng.choice(["Volvo", "Mercedes", "CAT", "MAN"]), model="Generated", year=self.rng.randint(2010, 2025),
+                license_plate=f"{self.rng.randint(10, 99)}-{self.rng.randint(10000, 99999)}",
+                assigned_driver_id=driver.id if driver else None, assigned_driver_name=driver.full_name if driver else None
+            )
+            # Random walk around the base, one fix every 30 seconds ending now
+            lat = BASE_LAT + self.rng.uniform(-0.3, 0.3)
+            lng = BASE_LNG + self.rng.uniform(-0.3, 0.3)
+            heading = self.rng.uniform(0, 360)
+            timestamp = self.now - interval * points
+            odometer = self.rng.uniform(10000, 300000)
+            for _ in range(points):
+                timestamp += interval
+                speed = max(0.0, self.rng.gauss(45, 20))
+                heading = (heading + self.rng.gauss(0, 15)) % 360
+                step = speed / 3600 * 30 / 111  # degrees travelled in 30 s
+                lat += step * self.rng.uniform(-1, 1)
+                lng += step * self.rng.uniform(-1, 1)
+                odometer += speed / 120
+                await self.writer.add(POSITIONS_COLLECTION, position_document(
+                    self.company_id, vehicle.id, vehicle.assigned_driver_id,
+                    GpsPoint(timestamp=timestamp, latitude=round(lat, 6), longitude=round(lng, 6),
+                             speed_kmh=round(speed, 1), heading=round(heading, 1))
+                ))
+            if points:
+                vehicle.last_location_lat = round(lat, 6)
+                vehicle.last_location_lng = round(lng, 6)
+                vehicle.last_location = GeoPoint(coordinates=[vehicle.last_location_lng, vehicle.last_location_lat])
+                vehicle.last_location_update = timestamp
+            vehicle.odometer = round(odometer, 1)
+            await self.writer.add("vehicles", stored(vehicle))
+
+    async def leads(self) -> None:
+        for i in range(1, self.options["leads"] + 1):
+            first, last = self._name()
+            created = self._days_ago(540)
+            lead = Lead(
+                company_id=self.company_id, lead_number=f"LEAD-{i:06d}", first_name=first, last_name=last,
+                full_name=f"{first} {last}", email=f"{first.lower()}.{i}@example.com", company=f"Client {i % 500}",
+                city=self.rng.choice(CITIES), source=self.rng.choice(list(LeadSource)),
+                status=self.rng.choice(list(LeadStatus)), estimated_value=round(self.rng.uniform(1000, 500000), 2),
+                assigned_to=self.owner.id, assigned_to_name=self.owner.full_name, created_at=created, updated_at=created
+            )
+            await self.writer.add("leads", stored(lead))
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+async def generate(options: dict, companies: int, db_name: str, batch_size: int, workers: int,
+                   password: str, seed: int, build_indexes: bool) -> None:
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[db_name]
+    writer = BatchWriter(db, batch_size, workers)
+    hashed_password = pwd_context.hash(password)
+    started_at = time.perf_counter()
+    try:
+        # GPS fixes go to a time-series collection, which must exist before the first insert
+        await ensure_collections(db)
+        for number in range(1, companies + 1):
+            existing = await db.companies.count_documents({"name_en": f"Generated Company {number}"}, limit=1)
+            if existing:
+                typer.echo(f"Generated Company {number} already exists, skipping")
+                continue
+            await CompanyGenerator(writer, number, options, hashed_password, seed).run()
+            typer.echo(f"Generated company {number}/{companies}")
+        await writer.flush()
+
+        await seed_counters(db, ["journal_entries", "stock_movements", "leads"])
+        if build_indexes:
+            await ensure_indexes(db)
+    finally:
+        client.close()
+
+    elapsed = time.perf_counter() - started_at
+    total = sum(writer.written.values())
+    for collection, count in sorted(writer.written.items()):
+        typer.echo(f"{collection:<20} {count:>12,}")
+    typer.echo(f"{total:,} documents in {elapsed:.1f}s ({total / elapsed:,.0f} docs/s)")
+
+
+@app.command()
+def run(
+    companies: int = typer.Option(1, help="Companies to generate"),
+    employees: int = typer.Option(200, help="Employees (each with a user) per company"),
+    journal_entries: int = typer.Option(50000, help="Journal entries per company (2-4 lines each)"),
+    warehouses: int = typer.Option(5, help="Warehouses per company"),
+    products: int = typer.Option(500, help="Products per company"),
+    stock_movements: int = typer.Option(100000, help="Stock movements per company"),
+    attendance_days: int = typer.Option(365, help="Days of attendance per employee"),
+    vehicles: int = typer.Option(20, help="Vehicles per company"),
+    gps_points: int = typer.Option(10000, help="GPS fixes per vehicle (30 s apart)"),
+    leads: int = typer.Option(20000, help="CRM leads per company"),
+    db_name: Optional[str] = typer.Option(None, help="Target database (default DB_NAME)"),
+    batch_size: int = typer.Option(5000, help="Documents per insert_many"),
+    workers: int = typer.Option(8, help="Concurrent insert_many batches"),
+    password: str = typer.Option("password123", help="Password of every generated user"),
+    seed: int = typer.Option(42, help="Random seed"),
+    indexes: bool = typer.Option(True, help="Reconcile indexes after loading"),
+):
+    """Generate companies with production-like data volumes"""
+    options = {
+        "employees": employees, "journal_entries": journal_entries, "warehouses": max(1, warehouses),
+        "products": max(1, products), "stock_movements": stock_movements, "attendance_days": attendance_days,
+        "vehicles": vehicles, "gps_points": gps_points, "leads": leads,
+    }
+    asyncio.run(generate(options, companies, db_name or os.environ['DB_NAME'], batch_size, workers, password, seed, indexes))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,166 @@
+"""
+Geofence API Routes
+Company site polygons (quarries, depots) and the enter/exit events of vehicles crossing them
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+
+from models import User, Geofence, GeofenceCreate, GeofenceEvent
+from server import get_current_user, db, serialize_datetime, assigned_vehicles_only, assigned_vehicle_ids, get_tracked_vehicle
+from pagination import PageParams, page_params, fetch_page
+from responses import trusted_list_response
+from storage import storage_now, to_storage
+from geofences import GEOFENCES_COLLECTION, GEOFENCE_EVENTS_COLLECTION, geofence_engine, polygon_geometry
+
+router = APIRouter(prefix="/api/geofences", tags=["Geofences"])
+
+
+def build_geofence(data: GeofenceCreate, company_id: str) -> Geofence:
+    geometry, bbox = polygon_geometry(data.points)
+    return Geofence(
+        company_id=company_id, name=data.name, name_ar=data.name_ar, site_type=data.site_type,
+        geometry=geometry, bbox=bbox, is_active=data.is_active
+    )
+
+
+async def release_vehicles(company_id: str, geofence_id: str) -> None:
+    """Forget a deleted or deactivated fence on the vehicles inside it.
+
+    They leave it silently rather than emitting an exit, with no fence name,
+    on their next fix.
+    """
+    await db.vehicles.update_many(
+        {"company_id": company_id, "geofence_ids": geofence_id},
+        {"$pull": {"geofence_ids": geofence_id}}
+    )
+
+
+# ============================================================================
+# GEOFENCES
+# ============================================================================
+
+@router.post("", response_model=Geofence)
+async def create_geofence(geofence_data: GeofenceCreate, user: User = Depends(get_current_user)):
+    """Create a site polygon"""
+    if not user.has_permission("vehicles", "create"):
+        raise HTTPException(status_code=403, detail="You don't have permission to create geofences")
+
+    if not user.current_company_id:
+        raise HTTPException(status_code=400, detail="No company context")
+
+    geofence_obj = build_geofence(geofence_data, user.current_company_id)
+    doc = geofence_obj.model_dump()
+    serialize_datetime(doc)
+
+    await db[GEOFENCES_COLLECTION].insert_one(doc)
+    geofence_engine.invalidate(user.current_company_id)
+    return geofence_obj
+
+
+@router.get("", response_model=List[Geofence])
+async def get_geofences(
+    is_active: Optional[bool] = None,
+    page: PageParams = Depends(page_params),
+    user: User = Depends(get_current_user)
+):
+    if not user.has_permission("vehicle_location", "read"):
+        raise HTTPException(status_code=403, detail="You don't have permission to view geofences")
+
+    query = {"company_id": user.current_company_id}
+    if is_active is not None:
+        query["is_active"] = is_active
+    geofences = await fetch_page(db[GEOFENCES_COLLECTION], query, "created_at", page, model=Geofence)
+    return trusted_list_response(Geofence, geofences)
+
+
+@router.get("/events", response_model=List[GeofenceEvent])
+async def get_geofence_events(
+    vehicle_id: Optional[str] = None,
+    geofence_id: Optional[str] = None,
+    event: Optional[str] = Query(None, pattern="^(enter|exit)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    page: PageParams = Depends(page_params),
+    user: User = Depends(get_current_user)
+):
+    """Enter/exit events, newest first; drivers only see events of their assigned vehicles"""
+    if not user.has_permission("vehicle_location", "read"):
+        raise HTTPException(status_code=403, detail="You don't have permission to view geofence events")
+
+    query = {"company_id": user.current_company_id}
+    if vehicle_id:
+        if assigned_vehicles_only(user):
+            await get_tracked_vehicle(user, vehicle_id)
+        query["vehicle_id"] = vehicle_id
+    elif assigned_vehicles_only(user):
+        query["vehicle_id"] = {"$in": await assigned_vehicle_ids(user)}
+    if geofence_id:
+        query["geofence_id"] = geofence_id
+    if event:
+        query["event"] = event
+    if start or end:
+        query["timestamp"] = {}
+        if start:
+            query["timestamp"]["$gte"] = to_storage(start)
+        if end:
+            query["timestamp"]["$lte"] = to_storage(end)
+    events = await fetch_page(db[GEOFENCE_EVENTS_COLLECTION], query, "timestamp", page, direction=-1, model=GeofenceEvent)
+    return trusted_list_response(GeofenceEvent, events)
+
+
+@router.get("/containing")
+async def get_geofences_containing(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    user: User = Depends(get_current_user)
+):
+    """Active geofences that contain a point"""
+    if not user.has_permission("vehicle_location", "read"):
+        raise HTTPException(status_code=403, detail="You don't have permission to view geofences")
+
+    index = await geofence_engine.index(db, user.current_company_id)
+    return [{"id": fence.id, "name": fence.name} for fence in index.containing(lat, lng)]
+
+
+@router.put("/{geofence_id}", response_model=Geofence)
+async def update_geofence(geofence_id: str, geofence_data: GeofenceCreate, user: User = Depends(get_current_user)):
+    """Replace a site polygon"""
+    if not user.has_permission("vehicles", "update"):
+        raise HTTPException(status_code=403, detail="You don't have permission to update geofences")
+
+    existing = await db[GEOFENCES_COLLECTION].find_one(
+        {"id": geofence_id, "company_id": user.current_company_id}, {"_id": 0}
+    )
+    if not existing:
+        raise HTTPException(status_code=404, detail="Geofence not found")
+
+    geofence_obj = build_geofence(geofence_data, user.current_company_id)
+    geofence_obj.id = geofence_id
+    update_data = geofence_obj.model_dump(exclude={"id", "company_id", "created_at"})
+    serialize_datetime(update_data)
+    update_data["updated_at"] = storage_now()
+
+    await db[GEOFENCES_COLLECTION].update_one({"id": geofence_id, "company_id": user.current_company_id}, {"$set": update_data})
+    if not geofence_obj.is_active:
+        await release_vehicles(user.current_company_id, geofence_id)
+    geofence_engine.invalidate(user.current_company_id)
+
+    updated_doc = await db[GEOFENCES_COLLECTION].find_one({"id": geofence_id}, {"_id": 0})
+    return Geofence(**updated_doc)
+
+
+@router.delete("/{geofence_id}")
+async def delete_geofence(geofence_id: str, user: User = Depends(get_current_user)):
+    if not user.has_permission("vehicles", "delete"):
+        raise HTTPException(status_code=403, detail="You don't have permission to delete geofences")
+
+    result = await db[GEOFENCES_COLLECTION].delete_one({"id": geofence_id, "company_id": user.current_company_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Geofence not found")
+
+    await release_vehicles(user.current_company_id, geofence_id)
+    geofence_engine.invalidate(user.current_company_id)
+    return {"message": "Geofence deleted successfully"}
@@ -0,0 +1,181 @@
+"""
+Geofence Engine
+Point-in-polygon evaluation of vehicle positions against company sites, with a grid prefilter
+"""
+
+import math
+import os
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from cache import TTLCache
+from models import Coordinate, GeofenceEvent
+from storage import to_storage, to_native, as_utc
+
+GEOFENCES_COLLECTION = "geofences"
+GEOFENCE_EVENTS_COLLECTION = "geofence_events"
+
+# Grid cell size in degrees (0.01 is about 1.1 km)
+GEOFENCE_GRID_DEGREES = float(os.environ.get('GEOFENCE_GRID_DEGREES', 0.01))
+# Fences spanning more cells than this skip the grid and are checked by bounding box
+GEOFENCE_MAX_CELLS = int(os.environ.get('GEOFENCE_MAX_CELLS', 10000))
+# How long a company's compiled fences are reused; writes through the API invalidate them at once
+GEOFENCE_CACHE_TTL_SECONDS = float(os.environ.get('GEOFENCE_CACHE_TTL_SECONDS', 60))
+
+
+def polygon_geometry(points: List[Coordinate]) -> Tuple[Dict[str, Any], List[float]]:
+    """GeoJSON Polygon (closed ring) and [min_lng, min_lat, max_lng, max_lat] of a vertex list"""
+    ring = [[point.longitude, point.latitude] for point in points]
+    if ring[0] != ring[-1]:
+        ring.append(ring[0])
+    lngs = [lng for lng, _ in ring]
+    lats = [lat for _, lat in ring]
+    return {"type": "Polygon", "coordinates": [ring]}, [min(lngs), min(lats), max(lngs), max(lats)]
+
+
+class CompiledFence:
+    __slots__ = ("id", "name", "bbox", "ring")
+
+    def __init__(self, doc: dict):
+        self.id = doc["id"]
+        self.name = doc["name"]
+        self.bbox = doc["bbox"]
+        self.ring = [tuple(position) for position in doc["geometry"]["coordinates"][0]]
+
+    def contains(self, lng: float, lat: float) -> bool:
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        if not (min_lng <= lng <= max_lng and min_lat <= lat <= max_lat):
+            return False
+        # Ray casting over the outer ring
+        inside = False
+        ring = self.ring
+        x1, y1 = ring[-1]
+        for x2, y2 in ring:
+            if (y2 > lat) != (y1 > lat) and lng < (x1 - x2) * (lat - y2) / (y1 - y2) + x2:
+                inside = not inside
+            x1, y1 = x2, y2
+        return inside
+
+
+class FenceIndex:
+    """A company's active fences bucketed by grid cell.
+
+    A lookup hashes the point to its cell and tests only the fences whose
+    bounding box overlaps that cell, so its cost depends on how many fences
+    are near the point rather than how many the company has.
+    """
+
+    def __init__(self, docs: List[dict], cell_size: float = GEOFENCE_GRID_DEGREES):
+        self.cell_size = cell_size
+        self.fences = [CompiledFence(doc) for doc in docs]
+        self.names = {fence.id: fence.name for fence in self.fences}
+        self.cells: Dict[Tuple[int, int], List[CompiledFence]] = defaultdict(list)
+        self.large: List[CompiledFence] = []
+        for fence in self.fences:
+            min_lng, min_lat, max_lng, max_lat = fence.bbox
+            x0, y0 = self._cell(min_lng, min_lat)
+            x1, y1 = self._cell(max_lng, max_lat)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > GEOFENCE_MAX_CELLS:
+                self.large.append(fence)
+                continue
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    self.cells[(x, y)].append(fence)
+
+    def __len__(self) -> int:
+        return len(self.fences)
+
+    def _cell(self, lng: float, lat: float) -> Tuple[int, int]:
+        return math.floor(lng / self.cell_size), math.floor(lat / self.cell_size)
+
+    def containing(self, lat: float, lng: float) -> List[CompiledFence]:
+        candidates = self.cells.get(self._cell(lng, lat), [])
+        if self.large:
+            candidates = candidates + self.large
+        return [fence for fence in candidates if fence.contains(lng, lat)]
+
+
+class GeofenceEngine:
+    """Compiled fence indexes per company and enter/exit detection"""
+
+    def __init__(self):
+        self._indexes = TTLCache(maxsize=1024, ttl=GEOFENCE_CACHE_TTL_SECONDS)
+
+    def invalidate(self, company_id: str) -> None:
+        self._indexes.pop(company_id)
+
+    async def index(self, db, company_id: str) -> FenceIndex:
+        index = self._indexes.get(company_id)
+        if index is None:
+            docs = await db[GEOFENCES_COLLECTION].find(
+                {"company_id": company_id, "is_active": True},
+                {"_id": 0, "id": 1, "name": 1, "bbox": 1, "geometry": 1}
+            ).to_list(None)
+            index = FenceIndex(docs)
+            self._indexes.set(company_id, index)
+        return index
+
+    async def evaluate(self, db, company_id: str, vehicle_id: str, driver_id: Optional[str], points: list) -> List[dict]:
+        """Check fixes against the company's fences and record enter/exit events.
+
+        The vehicle document holds the fences it is currently inside and the
+        time of the last evaluated fix; fixes at or before that time arrived
+        late and are skipped. Returns the events recorded.
+        """
+        index = await self.index(db, company_id)
+        if not len(index):
+            return []
+
+        vehicle = await db.vehicles.find_one(
+            {"id": vehicle_id, "company_id": company_id},
+            {"_id": 0, "geofence_ids": 1, "geofence_checked_at": 1}
+        )
+        if vehicle is None:
+            return []
+        checked_at = vehicle.get("geofence_checked_at")
+        # Compared as UTC datetimes: ISO strings with different offsets do not order by time
+        checked = as_utc(to_native(checked_at)) if checked_at is not None else None
+        inside: Set[str] = set(vehicle.get("geofence_ids") or [])
+
+        events = []
+        last_at = None
+        fixes = [(as_utc(point.timestamp), point) for point in points]
+        for timestamp, point in sorted(fixes, key=lambda fix: fix[0]):
+            if checked is not None and timestamp <= checked:
+                continue
+            last_at = to_storage(timestamp)
+            fences = {fence.id: fence for fence in index.containing(point.latitude, point.longitude)}
+            for fence_id in fences.keys() - inside:
+                events.append(self._event(company_id, vehicle_id, driver_id, fence_id, index.names, "enter", timestamp, point))
+            for fence_id in inside - fences.keys():
+                events.append(self._event(company_id, vehicle_id, driver_id, fence_id, index.names, "exit", timestamp, point))
+            inside = set(fences)
+
+        if last_at is None:
+            return []
+        # Conditional on the state read above, so concurrent batches cannot both emit the same transition
+        result = await db.vehicles.update_one(
+            {"id": vehicle_id, "company_id": company_id, "geofence_checked_at": checked_at},
+            {"$set": {"geofence_ids": sorted(inside), "geofence_checked_at": last_at}}
+        )
+        if not result.modified_count or not events:
+            return []
+        docs = []
+        for event in events:
+            doc = event.model_dump()
+            for field in ("timestamp", "created_at", "updated_at"):
+                doc[field] = to_storage(doc[field])
+            docs.append(doc)
+        await db[GEOFENCE_EVENTS_COLLECTION].insert_many(docs, ordered=False)
+        return docs
+
+    @staticmethod
+    def _event(company_id, vehicle_id, driver_id, fence_id, names, kind, timestamp, point) -> GeofenceEvent:
+        return GeofenceEvent(
+            company_id=company_id, vehicle_id=vehicle_id, driver_id=driver_id, geofence_id=fence_id,
+            geofence_name=names.get(fence_id, ""), event=kind, timestamp=timestamp,
+            lat=point.latitude, lng=point.longitude
+        )
+
+
+geofence_engine = GeofenceEngine()
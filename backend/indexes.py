@@ -0,0 +1,303 @@
+"""
+MongoDB Index Registry
+Declarative index definitions for every tenant-scoped collection, reconciled at startup
+"""
+
+import logging
+import os
+from typing import Dict, List, Any
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+def company_index(*keys, unique: bool = False, name: str = None) -> IndexModel:
+    """Build a compound index prefixed with company_id.
+
+    Every list route filters on company_id first, so the tenant key always
+    leads and the sort/filter keys follow in the order they are used.
+    """
+    fields = [("company_id", ASCENDING)]
+    for key in keys:
+        if isinstance(key, tuple):
+            fields.append(key)
+        else:
+            fields.append((key, ASCENDING))
+    if name is None:
+        name = "_".join(["company_id"] + [f"{field}_{direction}" for field, direction in fields[1:]])
+    return IndexModel(fields, name=name, unique=unique)
+
+
+# ============================================================================
+# COLLECTION OPTIONS
+# ============================================================================
+
+# Raw GPS fixes are kept this long (0 keeps them forever)
+GPS_RETENTION_DAYS = int(os.environ.get('GPS_RETENTION_DAYS', 180))
+
+# Collections that must be created explicitly, before anything is written to
+# them or any index is built (either would create a regular collection)
+COLLECTION_OPTIONS: Dict[str, Dict[str, Any]] = {
+    "vehicle_positions": {
+        "timeseries": {"timeField": "timestamp", "metaField": "meta", "granularity": "seconds"},
+        **({"expireAfterSeconds": GPS_RETENTION_DAYS * 86400} if GPS_RETENTION_DAYS > 0 else {}),
+    },
+}
+
+
+async def ensure_collections(db) -> List[str]:
+    """Create the collections in COLLECTION_OPTIONS that do not exist yet"""
+    existing = set(await db.list_collection_names())
+    created = []
+    for collection_name, options in COLLECTION_OPTIONS.items():
+        if collection_name in existing:
+            continue
+        try:
+            await db.create_collection(collection_name, **options)
+            created.append(collection_name)
+        except OperationFailure as e:
+            # Time-series collections need MongoDB 5.0+
+            logger.warning(f"Could not create collection {collection_name}: {e}")
+    if created:
+        logger.info(f"Created collections: {', '.join(created)}")
+    return created
+
+
+# ============================================================================
+# INDEX REGISTRY
+# ============================================================================
+
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    # Platform
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email"),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("token_version", ASCENDING)], name="token_version"),
+    ],
+    "companies": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_1_id_1"),
+    ],
+    "counters": [company_index("name", unique=True)],
+    "monthly_rollups": [company_index("source", "dimension", "month", "key", unique=True)],
+
+    # Operations
+    "equipment": [company_index("is_active", "created_at", "id")],
+    "production": [company_index(("date", DESCENDING), ("id", DESCENDING))],
+    "expenses": [
+        company_index(("date", DESCENDING), ("id", DESCENDING)),
+        company_index("category", ("date", DESCENDING)),
+    ],
+    "invoices": [
+        company_index(("date", DESCENDING), ("id", DESCENDING)),
+        company_index("status", ("date", DESCENDING)),
+    ],
+    "attendance": [company_index(("date", DESCENDING), ("id", DESCENDING))],
+    "costing_centers": [company_index("is_active", "created_at", "id")],
+    "projects": [company_index("created_at", "id")],
+    "feasibility_studies": [company_index("project_id", "created_at", "id")],
+    "investments": [company_index("project_id", "created_at", "id")],
+    "financial_projections": [company_index("project_id", "year", "id")],
+    "documents": [
+        company_index(("created_at", DESCENDING), ("id", DESCENDING)),
+        company_index("project_id", "document_type"),
+    ],
+
+    # HR & Fleet
+    "employees": [company_index("created_at", "id"), company_index("user_id")],
+    "salary_payments": [company_index("employee_id", ("year", DESCENDING), ("month", DESCENDING), ("id", DESCENDING))],
+    "vehicles": [
+        company_index("created_at", "id"),
+        company_index("assigned_driver_id"),
+        company_index(("last_location", GEOSPHERE)),
+    ],
+    "vehicle_positions": [
+        IndexModel([("meta.company_id", ASCENDING), ("meta.vehicle_id", ASCENDING), ("timestamp", DESCENDING)],
+                   name="meta_company_vehicle_timestamp"),
+    ],
+    "geofences": [company_index("is_active", "created_at", "id"), company_index("created_at", "id")],
+    "geofence_events": [
+        company_index(("timestamp", DESCENDING), ("id", DESCENDING)),
+        company_index("vehicle_id", ("timestamp", DESCENDING), ("id", DESCENDING)),
+        company_index("geofence_id", ("timestamp", DESCENDING), ("id", DESCENDING)),
+    ],
+    "departments": [
+        company_index("is_active", "level", "id"),
+        company_index("ancestor_ids", "path"),
+        company_index("id"),
+    ],
+    "positions": [company_index("is_active", "department_id", "level", "id")],
+
+    # Accounting
+    "accounts": [company_index("account_code", unique=True)],
+    "journal_entries": [
+        company_index(("entry_date", DESCENDING), ("id", DESCENDING)),
+        company_index("status", ("entry_date", DESCENDING), ("id", DESCENDING)),
+    ],
+    "vendors": [company_index("vendor_code", unique=True), company_index("vendor_name", "id")],
+    "vendor_bills": [
+        company_index(("bill_date", DESCENDING), ("id", DESCENDING)),
+        company_index("vendor_id", ("bill_date", DESCENDING), ("id", DESCENDING)),
+    ],
+    "customers": [company_index("customer_code", unique=True), company_index("customer_name", "id")],
+    "ar_invoices": [
+        company_index(("invoice_date", DESCENDING), ("id", DESCENDING)),
+        company_index("customer_id", ("invoice_date", DESCENDING), ("id", DESCENDING)),
+    ],
+    "fixed_assets": [company_index("asset_code", unique=True)],
+    "tax_configuration": [company_index("created_at", "id")],
+    "exchange_rates": [
+        company_index(("effective_date", DESCENDING), ("id", DESCENDING)),
+        company_index("from_currency", "to_currency", ("effective_date", DESCENDING)),
+    ],
+
+    # Enhanced Accounting
+    "bank_accounts": [company_index("created_at", "id")],
+    "bank_statements": [company_index("created_at", "id"), company_index("bank_account_id")],
+    "bank_reconciliations": [company_index("created_at", "id"), company_index("bank_account_id")],
+    "expense_claims": [company_index("created_at", "id"), company_index("status")],
+    "budgets": [company_index("created_at", "id"), company_index("status")],
+    "payment_terms": [company_index("is_active", "created_at", "id")],
+    "payment_batches": [company_index("created_at", "id"), company_index("status")],
+
+    # CRM
+    "leads": [
+        company_index(("created_at", DESCENDING), ("id", DESCENDING)),
+        company_index("status", ("created_at", DESCENDING)),
+    ],
+    "crm_accounts": [company_index("account_name", "id")],
+    "crm_contacts": [company_index("last_name", "id"), company_index("account_id")],
+    "opportunities": [company_index("close_date", "id"), company_index("is_closed")],
+    "cases": [company_index(("opened_date", DESCENDING), ("id", DESCENDING)), company_index("status")],
+    "campaigns": [company_index(("start_date", DESCENDING), ("id", DESCENDING))],
+
+    # Enhanced CRM
+    "tasks": [company_index("created_at", "id"), company_index("assigned_to", "status")],
+    "activities": [company_index("created_at", "id"), company_index("related_to_type", "related_to_id")],
+    "crm_products": [company_index("created_at", "id"), company_index("product_code")],
+    "contracts": [company_index("created_at", "id"), company_index("status")],
+    "email_templates": [company_index("is_active", "created_at", "id")],
+    "emails": [company_index("created_at", "id")],
+    "forecasts": [company_index("created_at", "id")],
+
+    # Warehouse
+    "warehouses": [company_index("created_at", "id")],
+    "products": [company_index("product_code", unique=True)],
+    "stock_balance": [company_index("product_id", "warehouse_id"), company_index("warehouse_id")],
+    "stock_movements": [
+        company_index(("movement_date", DESCENDING), ("id", DESCENDING)),
+        company_index("product_id", ("movement_date", DESCENDING)),
+    ],
+    "purchase_orders": [company_index(("po_date", DESCENDING), ("id", DESCENDING)), company_index("vendor_id")],
+    "stock_adjustments": [company_index(("adjustment_date", DESCENDING), ("id", DESCENDING))],
+
+    # Files
+    "file_metadata": [
+        IndexModel([("file_id", ASCENDING)], name="file_id_unique", unique=True),
+        company_index("is_deleted", ("upload_date", DESCENDING), ("id", DESCENDING)),
+    ],
+}
+
+
+def _key_signature(key) -> tuple:
+    """Normalize an index key document to a comparable tuple"""
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction)
+                 for field, direction in key.items())
+
+
+async def ensure_indexes(db) -> Dict[str, Any]:
+    """Create every registry index that is missing from the database.
+
+    Indexes are created one at a time so that a failure (typically a unique
+    index over existing duplicate natural keys) does not prevent the rest of
+    the registry from being applied. Failures are logged and returned.
+    """
+    await ensure_collections(db)
+    created = []
+    failed = []
+
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        existing = await db[collection_name].index_information()
+        existing_keys = {_key_signature(dict(info["key"])) for info in existing.values()}
+
+        for index in indexes:
+            spec = index.document
+            if spec["name"] in existing or _key_signature(spec["key"]) in existing_keys:
+                continue
+            try:
+                await db[collection_name].create_indexes([index])
+                created.append(f"{collection_name}.{spec['name']}")
+            except OperationFailure as e:
+                logger.warning(f"Could not create index {collection_name}.{spec['name']}: {e}")
+                failed.append({"collection": collection_name, "index": spec["name"], "error": str(e)})
+
+    if created:
+        logger.info(f"Created {len(created)} indexes: {', '.join(created)}")
+
+    return {"created": created, "failed": failed}
+
+
+async def index_report(db) -> Dict[str, Any]:
+    """Compare the registry against the live database.
+
+    Reports registry indexes that are missing, indexes present in the
+    database but not declared in the registry, and indexes that have not
+    served a single operation since the server started ($indexStats).
+    """
+    missing = []
+    unmanaged = []
+    unused = []
+
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        existing = await db[collection_name].index_information()
+        declared_names = {index.document["name"] for index in indexes}
+        declared_keys = {_key_signature(index.document["key"]) for index in indexes}
+        existing_keys = {_key_signature(dict(info["key"])) for info in existing.values()}
+
+        for index in indexes:
+            spec = index.document
+            if spec["name"] not in existing and _key_signature(spec["key"]) not in existing_keys:
+                missing.append({
+                    "collection": collection_name,
+                    "index": spec["name"],
+                    "key": dict(spec["key"]),
+                    "unique": spec.get("unique", False)
+                })
+
+        for name, info in existing.items():
+            if name == "_id_":
+                continue
+            if name not in declared_names and _key_signature(dict(info["key"])) not in declared_keys:
+                unmanaged.append({"collection": collection_name, "index": name, "key": dict(info["key"])})
+
+        if not existing:
+            continue
+
+        try:
+            stats = await db[collection_name].aggregate([{"$indexStats": {}}]).to_list(None)
+        except OperationFailure:
+            # $indexStats is not available on every deployment (e.g. some managed tiers)
+            continue
+
+        for stat in stats:
+            if stat["name"] == "_id_":
+                continue
+            ops = stat.get("accesses", {}).get("ops", 0)
+            if ops == 0:
+                since = stat.get("accesses", {}).get("since")
+                unused.append({
+                    "collection": collection_name,
+                    "index": stat["name"],
+                    "since": since.isoformat() if since else None
+                })
+
+    return {
+        "collections": len(INDEX_REGISTRY),
+        "declared_indexes": sum(len(indexes) for indexes in INDEX_REGISTRY.values()),
+        "missing": missing,
+        "unmanaged": unmanaged,
+        "unused": unused
+    }
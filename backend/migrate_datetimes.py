@@ -0,0 +1,218 @@
+"""
+Datetime Storage Migration
+Rewrites ISO-string datetimes as native BSON dates (run before DATETIME_STORAGE=native)
+
+Usage:
+    python migrate_datetimes.py                      # migrate every registered collection
+    python migrate_datetimes.py --collection invoices --dry-run
+"""
+
+import asyncio
+import copy
+import os
+import typing
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Type
+
+import typer
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pydantic import BaseModel
+from pymongo import UpdateOne
+
+# Project modules read settings at import time, so .env is loaded first
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+import models
+import accounting_models
+import accounting_enhanced_models
+import crm_models
+import crm_enhanced_models
+import warehouse_models
+from storage import to_native
+
+# Collection -> model describing its documents
+COLLECTION_MODELS: Dict[str, Type[BaseModel]] = {
+    "companies": models.Company,
+    "users": models.User,
+    "equipment": models.Equipment,
+    "production": models.Production,
+    "expenses": models.Expense,
+    "invoices": models.Invoice,
+    "attendance": models.Attendance,
+    "costing_centers": models.CostingCenter,
+    "projects": models.Project,
+    "feasibility_studies": models.FeasibilityStudy,
+    "investments": models.Investment,
+    "financial_projections": models.FinancialProjection,
+    "documents": models.Document,
+    "employees": models.Employee,
+    "salary_payments": models.SalaryPayment,
+    "vehicles": models.Vehicle,
+    "departments": models.Department,
+    "positions": models.Position,
+    # Accounting
+    "accounts": accounting_models.Account,
+    "journal_entries": accounting_models.JournalEntry,
+    "vendors": accounting_models.Vendor,
+    "vendor_bills": accounting_models.VendorBill,
+    "customers": accounting_models.Customer,
+    "ar_invoices": accounting_models.ARInvoice,
+    "fixed_assets": accounting_models.FixedAsset,
+    "tax_configuration": accounting_models.TaxConfiguration,
+    "exchange_rates": accounting_models.ExchangeRate,
+    "bank_accounts": accounting_enhanced_models.BankAccount,
+    "bank_statements": accounting_enhanced_models.BankStatement,
+    "bank_reconciliations": accounting_enhanced_models.BankReconciliation,
+    "expense_claims": accounting_enhanced_models.ExpenseClaim,
+    "budgets": accounting_enhanced_models.Budget,
+    "payment_terms": accounting_enhanced_models.PaymentTerm,
+    "payment_batches": accounting_enhanced_models.PaymentBatch,
+    # CRM
+    "leads": crm_models.Lead,
+    "crm_accounts": crm_models.Account,
+    "crm_contacts": crm_models.Contact,
+    "opportunities": crm_models.Opportunity,
+    "cases": crm_models.Case,
+    "campaigns": crm_models.Campaign,
+    "tasks": crm_enhanced_models.Task,
+    "activities": crm_enhanced_models.Activity,
+    "crm_products": crm_enhanced_models.CRMProduct,
+    "contracts": crm_enhanced_models.Contract,
+    "email_templates": crm_enhanced_models.EmailTemplate,
+    "emails": crm_enhanced_models.Email,
+    "forecasts": crm_enhanced_models.SalesForecast,
+    # Warehouse
+    "warehouses": warehouse_models.Warehouse,
+    "products": warehouse_models.Product,
+    "stock_balance": warehouse_models.StockBalance,
+    "stock_movements": warehouse_models.StockMovement,
+    "purchase_orders": warehouse_models.PurchaseOrder,
+    "stock_adjustments": warehouse_models.StockAdjustment,
+}
+
+app = typer.Typer(help="Convert ISO-string datetimes to native BSON dates")
+
+
+# ============================================================================
+# FIELD DISCOVERY
+# ============================================================================
+
+def _is_datetime(annotation) -> bool:
+    if annotation is datetime:
+        return True
+    return any(_is_datetime(arg) for arg in typing.get_args(annotation))
+
+
+def _nested_model(annotation) -> Optional[Type[BaseModel]]:
+    """The model stored in a field typed Model / Optional[Model] / List[Model]"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in typing.get_args(annotation):
+        nested = _nested_model(arg)
+        if nested is not None:
+            return nested
+    return None
+
+
+def datetime_paths(model: Type[BaseModel], prefix: str = "") -> List[str]:
+    """Dotted paths of every datetime field in a model, including nested models"""
+    paths = []
+    for name, field in model.model_fields.items():
+        if _is_datetime(field.annotation):
+            paths.append(prefix + name)
+            continue
+        nested = _nested_model(field.annotation)
+        if nested is not None:
+            paths.extend(datetime_paths(nested, prefix + name + "."))
+    return paths
+
+
+def _convert_path(value, parts: List[str]):
+    """Convert the value(s) at a dotted path in place; returns the new value"""
+    if isinstance(value, list):
+        return [_convert_path(item, parts) for item in value]
+    if not parts:
+        return to_native(value)
+    if isinstance(value, dict) and parts[0] in value:
+        value[parts[0]] = _convert_path(value[parts[0]], parts[1:])
+    return value
+
+
+# ============================================================================
+# MIGRATION
+# ============================================================================
+
+async def migrate_collection(db, name: str, model: Type[BaseModel], batch_size: int, dry_run: bool) -> dict:
+    paths = datetime_paths(model)
+    if not paths:
+        return {"collection": name, "matched": 0, "modified": 0}
+
+    # Only documents that still hold at least one string datetime; re-running is a no-op
+    query = {"$or": [{path: {"$type": "string"}} for path in paths]}
+    top_level = sorted({path.split(".")[0] for path in paths})
+    projection = {field: 1 for field in top_level}
+
+    matched = modified = 0
+    operations = []
+    async for doc in db[name].find(query, projection).batch_size(batch_size):
+        matched += 1
+        updates = {}
+        for field in top_level:
+            if field not in doc:
+                continue
+            original = doc[field]
+            converted = copy.deepcopy(original)
+            for path in paths:
+                parts = path.split(".")
+                if parts[0] == field:
+                    converted = _convert_path({field: converted}, parts)[field]
+            if converted != original:
+                updates[field] = converted
+        if updates:
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": updates}))
+        if len(operations) >= batch_size:
+            modified += await _flush(db[name], operations, dry_run)
+            operations = []
+    if operations:
+        modified += await _flush(db[name], operations, dry_run)
+    return {"collection": name, "matched": matched, "modified": modified}
+
+
+async def _flush(collection, operations: List[UpdateOne], dry_run: bool) -> int:
+    if dry_run:
+        return len(operations)
+    result = await collection.bulk_write(operations, ordered=False)
+    return result.modified_count
+
+
+async def run_migration(collections: List[str], batch_size: int, dry_run: bool) -> None:
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+    try:
+        for name in collections:
+            result = await migrate_collection(db, name, COLLECTION_MODELS[name], batch_size, dry_run)
+            typer.echo(f"{result['collection']}: {result['matched']} matched, "
+                       f"{result['modified']} {'to modify' if dry_run else 'modified'}")
+    finally:
+        client.close()
+
+
+@app.command()
+def migrate(
+    collection: Optional[List[str]] = typer.Option(None, "--collection", "-c", help="Collection to migrate (repeatable); default all"),
+    batch_size: int = typer.Option(1000, help="Documents per bulk write"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Count affected documents without writing")
+):
+    """Rewrite string datetimes in registered collections as BSON dates"""
+    names = collection or list(COLLECTION_MODELS)
+    unknown = [name for name in names if name not in COLLECTION_MODELS]
+    if unknown:
+        raise typer.BadParameter(f"Unknown collection(s): {', '.join(unknown)}")
+    asyncio.run(run_migration(names, batch_size, dry_run))
+
+
+if __name__ == "__main__":
+    app()
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, Tuple
+import sys
 import uuid
 from datetime import datetime, timezone
 from enum import Enum
@@ -262,6 +263,35 @@ ROLE_PERMISSIONS = {
     },
 }
 
+def compile_role_permissions(role_permissions: Dict[UserRole, Dict[str, List[str]]]):
+    """Compile a role permission mapping into bitmaps.
+
+    Every distinct (resource, action) pair is assigned one bit; each role gets
+    the OR of its pairs. Returns (bits, masks, matrix) where bits maps
+    resource -> action -> bit, masks maps role -> int and matrix is the
+    per-role resource -> actions mapping served by /api/me.
+    """
+    bits: Dict[str, Dict[str, int]] = {}
+    masks: Dict[UserRole, int] = {}
+    matrix: Dict[UserRole, Dict[str, List[str]]] = {}
+    next_bit = 0
+    for role, permissions in role_permissions.items():
+        mask = 0
+        for resource, actions in permissions.items():
+            resource_bits = bits.setdefault(sys.intern(resource), {})
+            for action in actions:
+                action = sys.intern(action)
+                if action not in resource_bits:
+                    resource_bits[action] = 1 << next_bit
+                    next_bit += 1
+                mask |= resource_bits[action]
+        masks[role] = mask
+        matrix[role] = {resource: list(actions) for resource, actions in permissions.items()}
+    return bits, masks, matrix
+
+PERMISSION_BITS, ROLE_PERMISSION_MASKS, ROLE_PERMISSION_MATRIX = compile_role_permissions(ROLE_PERMISSIONS)
+_NO_ACTIONS: Dict[str, int] = {}
+
 class Company(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -301,15 +331,23 @@ class User(BaseModel):
     avatar_url: Optional[str] = None
     last_login: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    token_version: int = 0  # Bumped to revoke every token issued to the user
     
     def has_permission(self, resource: str, action: str) -> bool:
         """Check if user has permission for a resource and action"""
         if self.role == UserRole.SUPERADMIN:
             return True
         
-        permissions = ROLE_PERMISSIONS.get(self.role, {})
-        resource_permissions = permissions.get(resource, [])
-        return action in resource_permissions
+        bit = PERMISSION_BITS.get(resource, _NO_ACTIONS).get(action, 0)
+        return bool(ROLE_PERMISSION_MASKS.get(self.role, 0) & bit)
+    
+    def has_permissions(self, pairs: Iterable[Tuple[str, str]]) -> List[bool]:
+        """Check several (resource, action) pairs at once, in order"""
+        if self.role == UserRole.SUPERADMIN:
+            return [True for _ in pairs]
+        
+        mask = ROLE_PERMISSION_MASKS.get(self.role, 0)
+        return [bool(mask & PERMISSION_BITS.get(resource, _NO_ACTIONS).get(action, 0)) for resource, action in pairs]
 
 class UserCreate(BaseModel):
     username: str
@@ -804,6 +842,15 @@ class LeaveCreate(BaseModel):
     reason: Optional[str] = None
 
 # Vehicle & GPS Tracking (for Drivers)
+class Coordinate(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+class GeoPoint(BaseModel):
+    """GeoJSON point; coordinates are [longitude, latitude]"""
+    type: str = "Point"
+    coordinates: List[float]
+
 class VehicleStatus(str, Enum):
     ACTIVE = "active"
     MAINTENANCE = "maintenance"
@@ -828,6 +875,8 @@ class Vehicle(CompanyBaseModel):
     last_location_lng: Optional[float] = None
     last_location_address: Optional[str] = None
     last_location_update: Optional[datetime] = None
+    last_location: Optional[GeoPoint] = None  # GeoJSON copy of lat/lng for 2dsphere queries
+    geofence_ids: List[str] = []  # geofences the vehicle is currently inside
     
     # Maintenance
     last_maintenance_date: Optional[datetime] = None
@@ -836,6 +885,34 @@ class Vehicle(CompanyBaseModel):
     
     notes: Optional[str] = None
 
+class GeofenceCreate(BaseModel):
+    name: str
+    name_ar: Optional[str] = None
+    site_type: str = "site"  # quarry, depot, site, customer
+    points: List[Coordinate] = Field(..., min_length=3)  # polygon vertices; the ring is closed automatically
+    is_active: bool = True
+
+class Geofence(CompanyBaseModel):
+    name: str
+    name_ar: Optional[str] = None
+    site_type: str = "site"
+    geometry: Dict[str, Any]  # GeoJSON Polygon, [longitude, latitude] positions
+    bbox: List[float]  # [min_lng, min_lat, max_lng, max_lat]
+    is_active: bool = True
+
+class GeofenceEvent(CompanyBaseModel):
+    vehicle_id: str
+    driver_id: Optional[str] = None
+    geofence_id: str
+    geofence_name: str
+    event: str  # enter, exit
+    timestamp: datetime
+    lat: float
+    lng: float
+
+class VehicleDistance(Vehicle):
+    distance_m: float
+
 class VehicleCreate(BaseModel):
     vehicle_number: str
     vehicle_type: str
@@ -857,6 +934,8 @@ class Department(CompanyBaseModel):
     name_ar: str
     code: str  # e.g., MKT, SLS, FIN
     parent_department_id: Optional[str] = None  # For sub-departments
+    ancestor_ids: List[str] = Field(default_factory=list)  # Root first, maintained on create/move
+    path: Optional[str] = None  # Codes from the root, e.g. FIN/AP
     department_head_id: Optional[str] = None  # Employee ID
     department_head_name: Optional[str] = None
     level: int = 1  # 1=Main, 2=Sub, 3=Team, etc.
@@ -875,6 +954,9 @@ class DepartmentCreate(BaseModel):
     description: Optional[str] = None
     description_ar: Optional[str] = None
 
+class DepartmentMove(BaseModel):
+    parent_department_id: Optional[str] = None  # None moves the department to the top level
+
 class Position(CompanyBaseModel):
     title: str
     title_ar: str
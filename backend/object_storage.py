@@ -0,0 +1,132 @@
+"""
+Object Storage
+Lazily connected MinIO client; blocking SDK calls run in worker threads
+"""
+
+import asyncio
+import io
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import urllib3
+from minio import Minio
+
+logger = logging.getLogger(__name__)
+
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
+MINIO_SECURE = os.getenv("MINIO_SECURE", "false").lower() == "true"
+MINIO_BUCKET = os.getenv("MINIO_BUCKET", "khairit-files")
+
+# Connect/read timeouts for MinIO requests (the SDK default retries for minutes)
+MINIO_CONNECT_TIMEOUT = float(os.getenv("MINIO_CONNECT_TIMEOUT", 3))
+MINIO_READ_TIMEOUT = float(os.getenv("MINIO_READ_TIMEOUT", 60))
+# After a failed connection, requests use the local fallback for this long before retrying
+MINIO_RETRY_SECONDS = float(os.getenv("MINIO_RETRY_SECONDS", 30))
+
+
+class ObjectStorage:
+    """MinIO connection established on first use instead of at import.
+
+    Until a connection succeeds callers get None from client() and use the
+    local filesystem fallback. Failed attempts are retried at most every
+    MINIO_RETRY_SECONDS, so an unavailable MinIO costs one bounded attempt per
+    window rather than a timeout per request.
+    """
+
+    def __init__(self, endpoint: str = MINIO_ENDPOINT, bucket: str = MINIO_BUCKET):
+        self.endpoint = endpoint
+        self.bucket = bucket
+        self._client: Optional[Minio] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._last_attempt: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.connected_at: Optional[datetime] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._client is not None
+
+    def _connect(self) -> Minio:
+        http_client = urllib3.PoolManager(
+            timeout=urllib3.Timeout(connect=MINIO_CONNECT_TIMEOUT, read=MINIO_READ_TIMEOUT),
+            retries=urllib3.Retry(total=2, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+        )
+        client = Minio(
+            self.endpoint,
+            access_key=MINIO_ACCESS_KEY,
+            secret_key=MINIO_SECRET_KEY,
+            secure=MINIO_SECURE,
+            http_client=http_client,
+        )
+        # Ensure bucket exists
+        if not client.bucket_exists(self.bucket):
+            client.make_bucket(self.bucket)
+            logger.info(f"Created bucket: {self.bucket}")
+        return client
+
+    async def client(self) -> Optional[Minio]:
+        """The connected client, or None while MinIO is unavailable"""
+        if self._client is not None:
+            return self._client
+        if self._last_attempt is not None and time.monotonic() - self._last_attempt < MINIO_RETRY_SECONDS:
+            return None
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._client is not None:
+                return self._client
+            self._last_attempt = time.monotonic()
+            try:
+                self._client = await asyncio.to_thread(self._connect)
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"MinIO unavailable, using local file storage: {e}")
+                return None
+            self.last_error = None
+            self.connected_at = datetime.now(timezone.utc)
+            logger.info(f"Connected to MinIO at {self.endpoint}")
+            return self._client
+
+    async def put_object(self, object_path: str, content: bytes, content_type: str) -> bool:
+        """Upload an object; False when MinIO is unavailable"""
+        client = await self.client()
+        if client is None:
+            return False
+        await asyncio.to_thread(
+            client.put_object, self.bucket, object_path, io.BytesIO(content), len(content), content_type=content_type
+        )
+        return True
+
+    async def get_object(self, object_path: str) -> Optional[bytes]:
+        """Download an object; None when MinIO is unavailable"""
+        client = await self.client()
+        if client is None:
+            return None
+
+        def read() -> bytes:
+            response = client.get_object(self.bucket, object_path)
+            try:
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
+
+        return await asyncio.to_thread(read)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "backend": "minio" if self.ready else "local",
+            "connecting": self._lock is not None and self._lock.locked(),
+            "bucket": self.bucket,
+            "connected_at": self.connected_at.isoformat() if self.connected_at else None,
+            "last_error": self.last_error,
+        }
+
+
+storage = ObjectStorage()
@@ -0,0 +1,168 @@
+"""
+Department Tree
+Materialized ancestor arrays and paths on departments, and a versioned per-company tree cache
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+from cache import TTLCache
+from responses import FastJSONResponse
+from storage import storage_now
+
+# Built trees are keyed by the company's department_tree_version, so any
+# worker's write makes the other workers' copies unreachable; the TTL only
+# bounds memory held by stale versions.
+DEPARTMENT_TREE_CACHE_TTL_SECONDS = float(os.environ.get('DEPARTMENT_TREE_CACHE_TTL_SECONDS', 300))
+department_tree_cache = TTLCache(maxsize=1024, ttl=DEPARTMENT_TREE_CACHE_TTL_SECONDS)
+
+PATH_SEPARATOR = "/"
+
+
+# ============================================================================
+# MATERIALIZED PATHS
+# ============================================================================
+
+async def lineage(db, company_id: str, parent_id: Optional[str]) -> Dict[str, Any]:
+    """ancestor_ids, path prefix and level for a department placed under parent_id"""
+    if not parent_id:
+        return {"ancestor_ids": [], "path_prefix": "", "level": 1}
+    parent = await db.departments.find_one(
+        {"id": parent_id, "company_id": company_id},
+        {"_id": 0, "id": 1, "code": 1, "ancestor_ids": 1, "path": 1}
+    )
+    if not parent:
+        raise HTTPException(status_code=404, detail="Parent department not found")
+    ancestor_ids = (parent.get("ancestor_ids") or []) + [parent["id"]]
+    return {
+        "ancestor_ids": ancestor_ids,
+        "path_prefix": (parent.get("path") or parent["code"]) + PATH_SEPARATOR,
+        "level": len(ancestor_ids) + 1,
+    }
+
+
+async def bump_tree_version(db, company_id: str) -> None:
+    await db.companies.update_one({"id": company_id}, {"$inc": {"department_tree_version": 1}})
+
+
+async def move_department(db, company_id: str, department_id: str, parent_id: Optional[str]) -> dict:
+    """Re-parent a department and rewrite the ancestors and paths of its subtree"""
+    department = await db.departments.find_one({"id": department_id, "company_id": company_id}, {"_id": 0})
+    if not department:
+        raise HTTPException(status_code=404, detail="Department not found")
+    if parent_id == department_id:
+        raise HTTPException(status_code=400, detail="A department cannot be its own parent")
+
+    new = await lineage(db, company_id, parent_id)
+    if department_id in new["ancestor_ids"]:
+        raise HTTPException(status_code=400, detail="A department cannot be moved under its own subtree")
+
+    old_ancestors = department.get("ancestor_ids") or []
+    old_path = department.get("path") or department["code"]
+    new_path = new["path_prefix"] + department["code"]
+    now = storage_now()
+
+    operations = [UpdateOne({"id": department_id, "company_id": company_id}, {"$set": {
+        "parent_department_id": parent_id,
+        "ancestor_ids": new["ancestor_ids"],
+        "path": new_path,
+        "level": new["level"],
+        "updated_at": now,
+    }})]
+    # Descendants keep their ancestors below the moved department; the part above it is replaced
+    depth = len(old_ancestors)
+    async for descendant in db.departments.find(
+        {"company_id": company_id, "ancestor_ids": department_id},
+        {"_id": 0, "id": 1, "ancestor_ids": 1, "path": 1, "code": 1}
+    ):
+        ancestor_ids = new["ancestor_ids"] + descendant["ancestor_ids"][depth:]
+        path = descendant.get("path") or descendant["code"]
+        if path.startswith(old_path + PATH_SEPARATOR):
+            path = new_path + path[len(old_path):]
+        operations.append(UpdateOne({"id": descendant["id"], "company_id": company_id}, {"$set": {
+            "ancestor_ids": ancestor_ids,
+            "path": path,
+            "level": len(ancestor_ids) + 1,
+            "updated_at": now,
+        }}))
+
+    await db.departments.bulk_write(operations, ordered=False)
+    await bump_tree_version(db, company_id)
+    return await db.departments.find_one({"id": department_id, "company_id": company_id}, {"_id": 0})
+
+
+async def rebuild_department_paths(db, company_id: str) -> int:
+    """Recompute ancestor_ids, path and level of a company's departments from parent_department_id"""
+    departments = await db.departments.find(
+        {"company_id": company_id},
+        {"_id": 0, "id": 1, "code": 1, "parent_department_id": 1}
+    ).to_list(None)
+    by_id = {department["id"]: department for department in departments}
+
+    operations = []
+    for department in departments:
+        ancestor_ids: List[str] = []
+        codes = [department["code"]]
+        parent_id = department.get("parent_department_id")
+        # Walk up to the root; a missing parent or a cycle ends the walk
+        while parent_id and parent_id in by_id and parent_id not in ancestor_ids and parent_id != department["id"]:
+            ancestor_ids.insert(0, parent_id)
+            codes.insert(0, by_id[parent_id]["code"])
+            parent_id = by_id[parent_id].get("parent_department_id")
+        operations.append(UpdateOne({"id": department["id"], "company_id": company_id}, {"$set": {
+            "ancestor_ids": ancestor_ids,
+            "path": PATH_SEPARATOR.join(codes),
+            "level": len(ancestor_ids) + 1,
+        }}))
+
+    if operations:
+        await db.departments.bulk_write(operations, ordered=False)
+        await bump_tree_version(db, company_id)
+    return len(operations)
+
+
+async def backfill_department_paths(db) -> int:
+    """Rebuild paths for every company that has departments without one"""
+    company_ids = await db.departments.distinct("company_id", {"path": None})
+    total = 0
+    for company_id in company_ids:
+        total += await rebuild_department_paths(db, company_id)
+    return total
+
+
+# ============================================================================
+# TREE
+# ============================================================================
+
+def build_tree(departments: List[dict]) -> List[dict]:
+    """Nest departments under their parents.
+
+    Departments whose parent is not in the list (e.g. an inactive parent)
+    are left out along with their subtree.
+    """
+    by_id = {department["id"]: {**department, "children": []} for department in departments}
+    tree = []
+    for department in sorted(by_id.values(), key=lambda d: (d.get("level", 1), d.get("path") or "")):
+        parent_id = department.get("parent_department_id")
+        if not parent_id:
+            tree.append(department)
+        elif parent_id in by_id:
+            by_id[parent_id]["children"].append(department)
+    return tree
+
+
+async def department_tree_body(db, company_id: str) -> bytes:
+    """The company's active department tree as encoded JSON, cached per tree version"""
+    company = await db.companies.find_one({"id": company_id}, {"_id": 0, "department_tree_version": 1})
+    key = (company_id, (company or {}).get("department_tree_version", 0))
+    body = department_tree_cache.get(key)
+    if body is None:
+        departments = await db.departments.find(
+            {"company_id": company_id, "is_active": True}, {"_id": 0}
+        ).to_list(None)
+        body = FastJSONResponse(build_tree(departments)).body
+        department_tree_cache.set(key, body)
+    return body
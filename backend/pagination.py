@@ -0,0 +1,194 @@
+"""
+Keyset Pagination
+Opaque cursor-based pagination shared by all list endpoints
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple, Type, Union, Any
+
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel
+
+from fieldsets import parse_fields, select_fields, fields_projection
+
+# Upper bound for an explicit ?limit=
+MAX_PAGE_SIZE = 1000
+
+# Page size used when the client does not ask for one. Matches the historical
+# to_list(1000) cap; truncation is now signalled through the cursor header.
+DEFAULT_PAGE_SIZE = 1000
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+SortSpec = Union[str, List[Tuple[str, int]]]
+
+
+class PageParams:
+    """Pagination parameters resolved from the query string"""
+
+    def __init__(self, limit: Optional[int], after: Optional[str], response: Optional[Response] = None,
+                 fields: Optional[List[str]] = None):
+        self.limit = limit
+        self.after = after
+        self.response = response
+        self.fields = fields
+
+
+def page_params(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of records to return"),
+    after: Optional[str] = Query(None, description="Opaque cursor returned in the X-Next-Cursor header"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included)")
+) -> PageParams:
+    """FastAPI dependency for list endpoints"""
+    return PageParams(limit=limit, after=after, response=response, fields=parse_fields(fields))
+
+
+class Page(list):
+    """A list of records carrying the cursor for the following page.
+
+    `fields` holds the sparse fieldset the records were projected to, if any.
+    """
+
+    def __init__(self, items=(), next_cursor: Optional[str] = None, fields: Optional[List[str]] = None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+        self.fields = fields
+
+
+# ============================================================================
+# CURSOR ENCODING
+# ============================================================================
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$date" in value:
+        return datetime.fromisoformat(value["$date"])
+    return value
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encode the sort key values of the last returned record"""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, expected_length: int) -> List[Any]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    if not isinstance(values, list) or len(values) != expected_length:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    try:
+        return [_decode_value(v) for v in values]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+# ============================================================================
+# KEYSET QUERY
+# ============================================================================
+
+def normalize_sort(sort: SortSpec, direction: int = 1, tie_breaker: Optional[str] = "id") -> List[Tuple[str, int]]:
+    """Turn a sort spec into a full ordering that ends with a unique key"""
+    keys = [(sort, direction)] if isinstance(sort, str) else list(sort)
+    if tie_breaker and tie_breaker not in [field for field, _ in keys]:
+        keys.append((tie_breaker, keys[-1][1]))
+    return keys
+
+
+def _after_key(field: str, direction: int, value: Any) -> Optional[dict]:
+    """Condition for records strictly after `value` on a single key.
+
+    MongoDB sorts missing/null values before everything else, so they come
+    first in ascending order and last in descending order.
+    """
+    if value is None:
+        if direction == 1:
+            return {field: {"$ne": None}}
+        return None  # Nothing sorts after null in descending order
+    if direction == 1:
+        return {field: {"$gt": value}}
+    return {"$or": [{field: {"$lt": value}}, {field: None}]}
+
+
+def keyset_filter(sort_keys: List[Tuple[str, int]], values: List[Any]) -> dict:
+    """Build the filter selecting records after the cursor position"""
+    branches = []
+    for i, (field, direction) in enumerate(sort_keys):
+        condition = _after_key(field, direction, values[i])
+        if condition is None:
+            continue
+        equal_prefix = [{prev_field: values[j]} for j, (prev_field, _) in enumerate(sort_keys[:i])]
+        branches.append({"$and": equal_prefix + [condition]} if equal_prefix else condition)
+    if not branches:
+        # Cursor points past the last possible record
+        return {"_id": {"$exists": False}}
+    return {"$or": branches}
+
+
+def _get_path(doc: dict, field: str) -> Any:
+    value = doc
+    for part in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    sort: SortSpec,
+    page: PageParams,
+    direction: int = 1,
+    projection: Optional[dict] = None,
+    tie_breaker: Optional[str] = "id",
+    model: Optional[Type[BaseModel]] = None
+) -> Page:
+    """Fetch one page of `collection` ordered by `sort` plus a unique tie breaker.
+
+    The next cursor (if any) is returned on the Page and written to the
+    X-Next-Cursor response header. Without ?limit= the historical page size
+    applies, so existing clients keep working but can now detect truncation.
+
+    When `model` is given, a ?fields= selection is validated against it and
+    pushed down as the Mongo projection.
+    """
+    sort_keys = normalize_sort(sort, direction, tie_breaker)
+    limit = page.limit or DEFAULT_PAGE_SIZE
+
+    fields = None
+    if page.fields and model is not None:
+        fields = select_fields(model, page.fields)
+        projection = fields_projection(fields, sort_keys)
+    elif projection is None:
+        projection = {"_id": 0}
+
+    filters = dict(query)
+    if page.after:
+        values = decode_cursor(page.after, len(sort_keys))
+        after = keyset_filter(sort_keys, values)
+        filters = {"$and": [query, after]} if query else after
+
+    docs = await collection.find(filters, projection).sort(sort_keys).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor([_get_path(docs[-1], field) for field, _ in sort_keys])
+
+    if page.response is not None and next_cursor:
+        page.response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return Page(docs, next_cursor=next_cursor, fields=fields)
@@ -0,0 +1,101 @@
+"""
+Password Hashing
+bcrypt work runs on a bounded thread pool so logins never block the event loop
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+# bcrypt cost factor. Hashes created with a different cost are transparently
+# rehashed the next time their owner logs in.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+
+# Threads doing bcrypt work, and the number of hash/verify calls allowed to be
+# in flight at once (the rest wait on the event loop without holding a thread).
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
+PASSWORD_HASH_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_CONCURRENCY', PASSWORD_HASH_WORKERS * 2))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_semaphore = asyncio.Semaphore(PASSWORD_HASH_CONCURRENCY)
+
+
+class PasswordHashingStats:
+    """Counters describing the password hashing pool"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.waiting = 0
+        self.operations = {"hash": 0, "verify": 0}
+        self.seconds = {"hash": 0.0, "verify": 0.0}
+        self.wait_seconds = 0.0
+        self.failed_verifications = 0
+        self.rehashes = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "workers": PASSWORD_HASH_WORKERS,
+            "concurrency_limit": PASSWORD_HASH_CONCURRENCY,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "operations": dict(self.operations),
+            "seconds": dict(self.seconds),
+            "wait_seconds": self.wait_seconds,
+            "failed_verifications": self.failed_verifications,
+            "rehashes": self.rehashes
+        }
+
+
+stats = PasswordHashingStats()
+
+
+async def _run(operation: str, fn, *args):
+    queued_at = time.perf_counter()
+    stats.waiting += 1
+    try:
+        await _semaphore.acquire()
+    finally:
+        stats.waiting -= 1
+    started_at = time.perf_counter()
+    stats.wait_seconds += started_at - queued_at
+    stats.in_flight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, fn, *args)
+    finally:
+        stats.in_flight -= 1
+        stats.operations[operation] += 1
+        stats.seconds[operation] += time.perf_counter() - started_at
+        _semaphore.release()
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password with the configured cost factor"""
+    return await _run("hash", pwd_context.hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password.
+
+    Returns (valid, new_hash). new_hash is set when the stored hash was
+    created with a different cost factor and should be replaced.
+    """
+    valid, new_hash = await _run("verify", pwd_context.verify_and_update, plain_password, hashed_password)
+    if not valid:
+        stats.failed_verifications += 1
+    elif new_hash:
+        stats.rehashes += 1
+    return valid, new_hash
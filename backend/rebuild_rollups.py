@@ -0,0 +1,56 @@
+"""
+Monthly Rollup Rebuild
+Recomputes monthly_rollups from the production, expenses and invoices collections
+
+Run once after deploying rollups, after bulk loads that bypass the API, or
+whenever the rollups are suspected to have drifted. Run while the affected
+companies are quiet: writes during a rebuild may be missed.
+
+Usage:
+    python rebuild_rollups.py
+    python rebuild_rollups.py --source invoices --company <company_id>
+"""
+
+import asyncio
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from rollups import ROLLUP_SOURCES, rebuild_rollups
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+app = typer.Typer(help="Rebuild monthly rollups from source documents")
+
+
+async def run_rebuild(sources: List[str], company_id: Optional[str]) -> None:
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        written = await rebuild_rollups(db, sources, company_id)
+        for source, count in written.items():
+            typer.echo(f"{source}: {count} bucket(s) written")
+    finally:
+        client.close()
+
+
+@app.command()
+def rebuild(
+    source: Optional[List[str]] = typer.Option(None, "--source", "-s", help="Source collection (repeatable); default all"),
+    company: Optional[str] = typer.Option(None, "--company", "-c", help="Only rebuild this company")
+):
+    """Replace rollup buckets with totals recomputed from the source collections"""
+    sources = source or list(ROLLUP_SOURCES)
+    unknown = [name for name in sources if name not in ROLLUP_SOURCES]
+    if unknown:
+        raise typer.BadParameter(f"Unknown source(s): {', '.join(unknown)}")
+    asyncio.run(run_rebuild(sources, company))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,160 @@
+"""
+Fast JSON Responses
+orjson-encoded responses and a trusted serialization path for documents read from MongoDB
+"""
+
+import os
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type, Union, get_args, get_origin
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import PydanticUndefined
+
+from pagination import NEXT_CURSOR_HEADER
+from fieldsets import partial_model
+
+# Set to false to send list responses through the regular validated
+# response_model path (useful when chasing a data-shape problem).
+TRUSTED_RESPONSES = os.environ.get('TRUSTED_RESPONSES', 'true').lower() in ('1', 'true', 'yes')
+
+
+# UTC datetimes are written with a "Z" suffix, as pydantic does
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+def _orjson_default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson; pre-encoded bytes are sent unchanged"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        return orjson.dumps(content, default=_orjson_default, option=_ORJSON_OPTIONS)
+
+
+# ============================================================================
+# TRUSTED SERIALIZATION
+# ============================================================================
+
+# model -> [(field name, default factory, converter or None)] in declaration order
+_projections: Dict[Type[BaseModel], List[Tuple[str, Callable[[], Any], Optional[Callable[[Any], Any]]]]] = {}
+
+
+def _default_factory(field) -> Callable[[], Any]:
+    if field.default_factory is not None:
+        return field.default_factory
+    default = None if field.default is PydanticUndefined else field.default
+    return lambda: default
+
+
+def _scalar_type(annotation: Any) -> Any:
+    """The type of a plain or Optional[...] annotation"""
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _to_datetime(value: Any) -> Any:
+    # ISO strings (the default storage) are encoded the way pydantic encodes datetimes
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _to_float(value: Any) -> Any:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+_CONVERTERS = {datetime: _to_datetime, float: _to_float}
+
+
+def model_projection(model: Type[BaseModel]) -> List[Tuple[str, Callable[[], Any], Optional[Callable[[Any], Any]]]]:
+    """Cached field list of a model, used to shape trusted documents.
+
+    Top-level datetime and float fields carry a converter so their encoding
+    matches the validated path (stored ISO strings, ints in float fields).
+    """
+    projection = _projections.get(model)
+    if projection is None:
+        projection = _projections[model] = [
+            (name, _default_factory(field), _CONVERTERS.get(_scalar_type(field.annotation)))
+            for name, field in model.model_fields.items()
+        ]
+    return projection
+
+
+_list_adapters: Dict[Type[BaseModel], TypeAdapter] = {}
+
+
+def list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    """Cached TypeAdapter for List[model]"""
+    adapter = _list_adapters.get(model)
+    if adapter is None:
+        adapter = _list_adapters[model] = TypeAdapter(List[model])
+    return adapter
+
+
+def dump_trusted(model: Type[BaseModel], docs: Sequence[dict]) -> bytes:
+    """Encode documents as List[model] without validating them.
+
+    Each document is reduced to the model's declared fields (missing ones take
+    their defaults) and encoded by orjson in one pass, so the output has the
+    response_model shape without constructing a model per row. Top-level
+    datetime and float fields are normalized as pydantic would encode them;
+    nested values are passed through as stored.
+    """
+    projection = model_projection(model)
+    rows = [
+        {
+            name: (convert(doc[name]) if convert else doc[name]) if name in doc else default()
+            for name, default, convert in projection
+        }
+        for doc in docs
+    ]
+    return orjson.dumps(rows, default=_orjson_default, option=_ORJSON_OPTIONS)
+
+
+def trusted_list_response(model: Type[BaseModel], docs: Sequence[dict]):
+    """Response for a list endpoint whose documents come straight from MongoDB.
+
+    Carries over the X-Next-Cursor header of a pagination Page and honours
+    its sparse fieldset. Returns the documents unchanged when
+    TRUSTED_RESPONSES is disabled so FastAPI validates them against the
+    route's response_model as before; sparse pages are then validated
+    against a partial model instead.
+    """
+    fields = getattr(docs, "fields", None)
+    if fields:
+        model = partial_model(model, fields)
+    elif not TRUSTED_RESPONSES:
+        return docs
+
+    if TRUSTED_RESPONSES:
+        body = dump_trusted(model, docs)
+    else:
+        adapter = list_adapter(model)
+        body = adapter.dump_json(adapter.validate_python(docs))
+    response = FastJSONResponse(body)
+    next_cursor = getattr(docs, "next_cursor", None)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
@@ -0,0 +1,231 @@
+"""
+Monthly Rollups
+Per-company monthly totals for production, expenses and invoices, maintained with $inc on every write
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import DeleteMany, InsertOne, UpdateOne
+
+from storage import to_native, as_utc
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS_COLLECTION = "monthly_rollups"
+
+# Source collection -> date field, dimensions broken out besides the total, summed fields.
+# Each rollup document holds one (company_id, source, month, dimension, key) bucket.
+ROLLUP_SOURCES: Dict[str, Dict[str, Any]] = {
+    "production": {
+        "date_field": "date",
+        "dimensions": ["activity_type"],
+        "fields": ["actual_qty", "contract_qty", "completion_rate"],
+    },
+    "expenses": {
+        "date_field": "date",
+        "dimensions": ["category"],
+        "fields": ["amount"],
+    },
+    "invoices": {
+        "date_field": "date",
+        "dimensions": ["status"],
+        "fields": ["amount", "total_amount", "vat_amount"],
+    },
+}
+
+# Dimension name of the all-records bucket
+TOTAL = "total"
+
+
+def month_of(value) -> Optional[str]:
+    """UTC YYYY-MM of a datetime or stored ISO string (the month rebuild_rollups groups by)"""
+    value = to_native(value)
+    if isinstance(value, datetime):
+        return as_utc(value).strftime("%Y-%m")
+    return None
+
+
+def previous_year_month(month: Optional[str]) -> Optional[str]:
+    """The same YYYY-MM one year earlier"""
+    if not month:
+        return None
+    return f"{int(month[:4]) - 1}{month[4:]}"
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _increments(source: str, company_id: str, doc: dict, sign: int = 1) -> List[Tuple[dict, dict]]:
+    """(bucket filter, $inc) pairs applying one document (sign=-1 removes it)"""
+    spec = ROLLUP_SOURCES[source]
+    month = month_of(doc.get(spec["date_field"]))
+    if month is None:
+        return []
+
+    inc = {"count": sign}
+    for field in spec["fields"]:
+        value = doc.get(field)
+        if _is_number(value):
+            # Per-field counts let averages skip records without the field, like $avg
+            inc[f"sums.{field}"] = sign * value
+            inc[f"counts.{field}"] = sign
+
+    buckets = [(TOTAL, None)] + [(dimension, doc.get(dimension)) for dimension in spec["dimensions"]]
+    return [
+        ({"company_id": company_id, "source": source, "month": month, "dimension": dimension, "key": key}, dict(inc))
+        for dimension, key in buckets
+    ]
+
+
+def rollup_operations(source: str, company_id: str, docs: List[dict], sign: int = 1) -> List[UpdateOne]:
+    """One $inc upsert per bucket touched by a batch of documents"""
+    buckets: Dict[tuple, Tuple[dict, dict]] = {}
+    for doc in docs:
+        for query, inc in _increments(source, company_id, doc, sign):
+            key = tuple(query.items())
+            if key not in buckets:
+                buckets[key] = (query, inc)
+                continue
+            merged = buckets[key][1]
+            for field, value in inc.items():
+                merged[field] = merged.get(field, 0) + value
+    return [UpdateOne(query, {"$inc": inc}, upsert=True) for query, inc in buckets.values()]
+
+
+async def apply_rollup(db, source: str, company_id: str, doc: dict, sign: int = 1) -> None:
+    """Fold a written document into the rollups"""
+    await apply_rollups(db, source, company_id, [doc], sign)
+
+
+async def apply_rollups(db, source: str, company_id: str, docs: List[dict], sign: int = 1) -> None:
+    """Fold a batch of written documents into the rollups with one bulk write.
+
+    Errors are logged rather than raised: the source write already succeeded,
+    and a drifted rollup is repaired by rebuild_rollups.
+    """
+    operations = rollup_operations(source, company_id, docs, sign)
+    if not operations:
+        return
+    try:
+        await db[ROLLUPS_COLLECTION].bulk_write(operations, ordered=False)
+    except Exception as e:
+        logger.warning(f"Rollup update failed for {source} in company {company_id}: {e}")
+
+
+# ============================================================================
+# QUERIES
+# ============================================================================
+
+async def get_rollups(db, company_id: str, source: str, dimension: str = TOTAL,
+                      from_month: Optional[str] = None, to_month: Optional[str] = None) -> List[dict]:
+    """Rollup buckets for a company, ordered by month then key"""
+    query = {"company_id": company_id, "source": source, "dimension": dimension}
+    if from_month or to_month:
+        query["month"] = {}
+        if from_month:
+            query["month"]["$gte"] = from_month
+        if to_month:
+            query["month"]["$lte"] = to_month
+    cursor = db[ROLLUPS_COLLECTION].find(query, {"_id": 0}).sort([("month", 1), ("key", 1)])
+    return [bucket async for bucket in cursor if bucket.get("count", 0) > 0]
+
+
+def bucket_sum(bucket: Optional[dict], field: str) -> float:
+    return (bucket or {}).get("sums", {}).get(field, 0)
+
+
+def bucket_avg(bucket: Optional[dict], field: str) -> float:
+    count = (bucket or {}).get("counts", {}).get(field, 0)
+    return bucket_sum(bucket, field) / count if count else 0
+
+
+# ============================================================================
+# REBUILD
+# ============================================================================
+
+def _month_expression(field: str) -> dict:
+    """UTC YYYY-MM of a stored date, whether an ISO string or a BSON date.
+
+    ISO strings are parsed so that their offset is applied, matching
+    month_of; a string the server cannot parse falls back to its first
+    seven characters.
+    """
+    return {"$let": {
+        "vars": {"date": {"$cond": [
+            {"$eq": [{"$type": f"${field}"}, "string"]},
+            {"$dateFromString": {"dateString": f"${field}", "onError": None}},
+            f"${field}"
+        ]}},
+        "in": {"$cond": [
+            {"$eq": ["$$date", None]},
+            {"$substrCP": [f"${field}", 0, 7]},
+            {"$dateToString": {"format": "%Y-%m", "date": "$$date", "timezone": "UTC"}}
+        ]}
+    }}
+
+
+def _rebuild_pipeline(source: str, dimension: str, company_id: Optional[str]) -> List[dict]:
+    spec = ROLLUP_SOURCES[source]
+    match: Dict[str, Any] = {spec["date_field"]: {"$type": ["string", "date"]}}
+    if company_id:
+        match["company_id"] = company_id
+
+    group: Dict[str, Any] = {
+        "_id": {
+            "company_id": "$company_id",
+            "month": _month_expression(spec["date_field"]),
+            "key": None if dimension == TOTAL else {"$ifNull": [f"${dimension}", None]},
+        },
+        "count": {"$sum": 1},
+    }
+    numeric = ["int", "long", "double", "decimal"]
+    for field in spec["fields"]:
+        is_number = {"$in": [{"$type": f"${field}"}, numeric]}
+        group[f"sum_{field}"] = {"$sum": {"$cond": [is_number, f"${field}", 0]}}
+        group[f"count_{field}"] = {"$sum": {"$cond": [is_number, 1, 0]}}
+    return [{"$match": match}, {"$group": group}]
+
+
+async def rebuild_rollups(db, sources: Optional[List[str]] = None, company_id: Optional[str] = None,
+                          batch_size: int = 1000) -> Dict[str, int]:
+    """Recompute rollups from the source collections.
+
+    Replaces the buckets of the given sources (optionally one company).
+    Writes that land while a source is being rebuilt may be lost from its
+    rollups, so run it when the affected companies are quiet.
+    Returns the number of buckets written per source.
+    """
+    written = {}
+    for source in sources or list(ROLLUP_SOURCES):
+        spec = ROLLUP_SOURCES[source]
+        scope = {"source": source}
+        if company_id:
+            scope["company_id"] = company_id
+        operations = [DeleteMany(scope)]
+        count = 0
+        for dimension in [TOTAL] + spec["dimensions"]:
+            async for row in db[source].aggregate(_rebuild_pipeline(source, dimension, company_id), allowDiskUse=True):
+                if row["_id"].get("company_id") is None:
+                    continue
+                operations.append(InsertOne({
+                    "company_id": row["_id"]["company_id"],
+                    "source": source,
+                    "month": row["_id"]["month"],
+                    "dimension": dimension,
+                    "key": row["_id"].get("key"),
+                    "count": row["count"],
+                    "sums": {field: row[f"sum_{field}"] for field in spec["fields"]},
+                    "counts": {field: row[f"count_{field}"] for field in spec["fields"]},
+                }))
+                count += 1
+                if len(operations) >= batch_size:
+                    await db[ROLLUPS_COLLECTION].bulk_write(operations, ordered=True)
+                    operations = []
+        if operations:
+            await db[ROLLUPS_COLLECTION].bulk_write(operations, ordered=True)
+        written[source] = count
+        logger.info(f"Rebuilt {count} rollup bucket(s) for {source}")
+    return written
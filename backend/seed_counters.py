@@ -0,0 +1,54 @@
+"""
+Document Counter Seeding
+Raises the per-company document number counters to the highest numbers already issued
+
+Run once after deploying the counters-based numbering, or any time numbers were
+written outside the API. Safe to re-run.
+
+Usage:
+    python seed_counters.py
+    python seed_counters.py --sequence journal_entries --sequence vendor_bills
+"""
+
+import asyncio
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from sequences import SEQUENCES, seed_counters
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+app = typer.Typer(help="Seed document number counters from existing documents")
+
+
+async def run_seed(names: List[str]) -> None:
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        touched = await seed_counters(db, names)
+        for name, count in touched.items():
+            typer.echo(f"{name}: {count} company counter(s) seeded")
+    finally:
+        client.close()
+
+
+@app.command()
+def seed(
+    sequence: Optional[List[str]] = typer.Option(None, "--sequence", "-s", help="Sequence to seed (repeatable); default all")
+):
+    """Raise counters to the highest stored number per company"""
+    names = sequence or list(SEQUENCES)
+    unknown = [name for name in names if name not in SEQUENCES]
+    if unknown:
+        raise typer.BadParameter(f"Unknown sequence(s): {', '.join(unknown)}")
+    asyncio.run(run_seed(names))
+
+
+if __name__ == "__main__":
+    app()
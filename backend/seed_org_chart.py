@@ -8,6 +8,7 @@ from datetime import datetime, timezone
 import uuid
 from dotenv import load_dotenv
 from pathlib import Path
+from org_tree import bump_tree_version
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -164,6 +165,8 @@ async def create_organizational_structure():
             "name_ar": dept_data["name_ar"],
             "code": dept_data["code"],
             "parent_department_id": None,
+            "ancestor_ids": [],
+            "path": dept_data["code"],
             "level": 1,
             "is_active": True,
             "employee_count": 0,
@@ -186,6 +189,8 @@ async def create_organizational_structure():
                 "name_ar": sub_dept_data["name_ar"],
                 "code": sub_dept_data["code"],
                 "parent_department_id": dept_id,
+                "ancestor_ids": [dept_id],
+                "path": f"{dept_data['code']}/{sub_dept_data['code']}",
                 "level": 2,
                 "is_active": True,
                 "employee_count": 0,
@@ -196,6 +201,9 @@ async def create_organizational_structure():
             await db.departments.insert_one(sub_department)
             subdept_count += 1
     
+    # Servers cache the department tree per version; bump it so they drop the old structure
+    await bump_tree_version(db, company_id)
+    
     print("\n" + "="*60)
     print("🎉 ORGANIZATIONAL STRUCTURE CREATED!")
     print("="*60)
@@ -0,0 +1,162 @@
+"""
+Document Sequences
+Atomic per-company counters for document numbers (JE-000001, BILL-000001, ...)
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_COLLECTION = "counters"
+
+# Sequence name -> (collection, number field, prefix). The sequence name is
+# the collection the numbers are issued for.
+SEQUENCES: Dict[str, Tuple[str, str, str]] = {
+    # Accounting
+    "journal_entries": ("journal_entries", "entry_number", "JE"),
+    "vendor_bills": ("vendor_bills", "bill_number", "BILL"),
+    "ar_invoices": ("ar_invoices", "invoice_number", "INV"),
+    "bank_statements": ("bank_statements", "statement_number", "STMT"),
+    "bank_reconciliations": ("bank_reconciliations", "reconciliation_number", "RECON"),
+    "expense_claims": ("expense_claims", "claim_number", "EXP"),
+    "budgets": ("budgets", "budget_number", "BUD"),
+    "payment_batches": ("payment_batches", "batch_number", "PBATCH"),
+    # CRM
+    "leads": ("leads", "lead_number", "LEAD"),
+    "crm_accounts": ("crm_accounts", "account_number", "ACC"),
+    "crm_contacts": ("crm_contacts", "contact_number", "CON"),
+    "opportunities": ("opportunities", "opportunity_number", "OPP"),
+    "cases": ("cases", "case_number", "CASE"),
+    "campaigns": ("campaigns", "campaign_number", "CAMP"),
+    "tasks": ("tasks", "task_number", "TASK"),
+    "activities": ("activities", "activity_number", "ACT"),
+    "contracts": ("contracts", "contract_number", "CONT"),
+    "emails": ("emails", "email_number", "EMAIL"),
+    "forecasts": ("forecasts", "forecast_number", "FCST"),
+    # Warehouse
+    "stock_movements": ("stock_movements", "movement_number", "MOV"),
+    "purchase_orders": ("purchase_orders", "po_number", "PO"),
+    "stock_adjustments": ("stock_adjustments", "adjustment_number", "ADJ"),
+}
+
+
+def format_number(prefix: str, value: int, width: int = 6) -> str:
+    return f"{prefix}-{value:0{width}d}"
+
+
+def _max_number_pipeline(field: str, prefix: str, company_id: Optional[str] = None) -> List[dict]:
+    """Aggregation returning the highest issued number per company"""
+    match = {field: {"$regex": f"^{prefix}-[0-9]+$"}}
+    if company_id is not None:
+        match["company_id"] = company_id
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": "$company_id",
+            "max": {"$max": {"$toLong": {"$substrCP": [f"${field}", len(prefix) + 1, 32]}}}
+        }}
+    ]
+
+
+class SequenceAllocator:
+    """Issues document numbers from the counters collection.
+
+    Each (company, sequence) pair is one counter document incremented with
+    find_one_and_update($inc), so concurrent creates never share a number.
+    A counter that does not exist yet is first seeded from the highest
+    number already stored in its collection.
+
+    With block_size > 1 a process reserves that many numbers per round trip
+    and hands them out locally. Numbers stay unique but may be issued out of
+    order across processes, and unused numbers of a block are skipped when
+    the process exits.
+    """
+
+    def __init__(self, db, block_size: int = 1):
+        self.db = db
+        self.block_size = max(1, block_size)
+        self._blocks: Dict[Tuple[str, str], List[int]] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    @property
+    def counters(self):
+        return self.db[COUNTERS_COLLECTION]
+
+    async def _increment(self, company_id: str, name: str, amount: int) -> Optional[int]:
+        doc = await self.counters.find_one_and_update(
+            {"company_id": company_id, "name": name},
+            {"$inc": {"value": amount}},
+            projection={"_id": 0, "value": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["value"] if doc else None
+
+    async def _seed(self, company_id: str, name: str) -> None:
+        collection, field, prefix = SEQUENCES[name]
+        highest = 0
+        async for row in self.db[collection].aggregate(_max_number_pipeline(field, prefix, company_id)):
+            highest = row["max"] or 0
+        try:
+            await self.counters.update_one(
+                {"company_id": company_id, "name": name},
+                {"$max": {"value": highest}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # Another request created the counter first
+
+    async def reserve(self, company_id: str, name: str, amount: int = 1) -> int:
+        """Atomically reserve `amount` numbers; returns the last one reserved"""
+        value = await self._increment(company_id, name, amount)
+        if value is None:
+            await self._seed(company_id, name)
+            value = await self._increment(company_id, name, amount)
+        return value
+
+    async def next_value(self, company_id: str, name: str) -> int:
+        if self.block_size == 1:
+            return await self.reserve(company_id, name)
+
+        key = (company_id, name)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            block = self._blocks.get(key)
+            if block is None or block[0] > block[1]:
+                last = await self.reserve(company_id, name, self.block_size)
+                block = self._blocks[key] = [last - self.block_size + 1, last]
+            value = block[0]
+            block[0] += 1
+            return value
+
+    async def next_number(self, company_id: str, name: str) -> str:
+        """Next formatted document number of a registered sequence"""
+        return format_number(SEQUENCES[name][2], await self.next_value(company_id, name))
+
+
+async def seed_counters(db, names: Optional[List[str]] = None) -> Dict[str, int]:
+    """Raise every counter to at least the highest number already issued.
+
+    Uses $max, so it is safe to run repeatedly and alongside live traffic.
+    Returns the number of company counters touched per sequence.
+    """
+    touched = {}
+    for name in names or list(SEQUENCES):
+        collection, field, prefix = SEQUENCES[name]
+        count = 0
+        async for row in db[collection].aggregate(_max_number_pipeline(field, prefix)):
+            if row["_id"] is None:
+                continue
+            await db[COUNTERS_COLLECTION].update_one(
+                {"company_id": row["_id"], "name": name},
+                {"$max": {"value": row["max"] or 0}},
+                upsert=True
+            )
+            count += 1
+        touched[name] = count
+        logger.info(f"Seeded {count} counter(s) for {name}")
+    return touched
@@ -1,34 +1,72 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Query, Request, Body
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
+import contextvars
 import logging
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
 from datetime import datetime, timezone, timedelta
-from passlib.context import CryptContext
 import jwt
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics (the command listener must be attached when the client is created)
+from metrics import registry as metrics_registry, mongo_listener, MetricsMiddleware, Gauge, Counter
+from slow_queries import slow_operations, request_company_id, RequestContextMiddleware
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Optional bearer token for /api/metrics
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[mongo_listener, slow_operations])
 db = client[os.environ['DB_NAME']]
 
 # Security setup
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 JWT_SECRET_KEY = os.environ['JWT_SECRET_KEY']  # Must be set in .env
 JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
 JWT_EXPIRE_MINUTES = int(os.environ.get('JWT_EXPIRE_MINUTES', 60))
 
+# Numbers reserved per counter round trip (1 disables block pre-allocation)
+SEQUENCE_BLOCK_SIZE = int(os.environ.get('SEQUENCE_BLOCK_SIZE', 1))
+
+# Resolved principal cache (0 disables)
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', 30))
+PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', 10000))
+
+# Per-company dashboard stats cache (0 disables)
+DASHBOARD_CACHE_TTL_SECONDS = float(os.environ.get('DASHBOARD_CACHE_TTL_SECONDS', 15))
+# Read month-to-date dashboard totals from monthly_rollups (run rebuild_rollups.py first)
+DASHBOARD_FROM_ROLLUPS = os.environ.get('DASHBOARD_FROM_ROLLUPS', 'false').lower() == 'true'
+
 # Import models
 from models import *
+from indexes import ensure_indexes
+from pagination import PageParams, page_params, fetch_page
+from responses import FastJSONResponse, trusted_list_response
+from cache import TTLCache
+from passwords import pwd_context, hash_password_async, verify_password_async
+import passwords
+from sequences import SequenceAllocator
+from rollups import (
+    ROLLUP_SOURCES, TOTAL, apply_rollup, apply_rollups, get_rollups, bucket_sum, bucket_avg, previous_year_month
+)
+from bulk import BulkCreateResult, build_rows, insert_rows
+from vehicle_tracking import (
+    GPS_MAX_POINTS, GpsPoint, GpsBatch, PolygonQuery, record_positions, position_history,
+    nearest_vehicles, vehicles_within_radius, vehicles_within_polygon, backfill_vehicle_locations, fleet_snapshot
+)
+from fleet_feed import fleet_feed
+from trips import TRIP_MAX_POINTS, Track, segment_trips, simplify_track
+from org_tree import department_tree_cache, lineage, bump_tree_version, move_department, backfill_department_paths, department_tree_body
+from storage import NATIVE_DATETIMES, to_storage, storage_now
+from claims import JWT_EMBED_CLAIMS, TOKEN_VERSION_REFRESH_SECONDS, TokenVersionList, principal_claims, user_from_claims
 
 # Create the main app
 app = FastAPI(title="Khairat Multi-Company Operations API", version="2.0.0")
@@ -48,17 +86,56 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        username = payload.get("sub")
-        company_id = payload.get("company_id")
-        
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user_doc = await db.users.find_one({"username": username}, {"_id": 0})
+def build_token_data(user: User, company_id: Optional[str] = None) -> dict:
+    """Claims for a user's access token, optionally with company context"""
+    token_data = {"sub": user.username, "tv": user.token_version}
+    if company_id:
+        token_data["company_id"] = company_id
+    if JWT_EMBED_CLAIMS:
+        token_data.update(principal_claims(user))
+    return token_data
+
+# Token versions of users whose tokens were revoked (used with embedded claims)
+token_versions = TokenVersionList(refresh_seconds=TOKEN_VERSION_REFRESH_SECONDS)
+
+# Per-company document number counters
+sequences = SequenceAllocator(db, block_size=SEQUENCE_BLOCK_SIZE)
+
+# Principals resolved from tokens, keyed by (username, token version), and companies by id
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+company_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+def invalidate_user_cache(username: Optional[str] = None, company_id: Optional[str] = None) -> int:
+    """Drop cached principals for a user, or for every member of a company"""
+    return principal_cache.invalidate_where(
+        lambda key, user: (username is not None and key[0] == username) or
+                          (company_id is not None and (user.company_id == company_id or company_id in (user.companies or [])))
+    )
+
+def invalidate_company_cache(company_id: str) -> None:
+    """Drop a cached company and the principals that belong to it"""
+    company_cache.pop(company_id)
+    invalidate_user_cache(company_id=company_id)
+
+# Dashboard stats keyed by (company_id, month start). Writes to the collections
+# the dashboard aggregates bump the company's generation, so a computation that
+# raced with a write is not cached.
+DASHBOARD_COLLECTIONS = {"production", "expenses", "invoices", "equipment"}
+dashboard_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=DASHBOARD_CACHE_TTL_SECONDS)
+dashboard_generations: Dict[str, int] = {}
+dashboard_inflight: Dict[tuple, asyncio.Task] = {}
+
+def invalidate_dashboard_cache(company_id: str) -> None:
+    """Drop a company's cached dashboard stats after a write"""
+    dashboard_generations[company_id] = dashboard_generations.get(company_id, 0) + 1
+    dashboard_cache.invalidate_where(lambda key, value: key[0] == company_id)
+
+async def load_principal(username: str, token_version: int) -> User:
+    """Resolve a token subject to a User, using the principal cache"""
+    key = (username, token_version)
+    user = principal_cache.get(key)
+    if user is None:
+        user_doc = await db.users.find_one({"username": username}, {"_id": 0, "hashed_password": 0})
         if user_doc is None:
             raise HTTPException(status_code=401, detail="User not found")
         
@@ -71,15 +148,69 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                     pass
         
         user = User(**user_doc)
+        # Tokens issued before the user's token version was bumped are no longer valid
+        if user.token_version != token_version:
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+        principal_cache.set(key, user)
+    
+    # Each request gets its own copy so per-request context never leaks between requests
+    return user.model_copy()
+
+# (token, principal) already authenticated for this context; set by /api/batch so
+# its sub-requests skip the JWT decode and principal lookup
+authenticated_principal: contextvars.ContextVar[Optional[Tuple[str, User]]] = contextvars.ContextVar(
+    "authenticated_principal", default=None
+)
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    principal = authenticated_principal.get()
+    if principal is not None and principal[0] == credentials.credentials:
+        user = principal[1].model_copy()
+        request_company_id.set(user.current_company_id)
+        return user
+    try:
+        token = credentials.credentials
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        username = payload.get("sub")
+        company_id = payload.get("company_id")
+        
+        if username is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        
+        token_version = payload.get("tv", 0)
+        user = user_from_claims(payload) if JWT_EMBED_CLAIMS else None
+        if user is not None:
+            # Authorized from signed claims; only revocations are checked
+            if token_version < await token_versions.current_version(db, username):
+                raise HTTPException(status_code=401, detail="Token has been revoked")
+        else:
+            user = await load_principal(username, token_version)
         # Add current company context to user
         user.current_company_id = company_id
+        request_company_id.set(company_id)
         return user
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def get_stream_user(request: Request, access_token: Optional[str] = Query(None)):
+    """get_current_user for streaming endpoints.
+
+    Browsers' EventSource cannot set an Authorization header, so the token
+    may also be passed as ?access_token=.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        token = access_token
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+
 async def get_user_company(user: User = Depends(get_current_user)):
     """Get the current company context for the user"""
     if hasattr(user, 'current_company_id') and user.current_company_id:
+        company = company_cache.get(user.current_company_id)
+        if company is not None:
+            return company
         company_doc = await db.companies.find_one({"id": user.current_company_id}, {"_id": 0})
         if company_doc:
             # Convert datetime strings
@@ -89,15 +220,51 @@ async def get_user_company(user: User = Depends(get_current_user)):
                         company_doc[field] = datetime.fromisoformat(company_doc[field])
                     except:
                         pass
-            return Company(**company_doc)
+            company = Company(**company_doc)
+            company_cache.set(user.current_company_id, company)
+            return company
     return None
 
+def assigned_vehicles_only(user: User) -> bool:
+    """True for users (drivers) who may only see the vehicle assigned to them"""
+    can_read, can_read_assigned = user.has_permissions([("vehicles", "read"), ("vehicles", "read_assigned")])
+    return can_read_assigned and not can_read
+
+async def assigned_vehicle_ids(user: User) -> List[str]:
+    """Ids of the company vehicles assigned to the user"""
+    return await db.vehicles.distinct("id", {"company_id": user.current_company_id, "assigned_driver_id": user.id})
+
+async def get_tracked_vehicle(user: User, vehicle_id: str, action: str = "read") -> dict:
+    """Load a company vehicle for a GPS route, enforcing driver assignment.
+
+    Drivers may only update, and read the tracking data of, the vehicle
+    assigned to them.
+    """
+    vehicle = await db.vehicles.find_one(
+        {"id": vehicle_id, "company_id": user.current_company_id},
+        {"_id": 0, "id": 1, "assigned_driver_id": 1}
+    )
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    
+    if action == "update":
+        if user.role == UserRole.DRIVER and vehicle.get('assigned_driver_id') != user.id:
+            raise HTTPException(status_code=403, detail="You can only update your assigned vehicle")
+    elif assigned_vehicles_only(user) and vehicle.get('assigned_driver_id') != user.id:
+        raise HTTPException(status_code=403, detail="You can only view your assigned vehicle")
+    return vehicle
+
 async def get_db():
     """Get database connection"""
     return db
 
 def serialize_datetime(obj):
-    """Convert datetime objects to ISO strings for MongoDB storage"""
+    """Convert datetime objects to ISO strings for MongoDB storage.
+
+    A no-op when DATETIME_STORAGE=native, where BSON dates are stored as-is.
+    """
+    if NATIVE_DATETIMES:
+        return obj
     if isinstance(obj, dict):
         for key, value in obj.items():
             if isinstance(value, datetime):
@@ -157,22 +324,20 @@ async def create_company(company_data: CompanyCreate, user: User = Depends(get_c
     serialize_datetime(doc)
     
     await db.companies.insert_one(doc)
+    invalidate_company_cache(company_obj.id)
     return company_obj
 
 @api_router.get("/companies", response_model=List[Company])
-async def list_companies(user: User = Depends(get_current_user)):
+async def list_companies(page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     """List companies (Super admin sees all, users see their companies)"""
     if user.role == UserRole.SUPERADMIN:
-        companies_list = await db.companies.find({}, {"_id": 0}).to_list(1000)
+        companies_list = await fetch_page(db.companies, {}, "created_at", page, model=Company)
     else:
         # Users see only companies they have access to
         company_ids = user.companies if user.companies else ([user.company_id] if user.company_id else [])
-        companies_list = await db.companies.find({"id": {"$in": company_ids}}, {"_id": 0}).to_list(1000)
-    
-    for company in companies_list:
-        deserialize_datetime(company, ['created_at', 'updated_at'])
+        companies_list = await fetch_page(db.companies, {"id": {"$in": company_ids}}, "created_at", page, model=Company)
     
-    return companies_list
+    return trusted_list_response(Company, companies_list)
 
 @api_router.get("/companies/{company_id}", response_model=Company)
 async def get_company(company_id: str, user: User = Depends(get_current_user)):
@@ -192,6 +357,9 @@ async def get_company(company_id: str, user: User = Depends(get_current_user)):
 async def switch_company(switch_data: CompanySwitch, user: User = Depends(get_current_user)):
     """Switch user's active company context"""
     company_id = switch_data.company_id
+    if JWT_EMBED_CLAIMS:
+        # Re-read membership so the new token reflects the stored user
+        user = await load_principal(user.username, user.token_version)
     
     # Verify user has access to this company
     if user.role != UserRole.SUPERADMIN and company_id not in (user.companies or []) and company_id != user.company_id:
@@ -203,7 +371,7 @@ async def switch_company(switch_data: CompanySwitch, user: User = Depends(get_cu
         raise HTTPException(status_code=404, detail="Company not found")
     
     # Create new token with company context
-    token_data = {"sub": user.username, "company_id": company_id}
+    token_data = build_token_data(user, company_id)
     access_token = create_access_token(token_data)
     
     company = Company(**company_doc)
@@ -235,7 +403,7 @@ async def register_user(user_data: UserCreate):
         companies = []
     
     # Create new user
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password_async(user_data.password)
     user_dict = user_data.model_dump()
     del user_dict['password']
     
@@ -245,12 +413,16 @@ async def register_user(user_data: UserCreate):
     serialize_datetime(doc)
     
     await db.users.insert_one(doc)
+    invalidate_user_cache(username=user_obj.username)
     return user_obj
 
 @api_router.post("/login", response_model=Token)
 async def login_user(login_data: UserLogin):
     user_doc = await db.users.find_one({"username": login_data.username}, {"_id": 0})
-    if not user_doc or not verify_password(login_data.password, user_doc["hashed_password"]):
+    if not user_doc:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await verify_password_async(login_data.password, user_doc.pop("hashed_password"))
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Convert datetime fields
@@ -274,17 +446,17 @@ async def login_user(login_data: UserLogin):
             deserialize_datetime(company_doc, ['created_at', 'updated_at'])
             company = Company(**company_doc)
     
-    # Update last login
+    # Update last login, upgrading the stored hash if the bcrypt cost changed
+    login_update = {"last_login": storage_now()}
+    if new_hash:
+        login_update["hashed_password"] = new_hash
     await db.users.update_one(
         {"username": login_data.username},
-        {"$set": {"last_login": datetime.now(timezone.utc).isoformat()}}
+        {"$set": login_update}
     )
     
     # Create token with company context
-    token_data = {"sub": user.username}
-    if default_company_id:
-        token_data["company_id"] = default_company_id
-    
+    token_data = build_token_data(user, default_company_id)
     access_token = create_access_token(token_data)
     
     return Token(
@@ -297,8 +469,13 @@ async def login_user(login_data: UserLogin):
 
 @api_router.get("/me")
 async def get_current_user_info(user: User = Depends(get_current_user), company: Company = Depends(get_user_company)):
-    # Get user permissions based on role
-    permissions = ROLE_PERMISSIONS.get(user.role, {})
+    if JWT_EMBED_CLAIMS:
+        # Principals built from claims carry no profile fields; load the full record
+        current_company_id = user.current_company_id
+        user = await load_principal(user.username, user.token_version)
+        user.current_company_id = current_company_id
+    # Permission matrix for the role, compiled once at import
+    permissions = ROLE_PERMISSION_MATRIX.get(user.role, {})
     return {
         "user": user, 
         "company": company,
@@ -321,10 +498,11 @@ async def create_equipment(equipment_data: EquipmentCreate, user: User = Depends
     serialize_datetime(doc)
     
     await db.equipment.insert_one(doc)
+    invalidate_dashboard_cache(user.current_company_id)
     return equipment_obj
 
 @api_router.get("/equipment", response_model=List[Equipment])
-async def get_equipment(user: User = Depends(get_current_user)):
+async def get_equipment(page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     # Check permission
     if not user.has_permission("equipment", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view equipment")
@@ -332,15 +510,13 @@ async def get_equipment(user: User = Depends(get_current_user)):
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
-    equipment_list = await db.equipment.find(
-        {"company_id": user.current_company_id, "is_active": True}, 
-        {"_id": 0}
-    ).to_list(1000)
-    
-    for equipment in equipment_list:
-        deserialize_datetime(equipment, ['created_at', 'updated_at', 'purchase_date'])
+    equipment_list = await fetch_page(
+        db.equipment,
+        {"company_id": user.current_company_id, "is_active": True},
+        "created_at", page, model=Equipment
+    )
     
-    return equipment_list
+    return trusted_list_response(Equipment, equipment_list)
 
 # Production routes (company-specific)
 @api_router.post("/production", response_model=Production)
@@ -351,35 +527,54 @@ async def create_production(production_data: ProductionCreate, user: User = Depe
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
+    production_obj = build_production(production_data, user.current_company_id)
+    doc = production_obj.model_dump()
+    serialize_datetime(doc)
+    
+    await db.production.insert_one(doc)
+    await apply_rollup(db, "production", user.current_company_id, production_obj.model_dump())
+    invalidate_dashboard_cache(user.current_company_id)
+    return production_obj
+
+def build_production(production_data: ProductionCreate, company_id: str) -> Production:
     production_dict = production_data.model_dump()
     # Calculate completion rate
     if production_dict['contract_qty'] > 0:
         production_dict['completion_rate'] = (production_dict['actual_qty'] / production_dict['contract_qty']) * 100
+    return Production(**production_dict, company_id=company_id)
+
+@api_router.post("/production/bulk", response_model=BulkCreateResult)
+async def create_production_bulk(rows: List[Any] = Body(...), user: User = Depends(get_current_user)):
+    """Create a shift's production rows in one request; results are reported per row"""
+    if not user.has_permission("production", "create"):
+        raise HTTPException(status_code=403, detail="You don't have permission to create production records")
     
-    production_obj = Production(**production_dict, company_id=user.current_company_id)
-    doc = production_obj.model_dump()
-    serialize_datetime(doc)
+    if not hasattr(user, 'current_company_id') or not user.current_company_id:
+        raise HTTPException(status_code=400, detail="No company context")
     
-    await db.production.insert_one(doc)
-    return production_obj
+    company_id = user.current_company_id
+    valid, results = build_rows(rows, ProductionCreate, lambda data: build_production(data, company_id))
+    result, inserted = await insert_rows(db.production, valid, results, serialize_datetime, len(rows))
+    if inserted:
+        await apply_rollups(db, "production", company_id, [obj.model_dump() for obj in inserted])
+        invalidate_dashboard_cache(company_id)
+    return result
 
 @api_router.get("/production", response_model=List[Production])
-async def get_production(user: User = Depends(get_current_user)):
+async def get_production(page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("production", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view production records")
     
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
-    production_list = await db.production.find(
-        {"company_id": user.current_company_id}, 
-        {"_id": 0}
-    ).sort("date", -1).to_list(1000)
-    
-    for production in production_list:
-        deserialize_datetime(production, ['date', 'created_at', 'updated_at'])
+    production_list = await fetch_page(
+        db.production,
+        {"company_id": user.current_company_id},
+        "date", page, direction=-1, model=Production
+    )
     
-    return production_list
+    return trusted_list_response(Production, production_list)
 
 # Expenses routes (company-specific)
 @api_router.post("/expenses", response_model=Expense)
@@ -395,25 +590,42 @@ async def create_expense(expense_data: ExpenseCreate, user: User = Depends(get_c
     serialize_datetime(doc)
     
     await db.expenses.insert_one(doc)
+    await apply_rollup(db, "expenses", user.current_company_id, expense_obj.model_dump())
+    invalidate_dashboard_cache(user.current_company_id)
     return expense_obj
 
+@api_router.post("/expenses/bulk", response_model=BulkCreateResult)
+async def create_expenses_bulk(rows: List[Any] = Body(...), user: User = Depends(get_current_user)):
+    """Create a batch of expenses in one request; results are reported per row"""
+    if not user.has_permission("expenses", "create"):
+        raise HTTPException(status_code=403, detail="You don't have permission to create expenses")
+    
+    if not hasattr(user, 'current_company_id') or not user.current_company_id:
+        raise HTTPException(status_code=400, detail="No company context")
+    
+    company_id = user.current_company_id
+    valid, results = build_rows(rows, ExpenseCreate, lambda data: Expense(**data.model_dump(), company_id=company_id))
+    result, inserted = await insert_rows(db.expenses, valid, results, serialize_datetime, len(rows))
+    if inserted:
+        await apply_rollups(db, "expenses", company_id, [obj.model_dump() for obj in inserted])
+        invalidate_dashboard_cache(company_id)
+    return result
+
 @api_router.get("/expenses", response_model=List[Expense])
-async def get_expenses(user: User = Depends(get_current_user)):
+async def get_expenses(page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("expenses", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view expenses")
     
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
-    expenses_list = await db.expenses.find(
-        {"company_id": user.current_company_id}, 
-        {"_id": 0}
-    ).sort("date", -1).to_list(1000)
-    
-    for expense in expenses_list:
-        deserialize_datetime(expense, ['date', 'created_at', 'updated_at'])
+    expenses_list = await fetch_page(
+        db.expenses,
+        {"company_id": user.current_company_id},
+        "date", page, direction=-1, model=Expense
+    )
     
-    return expenses_list
+    return trusted_list_response(Expense, expenses_list)
 
 # Invoices routes (company-specific)
 @api_router.post("/invoices", response_model=Invoice)
@@ -437,25 +649,25 @@ async def create_invoice(invoice_data: InvoiceCreate, user: User = Depends(get_c
     serialize_datetime(doc)
     
     await db.invoices.insert_one(doc)
+    await apply_rollup(db, "invoices", user.current_company_id, invoice_obj.model_dump())
+    invalidate_dashboard_cache(user.current_company_id)
     return invoice_obj
 
 @api_router.get("/invoices", response_model=List[Invoice])
-async def get_invoices(user: User = Depends(get_current_user)):
+async def get_invoices(page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("invoices", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view invoices")
     
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
-    invoices_list = await db.invoices.find(
-        {"company_id": user.current_company_id}, 
-        {"_id": 0}
-    ).sort("date", -1).to_list(1000)
-    
-    for invoice in invoices_list:
-        deserialize_datetime(invoice, ['date', 'due_date', 'payment_date', 'created_at', 'updated_at'])
+    invoices_list = await fetch_page(
+        db.invoices,
+        {"company_id": user.current_company_id},
+        "date", page, direction=-1, model=Invoice
+    )
     
-    return invoices_list
+    return trusted_list_response(Invoice, invoices_list)
 
 # Attendance routes (company-specific)
 @api_router.post("/attendance", response_model=Attendance)
@@ -473,23 +685,35 @@ async def create_attendance(attendance_data: AttendanceCreate, user: User = Depe
     await db.attendance.insert_one(doc)
     return attendance_obj
 
+@api_router.post("/attendance/bulk", response_model=BulkCreateResult)
+async def create_attendance_bulk(rows: List[Any] = Body(...), user: User = Depends(get_current_user)):
+    """Create a day of attendance records in one request; results are reported per row"""
+    if not user.has_permission("attendance", "create"):
+        raise HTTPException(status_code=403, detail="You don't have permission to create attendance records")
+    
+    if not hasattr(user, 'current_company_id') or not user.current_company_id:
+        raise HTTPException(status_code=400, detail="No company context")
+    
+    company_id = user.current_company_id
+    valid, results = build_rows(rows, AttendanceCreate, lambda data: Attendance(**data.model_dump(), company_id=company_id))
+    result, _ = await insert_rows(db.attendance, valid, results, serialize_datetime, len(rows))
+    return result
+
 @api_router.get("/attendance", response_model=List[Attendance])
-async def get_attendance(user: User = Depends(get_current_user)):
+async def get_attendance(page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("attendance", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view attendance records")
     
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
-    attendance_list = await db.attendance.find(
-        {"company_id": user.current_company_id}, 
-        {"_id": 0}
-    ).sort("date", -1).to_list(1000)
-    
-    for attendance in attendance_list:
-        deserialize_datetime(attendance, ['date', 'check_in', 'check_out', 'created_at', 'updated_at'])
+    attendance_list = await fetch_page(
+        db.attendance,
+        {"company_id": user.current_company_id},
+        "date", page, direction=-1, model=Attendance
+    )
     
-    return attendance_list
+    return trusted_list_response(Attendance, attendance_list)
 
 
 # Costing Centers routes (company-specific)
@@ -509,22 +733,20 @@ async def create_costing_center(center_data: CostingCenterCreate, user: User = D
     return center_obj
 
 @api_router.get("/costing-centers", response_model=List[CostingCenter])
-async def get_costing_centers(user: User = Depends(get_current_user)):
+async def get_costing_centers(page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("costing_centers", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view costing centers")
     
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
-    centers_list = await db.costing_centers.find(
-        {"company_id": user.current_company_id, "is_active": True}, 
-        {"_id": 0}
-    ).to_list(1000)
-    
-    for center in centers_list:
-        deserialize_datetime(center, ['created_at', 'updated_at'])
+    centers_list = await fetch_page(
+        db.costing_centers,
+        {"company_id": user.current_company_id, "is_active": True},
+        "created_at", page, model=CostingCenter
+    )
     
-    return centers_list
+    return trusted_list_response(CostingCenter, centers_list)
 
 # Dashboard Analytics routes (company-specific)
 @api_router.get("/dashboard/stats")
@@ -540,10 +762,36 @@ async def get_dashboard_stats(user: User = Depends(get_current_user)):
     # Get current month statistics
     today = datetime.now(timezone.utc)
     month_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    key = (company_id, month_start)
+    
+    stats = dashboard_cache.get(key)
+    if stats is not None:
+        return stats
+    
+    # Concurrent requests for the same dashboard share one computation, which
+    # keeps running if the request that started it is cancelled
+    task = dashboard_inflight.get(key)
+    if task is None:
+        task = dashboard_inflight[key] = asyncio.ensure_future(refresh_dashboard_stats(company_id, month_start))
+        task.add_done_callback(lambda _: dashboard_inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+async def refresh_dashboard_stats(company_id: str, month_start: datetime) -> dict:
+    """Compute a company's dashboard stats and cache them unless a write raced"""
+    generation = dashboard_generations.get(company_id, 0)
+    stats = await compute_dashboard_stats(company_id, month_start)
+    if dashboard_generations.get(company_id, 0) == generation:
+        dashboard_cache.set((company_id, month_start), stats)
+    return stats
+
+async def compute_dashboard_stats(company_id: str, month_start: datetime) -> dict:
+    """Run the dashboard aggregations concurrently"""
+    if DASHBOARD_FROM_ROLLUPS:
+        return await compute_dashboard_stats_from_rollups(company_id, month_start)
     
     # Production stats
     production_pipeline = [
-        {"$match": {"company_id": company_id, "date": {"$gte": month_start.isoformat()}}},
+        {"$match": {"company_id": company_id, "date": {"$gte": to_storage(month_start)}}},
         {"$group": {
             "_id": None,
             "total_actual": {"$sum": "$actual_qty"},
@@ -551,32 +799,33 @@ async def get_dashboard_stats(user: User = Depends(get_current_user)):
             "avg_completion": {"$avg": "$completion_rate"}
         }}
     ]
-    production_stats = await db.production.aggregate(production_pipeline).to_list(1)
     
     # Expense stats
     expense_pipeline = [
-        {"$match": {"company_id": company_id, "date": {"$gte": month_start.isoformat()}}},
+        {"$match": {"company_id": company_id, "date": {"$gte": to_storage(month_start)}}},
         {"$group": {
             "_id": "$category",
             "total_amount": {"$sum": "$amount"},
             "count": {"$sum": 1}
         }}
     ]
-    expense_stats = await db.expenses.aggregate(expense_pipeline).to_list(100)
-    
-    # Equipment count
-    equipment_count = await db.equipment.count_documents({"company_id": company_id, "is_active": True})
     
     # Invoice stats
     invoice_pipeline = [
-        {"$match": {"company_id": company_id, "date": {"$gte": month_start.isoformat()}}},
+        {"$match": {"company_id": company_id, "date": {"$gte": to_storage(month_start)}}},
         {"$group": {
             "_id": "$status",
             "total_amount": {"$sum": "$total_amount"},
             "count": {"$sum": 1}
         }}
     ]
-    invoice_stats = await db.invoices.aggregate(invoice_pipeline).to_list(100)
+    
+    production_stats, expense_stats, equipment_count, invoice_stats = await asyncio.gather(
+        db.production.aggregate(production_pipeline).to_list(1),
+        db.expenses.aggregate(expense_pipeline).to_list(100),
+        db.equipment.count_documents({"company_id": company_id, "is_active": True}),
+        db.invoices.aggregate(invoice_pipeline).to_list(100)
+    )
     
     return {
         "production": production_stats[0] if production_stats else {"total_actual": 0, "total_contract": 0, "avg_completion": 0},
@@ -587,6 +836,68 @@ async def get_dashboard_stats(user: User = Depends(get_current_user)):
         "company_id": company_id
     }
 
+async def compute_dashboard_stats_from_rollups(company_id: str, month_start: datetime) -> dict:
+    """Dashboard stats read from the current month's rollup buckets"""
+    month = month_start.strftime("%Y-%m")
+    production, expenses, invoices, equipment_count = await asyncio.gather(
+        get_rollups(db, company_id, "production", TOTAL, month, month),
+        get_rollups(db, company_id, "expenses", "category", month, month),
+        get_rollups(db, company_id, "invoices", "status", month, month),
+        db.equipment.count_documents({"company_id": company_id, "is_active": True})
+    )
+    production_total = production[0] if production else None
+    return {
+        "production": {
+            "_id": None,
+            "total_actual": bucket_sum(production_total, "actual_qty"),
+            "total_contract": bucket_sum(production_total, "contract_qty"),
+            "avg_completion": bucket_avg(production_total, "completion_rate")
+        },
+        "expenses": [
+            {"_id": bucket["key"], "total_amount": bucket_sum(bucket, "amount"), "count": bucket["count"]}
+            for bucket in expenses
+        ],
+        "equipment_count": equipment_count,
+        "invoices": [
+            {"_id": bucket["key"], "total_amount": bucket_sum(bucket, "total_amount"), "count": bucket["count"]}
+            for bucket in invoices
+        ],
+        "month": month_start.strftime("%B %Y"),
+        "company_id": company_id
+    }
+
+@api_router.get("/reports/monthly")
+async def get_monthly_report(
+    source: str,
+    dimension: str = TOTAL,
+    from_month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    to_month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    year_over_year: bool = False,
+    user: User = Depends(get_current_user)
+):
+    """Monthly totals from the rollups, optionally with the same months a year earlier"""
+    if source not in ROLLUP_SOURCES:
+        raise HTTPException(status_code=400, detail=f"Unknown source: {source}")
+    if dimension != TOTAL and dimension not in ROLLUP_SOURCES[source]["dimensions"]:
+        raise HTTPException(status_code=400, detail=f"Unknown dimension for {source}: {dimension}")
+    if not user.has_permission(source, "read"):
+        raise HTTPException(status_code=403, detail=f"You don't have permission to view {source}")
+    
+    if not hasattr(user, 'current_company_id') or not user.current_company_id:
+        raise HTTPException(status_code=400, detail="No company context")
+    
+    months = await get_rollups(db, user.current_company_id, source, dimension, from_month, to_month)
+    if year_over_year:
+        previous = await get_rollups(
+            db, user.current_company_id, source, dimension,
+            previous_year_month(from_month), previous_year_month(to_month)
+        )
+        by_month = {(bucket["month"], bucket["key"]): bucket for bucket in previous}
+        for bucket in months:
+            bucket["previous_year"] = by_month.get((previous_year_month(bucket["month"]), bucket["key"]))
+    
+    return {"source": source, "dimension": dimension, "months": months}
+
 
 # Project Management Routes
 @api_router.post("/projects", response_model=Project)
@@ -605,22 +916,20 @@ async def create_project(project_data: ProjectCreate, user: User = Depends(get_c
     return project_obj
 
 @api_router.get("/projects", response_model=List[Project])
-async def get_projects(user: User = Depends(get_current_user)):
+async def get_projects(page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("projects", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view projects")
     
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
-    projects_list = await db.projects.find(
-        {"company_id": user.current_company_id}, 
-        {"_id": 0}
-    ).to_list(1000)
-    
-    for project in projects_list:
-        deserialize_datetime(project, ['created_at', 'updated_at', 'start_date', 'end_date'])
+    projects_list = await fetch_page(
+        db.projects,
+        {"company_id": user.current_company_id},
+        "created_at", page, model=Project
+    )
     
-    return projects_list
+    return trusted_list_response(Project, projects_list)
 
 @api_router.get("/projects/{project_id}", response_model=Project)
 async def get_project(project_id: str, user: User = Depends(get_current_user)):
@@ -643,7 +952,7 @@ async def update_project(project_id: str, project_data: dict, user: User = Depen
     if not project_doc:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    project_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    project_data['updated_at'] = storage_now()
     serialize_datetime(project_data)
     
     await db.projects.update_one({"id": project_id}, {"$set": project_data})
@@ -669,7 +978,7 @@ async def create_feasibility_study(study_data: FeasibilityStudyCreate, user: Use
     return study_obj
 
 @api_router.get("/feasibility-studies", response_model=List[FeasibilityStudy])
-async def get_feasibility_studies(project_id: Optional[str] = None, user: User = Depends(get_current_user)):
+async def get_feasibility_studies(project_id: Optional[str] = None, page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("feasibility_studies", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view feasibility studies")
     
@@ -680,12 +989,9 @@ async def get_feasibility_studies(project_id: Optional[str] = None, user: User =
     if project_id:
         query["project_id"] = project_id
     
-    studies_list = await db.feasibility_studies.find(query, {"_id": 0}).to_list(1000)
-    
-    for study in studies_list:
-        deserialize_datetime(study, ['created_at', 'updated_at', 'start_date', 'expected_end_date', 'actual_end_date'])
+    studies_list = await fetch_page(db.feasibility_studies, query, "created_at", page, model=FeasibilityStudy)
     
-    return studies_list
+    return trusted_list_response(FeasibilityStudy, studies_list)
 
 @api_router.get("/feasibility-studies/{study_id}", response_model=FeasibilityStudy)
 async def get_feasibility_study(study_id: str, user: User = Depends(get_current_user)):
@@ -716,7 +1022,7 @@ async def create_investment(investment_data: InvestmentCreate, user: User = Depe
     return investment_obj
 
 @api_router.get("/investments", response_model=List[Investment])
-async def get_investments(project_id: Optional[str] = None, user: User = Depends(get_current_user)):
+async def get_investments(project_id: Optional[str] = None, page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("investments", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view investments")
     
@@ -727,12 +1033,9 @@ async def get_investments(project_id: Optional[str] = None, user: User = Depends
     if project_id:
         query["project_id"] = project_id
     
-    investments_list = await db.investments.find(query, {"_id": 0}).to_list(1000)
+    investments_list = await fetch_page(db.investments, query, "created_at", page, model=Investment)
     
-    for investment in investments_list:
-        deserialize_datetime(investment, ['created_at', 'updated_at', 'investment_date', 'maturity_date'])
-    
-    return investments_list
+    return trusted_list_response(Investment, investments_list)
 
 # Financial Projections Routes
 @api_router.post("/financial-projections", response_model=FinancialProjection)
@@ -751,7 +1054,7 @@ async def create_financial_projection(projection_data: FinancialProjectionCreate
     return projection_obj
 
 @api_router.get("/financial-projections", response_model=List[FinancialProjection])
-async def get_financial_projections(project_id: Optional[str] = None, user: User = Depends(get_current_user)):
+async def get_financial_projections(project_id: Optional[str] = None, page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("financial_projections", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view financial projections")
     
@@ -762,12 +1065,9 @@ async def get_financial_projections(project_id: Optional[str] = None, user: User
     if project_id:
         query["project_id"] = project_id
     
-    projections_list = await db.financial_projections.find(query, {"_id": 0}).sort("year", 1).to_list(1000)
-    
-    for projection in projections_list:
-        deserialize_datetime(projection, ['created_at', 'updated_at'])
+    projections_list = await fetch_page(db.financial_projections, query, "year", page, model=FinancialProjection)
     
-    return projections_list
+    return trusted_list_response(FinancialProjection, projections_list)
 
 # Document Management Routes
 @api_router.post("/documents", response_model=Document)
@@ -786,7 +1086,7 @@ async def create_document(document_data: DocumentCreate, user: User = Depends(ge
     return document_obj
 
 @api_router.get("/documents", response_model=List[Document])
-async def get_documents(project_id: Optional[str] = None, document_type: Optional[str] = None, user: User = Depends(get_current_user)):
+async def get_documents(project_id: Optional[str] = None, document_type: Optional[str] = None, page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("documents", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view documents")
     
@@ -799,12 +1099,9 @@ async def get_documents(project_id: Optional[str] = None, document_type: Optiona
     if document_type:
         query["document_type"] = document_type
     
-    documents_list = await db.documents.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    
-    for document in documents_list:
-        deserialize_datetime(document, ['created_at', 'updated_at'])
+    documents_list = await fetch_page(db.documents, query, "created_at", page, direction=-1, model=Document)
     
-    return documents_list
+    return trusted_list_response(Document, documents_list)
 
 # Health check
 @api_router.get("/")
@@ -815,8 +1112,36 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
 
-# Include router in app
-app.include_router(api_router)
+# Runtime gauges refreshed on every scrape
+cache_entries = metrics_registry.register(Gauge("cache_entries", "Entries held by in-process caches", ("cache",)))
+cache_lookups = metrics_registry.register(Counter("cache_lookups_total", "In-process cache lookups", ("cache", "result")))
+password_hash_in_flight = metrics_registry.register(Gauge("password_hash_in_flight", "bcrypt operations running or queued", ("state",)))
+password_hash_operations = metrics_registry.register(Counter("password_hash_operations_total", "bcrypt operations completed", ("operation",)))
+fleet_feed_subscribers = metrics_registry.register(Gauge("fleet_feed_subscribers", "Open live fleet streams"))
+fleet_feed_published = metrics_registry.register(Counter("fleet_feed_published_total", "Position updates published to live fleet streams"))
+
+def collect_runtime_metrics():
+    for name, cache in (("principals", principal_cache), ("companies", company_cache), ("dashboard", dashboard_cache),
+                        ("department_tree", department_tree_cache)):
+        cache_entries.set(len(cache), name)
+        cache_lookups.set_total(cache.hits, name, "hit")
+        cache_lookups.set_total(cache.misses, name, "miss")
+    pool = passwords.stats
+    password_hash_in_flight.set(pool.in_flight, "running")
+    password_hash_in_flight.set(pool.waiting, "waiting")
+    for operation, count in pool.operations.items():
+        password_hash_operations.set_total(count, operation)
+    fleet_feed_subscribers.set(fleet_feed.subscriber_count())
+    fleet_feed_published.set_total(fleet_feed.published)
+
+metrics_registry.add_collector(collect_runtime_metrics)
+
+@api_router.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Request, MongoDB and runtime metrics in the Prometheus text format"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
 
 # Import and include accounting routes
 from accounting_routes import accounting_router
@@ -846,6 +1171,18 @@ app.include_router(file_router)
 from csv_routes import router as csv_router
 app.include_router(csv_router)
 
+# Import and include Platform Administration routes
+from admin_routes import admin_router
+app.include_router(admin_router)
+
+# Import and include Geofence routes
+from geofence_routes import router as geofence_router
+app.include_router(geofence_router)
+
+# Import and include Batch routes
+from batch_routes import router as batch_router
+app.include_router(batch_router)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -853,8 +1190,15 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Request context for the slow operation recorder
+app.add_middleware(RequestContextMiddleware)
+
+# Request metrics (outermost, so the timings include every other middleware)
+app.add_middleware(MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -862,9 +1206,47 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def ensure_db_indexes():
+    """Reconcile the index registry with the database"""
+    if os.environ.get('ENSURE_INDEXES_ON_STARTUP', 'true').lower() != 'true':
+        return
+    try:
+        await ensure_indexes(db)
+    except Exception as e:
+        logger.warning(f"Index reconciliation skipped: {e}")
+
+@app.on_event("startup")
+async def backfill_vehicle_geo():
+    """Give vehicles located before GeoJSON positions existed a last_location"""
+    if os.environ.get('ENSURE_INDEXES_ON_STARTUP', 'true').lower() != 'true':
+        return
+    try:
+        backfilled = await backfill_vehicle_locations(db)
+        if backfilled:
+            logger.info(f"Backfilled last_location for {backfilled} vehicle(s)")
+    except Exception as e:
+        logger.warning(f"Vehicle location backfill skipped: {e}")
+
+@app.on_event("startup")
+async def backfill_department_tree():
+    """Materialize ancestor_ids and paths for departments created without them"""
+    if os.environ.get('ENSURE_INDEXES_ON_STARTUP', 'true').lower() != 'true':
+        return
+    try:
+        backfilled = await backfill_department_paths(db)
+        if backfilled:
+            logger.info(f"Rebuilt paths for {backfilled} department(s)")
+    except Exception as e:
+        logger.warning(f"Department path backfill skipped: {e}")
+
+@app.on_event("startup")
+async def start_slow_operation_recorder():
+    await slow_operations.start(db)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    pass
+    await slow_operations.stop()
 
 # HR Management Routes
 @api_router.post("/employees", response_model=Employee)
@@ -883,29 +1265,23 @@ async def create_employee(employee_data: EmployeeCreate, user: User = Depends(ge
     return employee_obj
 
 @api_router.get("/employees", response_model=List[Employee])
-async def get_employees(user: User = Depends(get_current_user)):
-    if not user.has_permission("employees", "read") and not user.has_permission("employees", "read_own"):
+async def get_employees(page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
+    can_read, can_read_own = user.has_permissions([("employees", "read"), ("employees", "read_own")])
+    if not can_read and not can_read_own:
         raise HTTPException(status_code=403, detail="You don't have permission to view employees")
     
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
+    query = {"company_id": user.current_company_id}
+    
     # Drivers can only see their own employee record
-    if user.has_permission("employees", "read_own"):
-        employees_list = await db.employees.find(
-            {"company_id": user.current_company_id, "user_id": user.id}, 
-            {"_id": 0}
-        ).to_list(1)
-    else:
-        employees_list = await db.employees.find(
-            {"company_id": user.current_company_id}, 
-            {"_id": 0}
-        ).to_list(1000)
+    if can_read_own:
+        query["user_id"] = user.id
     
-    for employee in employees_list:
-        deserialize_datetime(employee, ['created_at', 'updated_at', 'date_of_birth', 'hire_date', 'termination_date'])
+    employees_list = await fetch_page(db.employees, query, "created_at", page, model=Employee)
     
-    return employees_list
+    return trusted_list_response(Employee, employees_list)
 
 @api_router.get("/employees/me", response_model=Employee)
 async def get_my_employee_profile(user: User = Depends(get_current_user)):
@@ -947,8 +1323,9 @@ async def create_salary_payment(payment_data: SalaryPaymentCreate, user: User =
     return payment_obj
 
 @api_router.get("/salary-payments", response_model=List[SalaryPayment])
-async def get_salary_payments(employee_id: Optional[str] = None, user: User = Depends(get_current_user)):
-    if not user.has_permission("salary", "read") and not user.has_permission("salary", "read_own"):
+async def get_salary_payments(employee_id: Optional[str] = None, page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
+    can_read, can_read_own = user.has_permissions([("salary", "read"), ("salary", "read_own")])
+    if not can_read and not can_read_own:
         raise HTTPException(status_code=403, detail="You don't have permission to view salary payments")
     
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
@@ -957,19 +1334,19 @@ async def get_salary_payments(employee_id: Optional[str] = None, user: User = De
     query = {"company_id": user.current_company_id}
     
     # Drivers can only see their own salary
-    if user.has_permission("salary", "read_own"):
-        my_employee = await db.employees.find_one({"user_id": user.id})
-        if my_employee:
-            query["employee_id"] = my_employee['id']
+    if can_read_own:
+        my_employee = await db.employees.find_one(
+            {"company_id": user.current_company_id, "user_id": user.id}, {"_id": 0, "id": 1}
+        )
+        if not my_employee:
+            return []
+        query["employee_id"] = my_employee['id']
     elif employee_id:
         query["employee_id"] = employee_id
     
-    payments_list = await db.salary_payments.find(query, {"_id": 0}).sort("year", -1).sort("month", -1).to_list(1000)
-    
-    for payment in payments_list:
-        deserialize_datetime(payment, ['created_at', 'updated_at', 'payment_date'])
+    payments_list = await fetch_page(db.salary_payments, query, [("year", -1), ("month", -1)], page, model=SalaryPayment)
     
-    return payments_list
+    return trusted_list_response(SalaryPayment, payments_list)
 
 # Vehicle & GPS Routes
 @api_router.post("/vehicles", response_model=Vehicle)
@@ -988,7 +1365,7 @@ async def create_vehicle(vehicle_data: VehicleCreate, user: User = Depends(get_c
     return vehicle_obj
 
 @api_router.get("/vehicles", response_model=List[Vehicle])
-async def get_vehicles(user: User = Depends(get_current_user)):
+async def get_vehicles(page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("vehicles", "read") and not user.has_permission("vehicles", "read_assigned"):
         raise HTTPException(status_code=403, detail="You don't have permission to view vehicles")
     
@@ -1001,39 +1378,178 @@ async def get_vehicles(user: User = Depends(get_current_user)):
     if user.has_permission("vehicles", "read_assigned"):
         query["assigned_driver_id"] = user.id
     
-    vehicles_list = await db.vehicles.find(query, {"_id": 0}).to_list(1000)
+    vehicles_list = await fetch_page(db.vehicles, query, "created_at", page, model=Vehicle)
+    
+    return trusted_list_response(Vehicle, vehicles_list)
+
+@api_router.get("/vehicles/nearby", response_model=List[VehicleDistance])
+async def get_nearby_vehicles(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    max_distance_m: Optional[float] = Query(None, gt=0),
+    limit: int = Query(10, ge=1, le=100),
+    user: User = Depends(get_current_user)
+):
+    """Vehicles nearest to a point (e.g. a quarry), with their distance in meters"""
+    if not user.has_permission("vehicle_location", "read"):
+        raise HTTPException(status_code=403, detail="You don't have permission to view vehicle locations")
+    
+    vehicles_list = await nearest_vehicles(
+        db, user.current_company_id, lat, lng, max_distance_m, limit,
+        assigned_driver_id=user.id if assigned_vehicles_only(user) else None
+    )
+    return trusted_list_response(VehicleDistance, vehicles_list)
+
+@api_router.get("/vehicles/within-radius", response_model=List[Vehicle])
+async def get_vehicles_within_radius(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(..., gt=0),
+    user: User = Depends(get_current_user)
+):
+    """Vehicles whose last known position is within radius_m of a point"""
+    if not user.has_permission("vehicle_location", "read"):
+        raise HTTPException(status_code=403, detail="You don't have permission to view vehicle locations")
+    
+    vehicles_list = await vehicles_within_radius(
+        db, user.current_company_id, lat, lng, radius_m,
+        assigned_driver_id=user.id if assigned_vehicles_only(user) else None
+    )
+    return trusted_list_response(Vehicle, vehicles_list)
+
+@api_router.post("/vehicles/within-polygon", response_model=List[Vehicle])
+async def get_vehicles_within_polygon(polygon: PolygonQuery, user: User = Depends(get_current_user)):
+    """Vehicles whose last known position is inside a polygon (e.g. a site boundary)"""
+    if not user.has_permission("vehicle_location", "read"):
+        raise HTTPException(status_code=403, detail="You don't have permission to view vehicle locations")
     
-    for vehicle in vehicles_list:
-        deserialize_datetime(vehicle, ['created_at', 'updated_at', 'last_location_update', 'last_maintenance_date', 'next_maintenance_date'])
+    vehicles_list = await vehicles_within_polygon(
+        db, user.current_company_id, polygon.points,
+        assigned_driver_id=user.id if assigned_vehicles_only(user) else None
+    )
+    return trusted_list_response(Vehicle, vehicles_list)
+
+@api_router.get("/vehicles/stream")
+async def stream_vehicle_positions(request: Request, user: User = Depends(get_stream_user)):
+    """Server-Sent Events feed of the company's vehicle positions.
+
+    Sends a "snapshot" event with every located vehicle, then a "position"
+    event whenever a vehicle's latest position advances. Updates are
+    coalesced per vehicle, so a slow client gets the latest state rather
+    than every intermediate fix. Drivers only receive their assigned vehicle.
+    """
+    if not user.has_permission("vehicle_location", "read"):
+        raise HTTPException(status_code=403, detail="You don't have permission to view vehicle locations")
     
-    return vehicles_list
+    if not user.current_company_id:
+        raise HTTPException(status_code=400, detail="No company context")
+    
+    # Drivers only follow the vehicles assigned to them
+    assigned_driver_id = user.id if assigned_vehicles_only(user) else None
+    vehicle_ids = set(await assigned_vehicle_ids(user)) if assigned_driver_id else None
+    
+    # Subscribe before reading the snapshot so no update falls in between
+    subscription = fleet_feed.subscribe(user.current_company_id, vehicle_ids)
+    if subscription is None:
+        raise HTTPException(status_code=429, detail="Too many open fleet streams for this company")
+    try:
+        snapshot = await fleet_snapshot(db, user.current_company_id, assigned_driver_id)
+    except Exception:
+        fleet_feed.unsubscribe(subscription)
+        raise
+    
+    return StreamingResponse(
+        fleet_feed.stream(subscription, snapshot, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @api_router.put("/vehicles/{vehicle_id}/location")
 async def update_vehicle_location(vehicle_id: str, location_data: VehicleLocationUpdate, user: User = Depends(get_current_user)):
     if not user.has_permission("vehicle_location", "update"):
         raise HTTPException(status_code=403, detail="You don't have permission to update vehicle location")
     
-    # Verify vehicle exists and belongs to company
-    vehicle = await db.vehicles.find_one({"id": vehicle_id, "company_id": user.current_company_id})
-    if not vehicle:
-        raise HTTPException(status_code=404, detail="Vehicle not found")
-    
-    # Drivers can only update their assigned vehicle
-    if user.role == UserRole.DRIVER and vehicle.get('assigned_driver_id') != user.id:
-        raise HTTPException(status_code=403, detail="You can only update your assigned vehicle")
-    
-    update_data = {
-        "last_location_lat": location_data.latitude,
-        "last_location_lng": location_data.longitude,
-        "last_location_address": location_data.address,
-        "last_location_update": datetime.now(timezone.utc).isoformat(),
-        "updated_at": datetime.now(timezone.utc).isoformat()
-    }
+    # Verify vehicle exists, belongs to company and (for drivers) is assigned to the user
+    vehicle = await get_tracked_vehicle(user, vehicle_id, "update")
     
-    await db.vehicles.update_one({"id": vehicle_id}, {"$set": update_data})
+    point = GpsPoint(
+        timestamp=datetime.now(timezone.utc),
+        latitude=location_data.latitude,
+        longitude=location_data.longitude,
+        address=location_data.address
+    )
+    await record_positions(db, user.current_company_id, vehicle_id, vehicle.get('assigned_driver_id'), [point])
     
     return {"success": True, "message": "Location updated"}
 
+@api_router.post("/vehicles/{vehicle_id}/positions")
+async def ingest_vehicle_positions(vehicle_id: str, batch: GpsBatch, user: User = Depends(get_current_user)):
+    """Record a batch of GPS fixes (buffered by the driver app) for a vehicle"""
+    if not user.has_permission("vehicle_location", "update"):
+        raise HTTPException(status_code=403, detail="You don't have permission to update vehicle location")
+    
+    if len(batch.points) > GPS_MAX_POINTS:
+        raise HTTPException(status_code=413, detail=f"At most {GPS_MAX_POINTS} points per request")
+    
+    vehicle = await get_tracked_vehicle(user, vehicle_id, "update")
+    
+    latest = await record_positions(db, user.current_company_id, vehicle_id, vehicle.get('assigned_driver_id'), batch.points)
+    
+    return {"accepted": len(batch.points), "latest": latest}
+
+@api_router.get("/vehicles/{vehicle_id}/positions")
+async def get_vehicle_positions(
+    vehicle_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    user: User = Depends(get_current_user)
+):
+    """GPS history of a vehicle, oldest first"""
+    if not user.has_permission("vehicle_location", "read"):
+        raise HTTPException(status_code=403, detail="You don't have permission to view vehicle locations")
+    
+    await get_tracked_vehicle(user, vehicle_id)
+    return await position_history(db, user.current_company_id, vehicle_id, start, end, limit)
+
+async def load_vehicle_track(user: User, vehicle_id: str, start: Optional[datetime], end: Optional[datetime]) -> Track:
+    if not user.has_permission("vehicle_location", "read"):
+        raise HTTPException(status_code=403, detail="You don't have permission to view vehicle locations")
+    
+    await get_tracked_vehicle(user, vehicle_id)
+    if end is None:
+        end = datetime.now(timezone.utc)
+    if start is None:
+        start = end - timedelta(days=1)
+    positions = await position_history(db, user.current_company_id, vehicle_id, start, end, TRIP_MAX_POINTS)
+    return Track.from_documents(positions)
+
+@api_router.get("/vehicles/{vehicle_id}/trips")
+async def get_vehicle_trips(
+    vehicle_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user: User = Depends(get_current_user)
+):
+    """Trips (with distance and duration) and stops reconstructed from GPS history; defaults to the last 24 hours"""
+    track = await load_vehicle_track(user, vehicle_id, start, end)
+    # NumPy work runs off the event loop
+    result = await asyncio.to_thread(segment_trips, track)
+    return FastJSONResponse({"vehicle_id": vehicle_id, "points": len(track), **result})
+
+@api_router.get("/vehicles/{vehicle_id}/track")
+async def get_vehicle_track(
+    vehicle_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    tolerance_m: float = Query(10, gt=0, le=1000),
+    user: User = Depends(get_current_user)
+):
+    """Douglas-Peucker simplified polyline of a vehicle's GPS history; defaults to the last 24 hours"""
+    track = await load_vehicle_track(user, vehicle_id, start, end)
+    result = await asyncio.to_thread(simplify_track, track, tolerance_m)
+    return FastJSONResponse({"vehicle_id": vehicle_id, **result})
+
 @api_router.put("/vehicles/{vehicle_id}/assign")
 async def assign_driver_to_vehicle(vehicle_id: str, driver_id: str, user: User = Depends(get_current_user)):
     if not user.has_permission("vehicles", "update"):
@@ -1047,7 +1563,7 @@ async def assign_driver_to_vehicle(vehicle_id: str, driver_id: str, user: User =
     update_data = {
         "assigned_driver_id": driver_id,
         "assigned_driver_name": driver['full_name'],
-        "updated_at": datetime.now(timezone.utc).isoformat()
+        "updated_at": storage_now()
     }
     
     await db.vehicles.update_one({"id": vehicle_id}, {"$set": update_data})
@@ -1065,30 +1581,36 @@ async def create_department(dept_data: DepartmentCreate, user: User = Depends(ge
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
-    dept_obj = Department(**dept_data.model_dump(), company_id=user.current_company_id)
+    placement = await lineage(db, user.current_company_id, dept_data.parent_department_id)
+    dept_obj = Department(
+        **dept_data.model_dump(exclude={"level"}),
+        company_id=user.current_company_id,
+        ancestor_ids=placement["ancestor_ids"],
+        path=placement["path_prefix"] + dept_data.code,
+        level=placement["level"]
+    )
     doc = dept_obj.model_dump()
     serialize_datetime(doc)
     
     await db.departments.insert_one(doc)
+    await bump_tree_version(db, user.current_company_id)
     return dept_obj
 
 @api_router.get("/departments", response_model=List[Department])
-async def get_departments(user: User = Depends(get_current_user)):
+async def get_departments(page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("departments", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view departments")
     
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
-    departments_list = await db.departments.find(
-        {"company_id": user.current_company_id, "is_active": True}, 
-        {"_id": 0}
-    ).sort("level", 1).to_list(1000)
-    
-    for dept in departments_list:
-        deserialize_datetime(dept, ['created_at', 'updated_at'])
+    departments_list = await fetch_page(
+        db.departments,
+        {"company_id": user.current_company_id, "is_active": True},
+        "level", page, model=Department
+    )
     
-    return departments_list
+    return trusted_list_response(Department, departments_list)
 
 @api_router.get("/departments/tree")
 async def get_department_tree(user: User = Depends(get_current_user)):
@@ -1099,27 +1621,61 @@ async def get_department_tree(user: User = Depends(get_current_user)):
     if not hasattr(user, 'current_company_id') or not user.current_company_id:
         raise HTTPException(status_code=400, detail="No company context")
     
-    departments = await db.departments.find(
-        {"company_id": user.current_company_id, "is_active": True}, 
-        {"_id": 0}
-    ).to_list(1000)
-    
-    # Build tree structure
-    dept_dict = {dept['id']: dept for dept in departments}
-    tree = []
-    
-    for dept in departments:
-        dept['children'] = []
-        if dept.get('parent_department_id'):
-            parent = dept_dict.get(dept['parent_department_id'])
-            if parent:
-                if 'children' not in parent:
-                    parent['children'] = []
-                parent['children'].append(dept)
-        else:
-            tree.append(dept)
+    # Built once per tree version and served pre-encoded
+    return FastJSONResponse(await department_tree_body(db, user.current_company_id))
+
+@api_router.put("/departments/{department_id}/move", response_model=Department)
+async def move_department_route(department_id: str, move_data: DepartmentMove, user: User = Depends(get_current_user)):
+    """Re-parent a department together with its subtree"""
+    if not user.has_permission("departments", "update"):
+        raise HTTPException(status_code=403, detail="You don't have permission to update departments")
+    
+    if not hasattr(user, 'current_company_id') or not user.current_company_id:
+        raise HTTPException(status_code=400, detail="No company context")
+    
+    dept_doc = await move_department(db, user.current_company_id, department_id, move_data.parent_department_id)
+    return Department(**dept_doc)
+
+@api_router.get("/departments/{department_id}/subtree", response_model=List[Department])
+async def get_department_subtree(department_id: str, include_self: bool = True, user: User = Depends(get_current_user)):
+    """Every department under a department (e.g. everything under Finance), ordered by path"""
+    if not user.has_permission("departments", "read"):
+        raise HTTPException(status_code=403, detail="You don't have permission to view departments")
+    
+    if not hasattr(user, 'current_company_id') or not user.current_company_id:
+        raise HTTPException(status_code=400, detail="No company context")
     
-    return tree
+    scope = [{"ancestor_ids": department_id}]
+    if include_self:
+        scope.append({"id": department_id})
+    departments_list = await db.departments.find(
+        {"company_id": user.current_company_id, "$or": scope}, {"_id": 0}
+    ).sort([("path", 1), ("id", 1)]).to_list(None)
+    
+    return trusted_list_response(Department, departments_list)
+
+@api_router.get("/departments/{department_id}/ancestors", response_model=List[Department])
+async def get_department_ancestors(department_id: str, user: User = Depends(get_current_user)):
+    """The departments above a department, root first"""
+    if not user.has_permission("departments", "read"):
+        raise HTTPException(status_code=403, detail="You don't have permission to view departments")
+    
+    if not hasattr(user, 'current_company_id') or not user.current_company_id:
+        raise HTTPException(status_code=400, detail="No company context")
+    
+    dept = await db.departments.find_one(
+        {"id": department_id, "company_id": user.current_company_id}, {"_id": 0, "ancestor_ids": 1}
+    )
+    if not dept:
+        raise HTTPException(status_code=404, detail="Department not found")
+    
+    ancestor_ids = dept.get("ancestor_ids") or []
+    ancestors = await db.departments.find(
+        {"company_id": user.current_company_id, "id": {"$in": ancestor_ids}}, {"_id": 0}
+    ).to_list(None)
+    ancestors.sort(key=lambda ancestor: ancestor_ids.index(ancestor["id"]))
+    
+    return trusted_list_response(Department, ancestors)
 
 # Position Management Routes
 @api_router.post("/positions", response_model=Position)
@@ -1147,7 +1703,7 @@ async def create_position(position_data: PositionCreate, user: User = Depends(ge
     return position_obj
 
 @api_router.get("/positions", response_model=List[Position])
-async def get_positions(department_id: Optional[str] = None, user: User = Depends(get_current_user)):
+async def get_positions(department_id: Optional[str] = None, page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("positions", "read"):
         raise HTTPException(status_code=403, detail="You don't have permission to view positions")
     
@@ -1158,11 +1714,11 @@ async def get_positions(department_id: Optional[str] = None, user: User = Depend
     if department_id:
         query["department_id"] = department_id
     
-    positions_list = await db.positions.find(query, {"_id": 0}).sort("level", 1).to_list(1000)
-    
-    for position in positions_list:
-        deserialize_datetime(position, ['created_at', 'updated_at'])
+    positions_list = await fetch_page(db.positions, query, "level", page, model=Position)
     
-    return positions_list
+    return trusted_list_response(Position, positions_list)
 
-    client.close()
\ No newline at end of file
+    client.close()
+
+# Include router in app (after every api_router route has been declared)
+app.include_router(api_router)
@@ -0,0 +1,271 @@
+"""
+Slow Operation Recorder
+Captures MongoDB commands over a latency threshold with their route, company and a sampled explain()
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import bson
+from pymongo import monitoring
+
+from storage import to_storage
+
+logger = logging.getLogger(__name__)
+
+# Commands slower than this are recorded (0 disables the recorder)
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+# Fraction of slow commands re-run with explain("executionStats")
+SLOW_QUERY_EXPLAIN_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_RATE', 0.1))
+# Size of the capped collection holding the records
+SLOW_QUERY_CAP_BYTES = int(os.environ.get('SLOW_QUERY_CAP_BYTES', 32 * 1024 * 1024))
+
+SLOW_OPERATIONS_COLLECTION = "slow_operations"
+
+# Commands that can be passed to explain
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Never recorded: the recorder's own traffic and connection housekeeping
+_IGNORED_COMMANDS = {"explain", "hello", "isMaster", "ping", "endSessions", "killCursors", "saslStart", "saslContinue"}
+# Session/transport fields that must not be replayed through explain
+_SESSION_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "$db", "$clusterTime", "$readPreference"}
+# Recorded commands larger than this are reduced to their top-level keys
+_MAX_COMMAND_BYTES = 16 * 1024
+_QUEUE_SIZE = 1000
+
+
+# ============================================================================
+# REQUEST CONTEXT
+# ============================================================================
+
+# Motor runs pymongo calls with a copy of the caller's context, so these are
+# visible to the command listener on the executor thread.
+request_scope: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("request_scope", default=None)
+request_company_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_company_id", default=None)
+
+
+class RequestContextMiddleware:
+    """ASGI middleware exposing the current request to the command listener"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        scope_token = request_scope.set(scope)
+        company_token = request_company_id.set(None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_scope.reset(scope_token)
+            request_company_id.reset(company_token)
+
+
+def _current_route() -> Tuple[Optional[str], Optional[str]]:
+    scope = request_scope.get()
+    if scope is None:
+        return None, None
+    # The router stores the matched route in the (shared) scope dict
+    route = scope.get("route")
+    return scope.get("method"), getattr(route, "path", None) or scope.get("path")
+
+
+# ============================================================================
+# RECORDER
+# ============================================================================
+
+def _clean_command(command) -> dict:
+    return {key: value for key, value in command.items() if key not in _SESSION_FIELDS}
+
+
+def _recordable(command: dict) -> dict:
+    """The command as stored: inserted documents dropped, oversized ones reduced to keys"""
+    command = {key: value for key, value in command.items() if key != "documents"}
+    try:
+        if len(bson.encode(command)) <= _MAX_COMMAND_BYTES:
+            return command
+    except Exception:
+        pass
+    return {"truncated": True, "keys": list(command)}
+
+
+def _plan_stages(plan: Optional[dict]) -> str:
+    """Winning plan as a stage chain, e.g. FETCH > IXSCAN"""
+    stages = []
+    while plan:
+        stages.append(plan.get("stage", "?"))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " > ".join(stages)
+
+
+def summarize_explain(result: dict) -> dict:
+    """Reduce an explain("executionStats") result to the fields worth keeping"""
+    if "stages" in result and result["stages"]:
+        # Multi-stage aggregation: the cursor stage holds the query plan
+        result = result["stages"][0].get("$cursor", {})
+    planner = result.get("queryPlanner", {})
+    stats = result.get("executionStats", {})
+    winning_plan = planner.get("winningPlan", {})
+    # Slot-based engine plans nest the classic plan under queryPlan
+    plan = _plan_stages(winning_plan.get("queryPlan", winning_plan))
+    return {
+        "plan": plan,
+        "index_used": "IXSCAN" in plan,
+        "n_returned": stats.get("nReturned"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "execution_time_ms": stats.get("executionTimeMillis"),
+        "winning_plan": winning_plan,
+    }
+
+
+class SlowOperationRecorder(monitoring.CommandListener):
+    """Command listener that records slow MongoDB commands.
+
+    Listener callbacks run on pymongo's threads; slow commands are handed to
+    the event loop through a bounded queue and written by a background task,
+    so the commands themselves are never delayed. When the queue is full
+    records are dropped and counted.
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, explain_rate: float = SLOW_QUERY_EXPLAIN_RATE):
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self._pending: Dict[Tuple[int, object], tuple] = {}
+        self._lock = threading.Lock()
+        self._db = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.explained = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def started(self, event):
+        if not self.enabled or self._loop is None or event.command_name in _IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        if collection == SLOW_OPERATIONS_COLLECTION:
+            return
+        method, route = _current_route()
+        context = (event.command, event.database_name, collection if isinstance(collection, str) else None,
+                   method, route, request_company_id.get())
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = context
+
+    def _finish(self, event, error: Optional[str] = None):
+        with self._lock:
+            context = self._pending.pop((event.request_id, event.connection_id), None)
+        if context is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        loop = self._loop
+        if duration_ms < self.threshold_ms or loop is None:
+            return
+        loop.call_soon_threadsafe(self._enqueue, event.command_name, context, duration_ms, error)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, error=str(event.failure.get("errmsg", event.failure)))
+
+    def _enqueue(self, command_name: str, context: tuple, duration_ms: float, error: Optional[str]) -> None:
+        try:
+            self._queue.put_nowait((command_name, context, duration_ms, error))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _explain(self, database: str, command: dict) -> Optional[dict]:
+        try:
+            result = await self._db.client[database].command(
+                {"explain": command, "verbosity": "executionStats"}
+            )
+            self.explained += 1
+            return summarize_explain(result)
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def _write(self, command_name: str, context: tuple, duration_ms: float, error: Optional[str]) -> None:
+        command, database, collection, method, route, company_id = context
+        command = _clean_command(command)
+        record = {
+            "id": str(uuid.uuid4()),
+            "timestamp": to_storage(datetime.now(timezone.utc)),
+            "command_name": command_name,
+            "database": database,
+            "collection": collection,
+            "duration_ms": round(duration_ms, 3),
+            "method": method,
+            "route": route,
+            "company_id": company_id,
+            "error": error,
+            "command": _recordable(command),
+            "explain": None,
+        }
+        if error is None and command_name in EXPLAINABLE_COMMANDS and random.random() < self.explain_rate:
+            record["explain"] = await self._explain(database, command)
+        await self._db[SLOW_OPERATIONS_COLLECTION].insert_one(record)
+        self.recorded += 1
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._write(*item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Could not record slow operation: {e}")
+
+    async def start(self, db) -> None:
+        """Create the capped collection and start the background writer"""
+        if not self.enabled or self._worker is not None:
+            return
+        self._db = db
+        try:
+            if SLOW_OPERATIONS_COLLECTION not in await db.list_collection_names():
+                await db.create_collection(SLOW_OPERATIONS_COLLECTION, capped=True, size=SLOW_QUERY_CAP_BYTES)
+        except Exception as e:
+            logger.warning(f"Could not create {SLOW_OPERATIONS_COLLECTION}: {e}")
+        self._queue = asyncio.Queue(maxsize=_QUEUE_SIZE)
+        self._loop = asyncio.get_running_loop()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._loop = None
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold_ms,
+            "explain_rate": self.explain_rate,
+            "recorded": self.recorded,
+            "explained": self.explained,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+slow_operations = SlowOperationRecorder()
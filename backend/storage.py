@@ -0,0 +1,44 @@
+"""
+Datetime Storage
+How datetimes are written to MongoDB: ISO-8601 strings (legacy) or native BSON dates
+"""
+
+import os
+from datetime import date, datetime, timezone
+from typing import Any, Optional
+
+# "iso" keeps the historical ISO-string representation; "native" stores BSON
+# dates so range filters compare dates and can use indexes. Run
+# migrate_datetimes.py before switching an existing database to "native".
+DATETIME_STORAGE = os.environ.get('DATETIME_STORAGE', 'iso').lower()
+NATIVE_DATETIMES = DATETIME_STORAGE == 'native'
+
+
+def to_storage(value: Optional[datetime]) -> Any:
+    """Stored representation of a datetime (also used for query bounds)"""
+    if value is None or NATIVE_DATETIMES:
+        return value
+    return value.isoformat()
+
+
+def as_utc(value: datetime) -> datetime:
+    """The same instant in UTC; naive datetimes are taken to be UTC already"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def storage_now() -> Any:
+    """The current UTC time in its stored representation"""
+    return to_storage(datetime.now(timezone.utc))
+
+
+def to_native(value: Any) -> Any:
+    """Parse a stored ISO string into a datetime; other values pass through"""
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    return value
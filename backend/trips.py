@@ -0,0 +1,202 @@
+"""
+Trip Reconstruction
+Split a vehicle's GPS history into trips and stops, and simplify tracks for display (NumPy)
+"""
+
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from storage import as_utc
+
+# Mean Earth radius (IUGG), for local distance math; MongoDB's $centerSphere uses the equatorial radius
+MEAN_EARTH_RADIUS_M = 6371008.8
+
+# A vehicle at or below this speed is stationary
+TRIP_STOP_SPEED_KMH = float(os.environ.get('TRIP_STOP_SPEED_KMH', 3))
+# Stationary for at least this long ends a trip
+TRIP_MIN_STOP_SECONDS = float(os.environ.get('TRIP_MIN_STOP_SECONDS', 300))
+# No fix for this long also ends a trip (device off, no coverage)
+TRIP_MAX_GAP_SECONDS = float(os.environ.get('TRIP_MAX_GAP_SECONDS', 900))
+# Shorter movements (GPS drift in a yard) are not reported as trips
+TRIP_MIN_DISTANCE_M = float(os.environ.get('TRIP_MIN_DISTANCE_M', 200))
+# Most fixes loaded for one trip or track request
+TRIP_MAX_POINTS = int(os.environ.get('TRIP_MAX_POINTS', 200000))
+
+
+class Track:
+    """A vehicle's fixes as parallel arrays, oldest first"""
+
+    def __init__(self, timestamps: List[datetime], lat: List[float], lng: List[float],
+                 speed_kmh: Optional[List[Optional[float]]] = None):
+        self.timestamps = timestamps
+        self.t = np.array([ts.timestamp() for ts in timestamps], dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.step_m = haversine_m(self.lat[:-1], self.lng[:-1], self.lat[1:], self.lng[1:])
+        self.speed_kmh = self._speeds(speed_kmh)
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    @classmethod
+    def from_documents(cls, docs: List[dict]) -> "Track":
+        return cls(
+            [as_utc(doc["timestamp"]) for doc in docs],
+            [doc["lat"] for doc in docs],
+            [doc["lng"] for doc in docs],
+            [doc.get("speed_kmh") for doc in docs],
+        )
+
+    def _speeds(self, reported: Optional[List[Optional[float]]]) -> np.ndarray:
+        """Reported speeds, falling back to the speed derived from the previous fix"""
+        derived = np.zeros(len(self.t))
+        if len(self.t) > 1:
+            dt = np.diff(self.t)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                derived[1:] = np.where(dt > 0, self.step_m / dt * 3.6, 0.0)
+        if reported is None:
+            return derived
+        speeds = np.array([np.nan if value is None else value for value in reported], dtype=np.float64)
+        return np.where(np.isnan(speeds), derived, speeds)
+
+
+def haversine_m(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Great-circle distance in meters, element-wise"""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * MEAN_EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _runs(mask: np.ndarray) -> np.ndarray:
+    """[start, end) index pairs of the True runs of a boolean array"""
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return edges.reshape(-1, 2)
+
+
+# ============================================================================
+# TRIP SEGMENTATION
+# ============================================================================
+
+def segment_trips(track: Track, stop_speed_kmh: float = TRIP_STOP_SPEED_KMH,
+                  min_stop_seconds: float = TRIP_MIN_STOP_SECONDS,
+                  max_gap_seconds: float = TRIP_MAX_GAP_SECONDS,
+                  min_distance_m: float = TRIP_MIN_DISTANCE_M) -> Dict[str, List[dict]]:
+    """Trips and stops of a track.
+
+    A stop is a run of stationary fixes lasting at least min_stop_seconds;
+    a gap between fixes longer than max_gap_seconds also separates trips.
+    Each trip runs from the last fix of the preceding stop to the first fix
+    of the next one, so departure and arrival legs are counted.
+    """
+    n = len(track)
+    if n < 2:
+        return {"trips": [], "stops": []}
+
+    stationary = track.speed_kmh <= stop_speed_kmh
+    stop_runs = _runs(stationary)
+    stop_durations = track.t[stop_runs[:, 1] - 1] - track.t[stop_runs[:, 0]]
+    stop_runs = stop_runs[stop_durations >= min_stop_seconds]
+
+    in_stop = np.zeros(n, dtype=bool)
+    for start, end in stop_runs:
+        in_stop[start:end] = True
+
+    # Moving stretches, split wherever the gap to the next fix is too long
+    gap_after = np.zeros(n, dtype=bool)
+    gap_after[:-1] = np.diff(track.t) > max_gap_seconds
+    cumulative_m = np.concatenate(([0.0], np.cumsum(np.where(gap_after[:-1], 0.0, track.step_m))))
+
+    trips = []
+    for start, end in _runs(~in_stop):
+        # Split the stretch at gaps
+        breaks = np.flatnonzero(gap_after[start:end - 1]) + start + 1
+        for piece_start, piece_end in zip(np.concatenate(([start], breaks)), np.concatenate((breaks, [end]))):
+            first = piece_start - 1 if piece_start > 0 and in_stop[piece_start - 1] else piece_start
+            last = piece_end if piece_end < n and in_stop[piece_end] else piece_end - 1
+            if last <= first:
+                continue
+            distance = float(cumulative_m[last] - cumulative_m[first])
+            if distance < min_distance_m:
+                continue
+            duration = float(track.t[last] - track.t[first])
+            trips.append({
+                "start_time": track.timestamps[first],
+                "end_time": track.timestamps[last],
+                "duration_s": duration,
+                "distance_m": round(distance, 1),
+                "avg_speed_kmh": round(distance / duration * 3.6, 1) if duration > 0 else 0.0,
+                "max_speed_kmh": round(float(track.speed_kmh[first:last + 1].max()), 1),
+                "start": {"lat": float(track.lat[first]), "lng": float(track.lng[first])},
+                "end": {"lat": float(track.lat[last]), "lng": float(track.lng[last])},
+                "point_count": int(last - first + 1),
+            })
+
+    stops = [
+        {
+            "start_time": track.timestamps[start],
+            "end_time": track.timestamps[end - 1],
+            "duration_s": float(track.t[end - 1] - track.t[start]),
+            "lat": float(track.lat[start:end].mean()),
+            "lng": float(track.lng[start:end].mean()),
+        }
+        for start, end in stop_runs
+    ]
+    return {"trips": trips, "stops": stops}
+
+
+# ============================================================================
+# TRACK SIMPLIFICATION
+# ============================================================================
+
+def douglas_peucker(lat: np.ndarray, lng: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """Indices of the points kept by Douglas-Peucker simplification.
+
+    Points are projected to a local equirectangular plane in meters (accurate
+    enough at fleet scale); each segment's farthest point is found with one
+    vectorized pass, and segments are processed from an explicit stack.
+    """
+    n = len(lat)
+    if n <= 2:
+        return np.arange(n)
+
+    origin = np.radians(lat.mean())
+    x = np.radians(lng) * np.cos(origin) * MEAN_EARTH_RADIUS_M
+    y = np.radians(lat) * MEAN_EARTH_RADIUS_M
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(dx * py - dy * px) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return np.flatnonzero(keep)
+
+
+def simplify_track(track: Track, tolerance_m: float) -> Dict[str, Any]:
+    """Simplified polyline of a track as [lat, lng, timestamp] points"""
+    kept = douglas_peucker(track.lat, track.lng, tolerance_m)
+    return {
+        "original_points": len(track),
+        "simplified_points": len(kept),
+        "tolerance_m": tolerance_m,
+        "distance_m": round(float(track.step_m.sum()), 1),
+        "points": [[float(track.lat[i]), float(track.lng[i]), track.timestamps[i]] for i in kept],
+    }
@@ -0,0 +1,226 @@
+"""
+Vehicle Tracking
+GPS fixes stored in a MongoDB time-series collection, with the latest position kept on the vehicle
+as GeoJSON for 2dsphere fleet queries
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from models import Coordinate
+from storage import to_storage, to_native, storage_now, as_utc
+from fleet_feed import fleet_feed
+from geofences import geofence_engine
+
+logger = logging.getLogger(__name__)
+
+POSITIONS_COLLECTION = "vehicle_positions"
+
+# Most GPS fixes accepted in one ingestion request
+GPS_MAX_POINTS = int(os.environ.get('GPS_MAX_POINTS', 500))
+
+# Radius MongoDB's spherical geometry uses for $centerSphere (the equatorial
+# radius, not the mean one), so radius_m / it matches server-side distances
+MONGO_SPHERE_RADIUS_M = 6378100
+
+
+class GpsPoint(BaseModel):
+    timestamp: datetime
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    speed_kmh: Optional[float] = Field(None, ge=0)
+    heading: Optional[float] = Field(None, ge=0, le=360)
+    accuracy_m: Optional[float] = Field(None, ge=0)
+    address: Optional[str] = None
+
+
+class GpsBatch(BaseModel):
+    points: List[GpsPoint]
+
+
+class PolygonQuery(BaseModel):
+    points: List[Coordinate] = Field(..., min_length=3, description="Polygon vertices; the ring is closed automatically")
+
+
+def geo_point(latitude: float, longitude: float) -> Dict[str, Any]:
+    """GeoJSON point (coordinates are longitude first)"""
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def position_document(company_id: str, vehicle_id: str, driver_id: Optional[str], point: GpsPoint) -> Dict[str, Any]:
+    """Time-series document for one fix.
+
+    The time field is always a BSON date (time-series collections require it),
+    whatever DATETIME_STORAGE says; company and vehicle form the meta field so
+    each vehicle's fixes are bucketed together.
+    """
+    doc = {
+        "timestamp": as_utc(point.timestamp),
+        "meta": {"company_id": company_id, "vehicle_id": vehicle_id},
+        "driver_id": driver_id,
+        "lat": point.latitude,
+        "lng": point.longitude,
+    }
+    for field in ("speed_kmh", "heading", "accuracy_m"):
+        value = getattr(point, field)
+        if value is not None:
+            doc[field] = value
+    return doc
+
+
+async def record_positions(db, company_id: str, vehicle_id: str, driver_id: Optional[str],
+                           points: List[GpsPoint]) -> Optional[GpsPoint]:
+    """Append fixes to the history and advance the vehicle's latest position.
+
+    Fixes may arrive late or out of order (the driver app uploads buffered
+    points), so the vehicle is only updated when the newest fix of the batch
+    is newer than the position it already holds; only such an advance is
+    published to the live fleet feed. Every fix is then checked against the
+    company's geofences. Returns that newest fix.
+    """
+    if not points:
+        return None
+    await db[POSITIONS_COLLECTION].insert_many(
+        [position_document(company_id, vehicle_id, driver_id, point) for point in points], ordered=False
+    )
+
+    latest = max(points, key=lambda point: as_utc(point.timestamp))
+    latest_at = to_storage(as_utc(latest.timestamp))
+    result = await db.vehicles.update_one(
+        {
+            "id": vehicle_id,
+            "company_id": company_id,
+            "$or": [{"last_location_update": None}, {"last_location_update": {"$lt": latest_at}}],
+        },
+        {"$set": {
+            "last_location_lat": latest.latitude,
+            "last_location_lng": latest.longitude,
+            "last_location_address": latest.address,
+            "last_location_update": latest_at,
+            "last_location": geo_point(latest.latitude, latest.longitude),
+            "updated_at": storage_now(),
+        }}
+    )
+    if result.modified_count:
+        fleet_feed.publish(company_id, vehicle_id, feed_position(vehicle_id, driver_id, latest))
+    try:
+        await geofence_engine.evaluate(db, company_id, vehicle_id, driver_id, points)
+    except Exception as e:
+        # The fixes are stored; a missed transition is not worth failing the upload
+        logger.warning(f"Geofence evaluation failed for vehicle {vehicle_id}: {e}")
+    return latest
+
+
+def feed_position(vehicle_id: str, driver_id: Optional[str], point: GpsPoint) -> Dict[str, Any]:
+    """A vehicle's position as sent to live feed subscribers"""
+    return {
+        "vehicle_id": vehicle_id,
+        "driver_id": driver_id,
+        "lat": point.latitude,
+        "lng": point.longitude,
+        "address": point.address,
+        "speed_kmh": point.speed_kmh,
+        "heading": point.heading,
+        "timestamp": as_utc(point.timestamp),
+    }
+
+
+def _fleet_query(company_id: str, assigned_driver_id: Optional[str]) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"company_id": company_id}
+    if assigned_driver_id:
+        query["assigned_driver_id"] = assigned_driver_id
+    return query
+
+
+async def fleet_snapshot(db, company_id: str, assigned_driver_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Latest known position of every located vehicle of a company"""
+    query = _fleet_query(company_id, assigned_driver_id)
+    query["last_location_lat"] = {"$ne": None}
+    cursor = db.vehicles.find(
+        query,
+        {"_id": 0, "id": 1, "assigned_driver_id": 1, "last_location_lat": 1, "last_location_lng": 1,
+         "last_location_address": 1, "last_location_update": 1}
+    )
+    return [
+        {
+            "vehicle_id": vehicle["id"],
+            "driver_id": vehicle.get("assigned_driver_id"),
+            "lat": vehicle["last_location_lat"],
+            "lng": vehicle.get("last_location_lng"),
+            "address": vehicle.get("last_location_address"),
+            "timestamp": to_native(vehicle.get("last_location_update")),
+        }
+        async for vehicle in cursor
+    ]
+
+
+async def position_history(db, company_id: str, vehicle_id: str, start: Optional[datetime] = None,
+                           end: Optional[datetime] = None, limit: int = 1000) -> List[dict]:
+    """A vehicle's fixes in chronological order"""
+    query: Dict[str, Any] = {"meta.company_id": company_id, "meta.vehicle_id": vehicle_id}
+    if start or end:
+        query["timestamp"] = {}
+        if start:
+            query["timestamp"]["$gte"] = as_utc(start)
+        if end:
+            query["timestamp"]["$lte"] = as_utc(end)
+    cursor = db[POSITIONS_COLLECTION].find(query, {"_id": 0, "meta": 0}).sort("timestamp", 1).limit(limit)
+    return await cursor.to_list(limit)
+
+
+# ============================================================================
+# FLEET QUERIES
+# ============================================================================
+
+async def nearest_vehicles(db, company_id: str, latitude: float, longitude: float,
+                           max_distance_m: Optional[float] = None, limit: int = 10,
+                           assigned_driver_id: Optional[str] = None) -> List[dict]:
+    """Vehicles closest to a point, nearest first, with distance_m"""
+    near: Dict[str, Any] = {
+        "near": geo_point(latitude, longitude),
+        "distanceField": "distance_m",
+        "key": "last_location",
+        "spherical": True,
+        "query": _fleet_query(company_id, assigned_driver_id),
+    }
+    if max_distance_m is not None:
+        near["maxDistance"] = max_distance_m
+    pipeline = [{"$geoNear": near}, {"$limit": limit}, {"$project": {"_id": 0}}]
+    return await db.vehicles.aggregate(pipeline).to_list(limit)
+
+
+async def vehicles_within_radius(db, company_id: str, latitude: float, longitude: float,
+                                 radius_m: float, limit: int = 1000,
+                                 assigned_driver_id: Optional[str] = None) -> List[dict]:
+    """Vehicles whose latest position lies within radius_m of a point"""
+    query = _fleet_query(company_id, assigned_driver_id)
+    query["last_location"] = {"$geoWithin": {"$centerSphere": [[longitude, latitude], radius_m / MONGO_SPHERE_RADIUS_M]}}
+    return await db.vehicles.find(query, {"_id": 0}).limit(limit).to_list(limit)
+
+
+async def vehicles_within_polygon(db, company_id: str, points: List[Coordinate], limit: int = 1000,
+                                  assigned_driver_id: Optional[str] = None) -> List[dict]:
+    """Vehicles whose latest position lies inside a polygon"""
+    ring = [[point.longitude, point.latitude] for point in points]
+    if ring[0] != ring[-1]:
+        ring.append(ring[0])
+    query = _fleet_query(company_id, assigned_driver_id)
+    query["last_location"] = {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}
+    return await db.vehicles.find(query, {"_id": 0}).limit(limit).to_list(limit)
+
+
+async def backfill_vehicle_locations(db) -> int:
+    """Derive last_location for vehicles that only have the lat/lng fields"""
+    result = await db.vehicles.update_many(
+        {
+            "last_location": {"$exists": False},
+            "last_location_lat": {"$type": "number"},
+            "last_location_lng": {"$type": "number"},
+        },
+        [{"$set": {"last_location": {"type": "Point", "coordinates": ["$last_location_lng", "$last_location_lat"]}}}]
+    )
+    return result.modified_count
@@ -9,7 +9,10 @@ from datetime import datetime, timezone
 
 from warehouse_models import *
 from models import User
-from server import get_current_user, db, serialize_datetime, deserialize_datetime
+from server import get_current_user, db, serialize_datetime, sequences
+from pagination import PageParams, page_params, fetch_page
+from responses import trusted_list_response
+from storage import storage_now
 
 warehouse_router = APIRouter(prefix="/api/warehouse", tags=["Warehouse"])
 
@@ -30,14 +33,12 @@ async def create_warehouse(wh_data: WarehouseCreate, user: User = Depends(get_cu
     return wh_obj
 
 @warehouse_router.get("/warehouses", response_model=List[Warehouse])
-async def get_warehouses(user: User = Depends(get_current_user)):
+async def get_warehouses(page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("warehouses", "read"):
         raise HTTPException(status_code=403, detail="No permission")
     
-    whs = await db.warehouses.find({"company_id": user.current_company_id}, {"_id": 0}).to_list(1000)
-    for wh in whs:
-        deserialize_datetime(wh, ['created_at', 'updated_at'])
-    return whs
+    whs = await fetch_page(db.warehouses, {"company_id": user.current_company_id}, "created_at", page, model=Warehouse)
+    return trusted_list_response(Warehouse, whs)
 
 
 # ============================================================================
@@ -63,6 +64,7 @@ async def create_product(prod_data: ProductCreate, user: User = Depends(get_curr
 async def get_products(
     product_type: Optional[ProductType] = None,
     is_active: Optional[bool] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     if not user.has_permission("products", "read"):
@@ -74,10 +76,8 @@ async def get_products(
     if is_active is not None:
         query["is_active"] = is_active
     
-    prods = await db.products.find(query, {"_id": 0}).sort("product_code", 1).to_list(1000)
-    for prod in prods:
-        deserialize_datetime(prod, ['created_at', 'updated_at'])
-    return prods
+    prods = await fetch_page(db.products, query, "product_code", page, model=Product)
+    return trusted_list_response(Product, prods)
 
 
 # ============================================================================
@@ -88,6 +88,7 @@ async def get_products(
 async def get_stock_balance(
     warehouse_id: Optional[str] = None,
     product_id: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     if not user.has_permission("stock_balance", "read"):
@@ -99,10 +100,8 @@ async def get_stock_balance(
     if product_id:
         query["product_id"] = product_id
     
-    balances = await db.stock_balance.find(query, {"_id": 0}).to_list(1000)
-    for bal in balances:
-        deserialize_datetime(bal, ['last_movement_date', 'created_at', 'updated_at'])
-    return balances
+    balances = await fetch_page(db.stock_balance, query, [("product_id", 1), ("warehouse_id", 1)], page, tie_breaker=None, model=StockBalance)
+    return trusted_list_response(StockBalance, balances)
 
 
 # ============================================================================
@@ -119,8 +118,7 @@ async def create_stock_movement(mov_data: StockMovementCreate, user: User = Depe
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    count = await db.stock_movements.count_documents({"company_id": user.current_company_id})
-    movement_number = f"MOV-{count + 1:06d}"
+    movement_number = await sequences.next_number(user.current_company_id, "stock_movements")
     
     total_cost = mov_data.quantity * mov_data.unit_cost
     
@@ -148,6 +146,7 @@ async def get_stock_movements(
     movement_type: Optional[MovementType] = None,
     product_id: Optional[str] = None,
     warehouse_id: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     if not user.has_permission("stock_movements", "read"):
@@ -161,10 +160,8 @@ async def get_stock_movements(
     if warehouse_id:
         query["$or"] = [{"from_warehouse_id": warehouse_id}, {"to_warehouse_id": warehouse_id}]
     
-    movs = await db.stock_movements.find(query, {"_id": 0}).sort("movement_date", -1).to_list(1000)
-    for mov in movs:
-        deserialize_datetime(mov, ['movement_date', 'created_at', 'updated_at'])
-    return movs
+    movs = await fetch_page(db.stock_movements, query, "movement_date", page, direction=-1, model=StockMovement)
+    return trusted_list_response(StockMovement, movs)
 
 async def update_stock_balance(movement: StockMovement):
     """Helper function to update stock balance after movement"""
@@ -174,7 +171,7 @@ async def update_stock_balance(movement: StockMovement):
             {"company_id": movement.company_id, "product_id": movement.product_id, "warehouse_id": movement.to_warehouse_id},
             {
                 "$inc": {"quantity_on_hand": movement.quantity, "quantity_available": movement.quantity},
-                "$set": {"last_movement_date": datetime.now(timezone.utc).isoformat(), "unit_cost": movement.unit_cost}
+                "$set": {"last_movement_date": storage_now(), "unit_cost": movement.unit_cost}
             },
             upsert=True
         )
@@ -184,7 +181,7 @@ async def update_stock_balance(movement: StockMovement):
             {"company_id": movement.company_id, "product_id": movement.product_id, "warehouse_id": movement.from_warehouse_id},
             {
                 "$inc": {"quantity_on_hand": -movement.quantity, "quantity_available": -movement.quantity},
-                "$set": {"last_movement_date": datetime.now(timezone.utc).isoformat()}
+                "$set": {"last_movement_date": storage_now()}
             }
         )
 
@@ -208,8 +205,7 @@ async def create_purchase_order(po_data: PurchaseOrderCreate, user: User = Depen
     if not warehouse:
         raise HTTPException(status_code=404, detail="Warehouse not found")
     
-    count = await db.purchase_orders.count_documents({"company_id": user.current_company_id})
-    po_number = f"PO-{count + 1:06d}"
+    po_number = await sequences.next_number(user.current_company_id, "purchase_orders")
     
     subtotal = sum(line.total_amount for line in po_data.lines)
     tax_amount = sum(line.tax_amount for line in po_data.lines)
@@ -236,6 +232,7 @@ async def create_purchase_order(po_data: PurchaseOrderCreate, user: User = Depen
 async def get_purchase_orders(
     status: Optional[POStatus] = None,
     vendor_id: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     user: User = Depends(get_current_user)
 ):
     if not user.has_permission("purchase_orders", "read"):
@@ -247,10 +244,8 @@ async def get_purchase_orders(
     if vendor_id:
         query["vendor_id"] = vendor_id
     
-    pos = await db.purchase_orders.find(query, {"_id": 0}).sort("po_date", -1).to_list(1000)
-    for po in pos:
-        deserialize_datetime(po, ['po_date', 'expected_delivery_date', 'approved_date', 'created_at', 'updated_at'])
-    return pos
+    pos = await fetch_page(db.purchase_orders, query, "po_date", page, direction=-1, model=PurchaseOrder)
+    return trusted_list_response(PurchaseOrder, pos)
 
 
 # ============================================================================
@@ -277,8 +272,7 @@ async def create_stock_adjustment(adj_data: StockAdjustmentCreate, user: User =
     qty_after = qty_before + adj_data.quantity_adjusted
     unit_cost = stock_bal['unit_cost'] if stock_bal else product['unit_cost']
     
-    count = await db.stock_adjustments.count_documents({"company_id": user.current_company_id})
-    adj_number = f"ADJ-{count + 1:06d}"
+    adj_number = await sequences.next_number(user.current_company_id, "stock_adjustments")
     
     adj_obj = StockAdjustment(
         **adj_data.model_dump(),
@@ -302,7 +296,7 @@ async def create_stock_adjustment(adj_data: StockAdjustmentCreate, user: User =
         {"company_id": user.current_company_id, "product_id": adj_data.product_id, "warehouse_id": adj_data.warehouse_id},
         {
             "$inc": {"quantity_on_hand": adj_data.quantity_adjusted, "quantity_available": adj_data.quantity_adjusted},
-            "$set": {"last_movement_date": datetime.now(timezone.utc).isoformat()}
+            "$set": {"last_movement_date": storage_now()}
         },
         upsert=True
     )
@@ -310,14 +304,12 @@ async def create_stock_adjustment(adj_data: StockAdjustmentCreate, user: User =
     return adj_obj
 
 @warehouse_router.get("/stock-adjustments", response_model=List[StockAdjustment])
-async def get_stock_adjustments(user: User = Depends(get_current_user)):
+async def get_stock_adjustments(page: PageParams = Depends(page_params), user: User = Depends(get_current_user)):
     if not user.has_permission("stock_adjustments", "read"):
         raise HTTPException(status_code=403, detail="No permission")
     
-    adjs = await db.stock_adjustments.find({"company_id": user.current_company_id}, {"_id": 0}).sort("adjustment_date", -1).to_list(1000)
-    for adj in adjs:
-        deserialize_datetime(adj, ['adjustment_date', 'created_at', 'updated_at'])
-    return adjs
+    adjs = await fetch_page(db.stock_adjustments, {"company_id": user.current_company_id}, "adjustment_date", page, direction=-1, model=StockAdjustment)
+    return trusted_list_response(StockAdjustment, adjs)
 
 
 # ============================================================================
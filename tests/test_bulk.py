@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+import bulk
+from bulk import build_rows, insert_rows
+from models import Attendance, AttendanceCreate
+
+
+def build(company_id):
+    def build_attendance(data: AttendanceCreate) -> Attendance:
+        if data.employee_name == "blocked":
+            raise HTTPException(status_code=400, detail="Employee is blocked")
+        return Attendance(**data.model_dump(), company_id=company_id)
+    return build_attendance
+
+
+ROW = {"employee_id": "e1", "employee_name": "Ahmad", "date": "2026-03-01T00:00:00+00:00"}
+
+
+def test_build_rows_reports_each_invalid_row_by_index():
+    rows = [ROW, 7, {**ROW, "employee_name": "blocked"}, {"employee_id": "e2"}, ROW]
+    valid, failed = build_rows(rows, AttendanceCreate, build("c1"))
+    assert [index for index, _ in valid] == [0, 4]
+    assert all(obj.company_id == "c1" for _, obj in valid)
+    assert sorted(failed) == [1, 2, 3]
+    assert failed[1].errors == ["row: Input should be a valid dictionary or instance of AttendanceCreate"]
+    assert failed[2].errors == ["Employee is blocked"]
+    assert "employee_name: Field required" in failed[3].errors
+
+
+def test_build_rows_rejects_oversized_arrays(monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_MAX_ROWS", 2)
+    with pytest.raises(HTTPException) as error:
+        build_rows([ROW] * 3, AttendanceCreate, build("c1"))
+    assert error.value.status_code == 413
+
+
+class FailingCollection:
+    """insert_many that rejects the documents at the given positions"""
+
+    def __init__(self, failing):
+        self.failing = failing
+        self.docs = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs = [doc for position, doc in enumerate(docs) if position not in self.failing]
+        if self.failing:
+            raise BulkWriteError({"writeErrors": [
+                {"index": position, "errmsg": "duplicate key"} for position in self.failing
+            ]})
+
+
+def test_insert_rows_maps_write_errors_back_to_input_rows():
+    rows = [ROW, "bad", ROW, ROW]
+    valid, failed = build_rows(rows, AttendanceCreate, build("c1"))
+    collection = FailingCollection({1})
+    result, inserted = asyncio.run(insert_rows(collection, valid, failed, lambda doc: doc, len(rows)))
+    assert (result.inserted, result.failed) == (2, 2)
+    assert [row.success for row in result.results] == [True, False, False, True]
+    assert result.results[2].errors == ["duplicate key"]
+    assert [obj.id for obj in inserted] == [doc["id"] for doc in collection.docs]
@@ -0,0 +1,60 @@
+from cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=30, clock=clock)
+    cache.set("a", 1)
+    clock.now = 29.9
+    assert cache.get("a") == 1
+    clock.now = 30
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_per_entry_ttl_overrides_default():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=30, clock=clock)
+    cache.set("short", 1, ttl=5)
+    cache.set("long", 2)
+    clock.now = 10
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=30, clock=FakeClock())
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_zero_ttl_disables_caching():
+    cache = TTLCache(maxsize=10, ttl=0, clock=FakeClock())
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_invalidate_where_and_stats():
+    cache = TTLCache(maxsize=10, ttl=30, clock=FakeClock())
+    cache.set(("c1", "x"), 1)
+    cache.set(("c1", "y"), 2)
+    cache.set(("c2", "x"), 3)
+    assert cache.invalidate_where(lambda key, value: key[0] == "c1") == 2
+    assert cache.get(("c2", "x")) == 3
+    assert cache.get(("c1", "x")) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hit_ratio"] == 0.5
@@ -0,0 +1,38 @@
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from fieldsets import parse_fields, select_fields, fields_projection, partial_model
+from models import Vehicle
+from responses import dump_trusted
+
+
+def test_parse_fields_trims_and_drops_empty_entries():
+    assert parse_fields(" make, model ,,") == ["make", "model"]
+    assert parse_fields("") is None
+    assert parse_fields(" , ") is None
+
+
+def test_select_fields_uses_declaration_order_and_adds_id():
+    assert select_fields(Vehicle, ["model", "make"]) == ["id", "make", "model"]
+
+
+def test_select_fields_rejects_unknown_fields():
+    with pytest.raises(HTTPException) as error:
+        select_fields(Vehicle, ["make", "colour", "owner"])
+    assert error.value.status_code == 400
+    assert error.value.detail == "Unknown fields: colour, owner"
+
+
+def test_projection_keeps_cursor_keys():
+    assert fields_projection(["id", "make"], [("created_at", 1), ("id", 1)]) == {
+        "_id": 0, "id": 1, "make": 1, "created_at": 1
+    }
+
+
+def test_partial_model_is_cached_and_shapes_trusted_output():
+    fields = select_fields(Vehicle, ["make"])
+    model = partial_model(Vehicle, fields)
+    assert partial_model(Vehicle, fields) is model
+    body = dump_trusted(model, [{"id": "v1", "make": "Volvo", "created_at": "2026-01-01T00:00:00+00:00"}])
+    assert orjson.loads(body) == [{"id": "v1", "make": "Volvo"}]
@@ -0,0 +1,124 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import geofences
+from geofences import CompiledFence, FenceIndex, GeofenceEngine, polygon_geometry
+from models import Coordinate
+
+
+def fence_doc(fence_id, points):
+    geometry, bbox = polygon_geometry([Coordinate(latitude=lat, longitude=lng) for lat, lng in points])
+    return {"id": fence_id, "name": fence_id.upper(), "geometry": geometry, "bbox": bbox}
+
+
+def square(fence_id, lat, lng, size):
+    return fence_doc(fence_id, [(lat, lng), (lat, lng + size), (lat + size, lng + size), (lat + size, lng)])
+
+
+def test_polygon_geometry_closes_the_ring():
+    doc = fence_doc("f", [(0, 0), (0, 1), (1, 0)])
+    assert doc["geometry"]["coordinates"][0] == [[0, 0], [1, 0], [0, 1], [0, 0]]
+    assert doc["bbox"] == [0, 0, 1, 1]
+
+
+def test_contains_concave_polygon():
+    # An L shape: the notch at the top right is outside
+    fence = CompiledFence(fence_doc("l", [(0, 0), (0, 2), (1, 2), (1, 1), (2, 1), (2, 0)]))
+    assert fence.contains(0.5, 0.5)
+    assert fence.contains(1.5, 0.5)
+    assert fence.contains(0.5, 1.5)
+    assert not fence.contains(1.5, 1.5)
+    assert not fence.contains(3, 0.5)
+
+
+def test_index_matches_brute_force_on_and_around_cell_edges():
+    docs = [
+        square("aligned", 0.02, 0.02, 0.03),     # bbox edges fall on cell boundaries
+        square("small", 0.031, 0.047, 0.002),   # inside a single cell
+        square("spanning", 0.005, 0.005, 0.1),  # spans many cells
+        fence_doc("triangle", [(0.0, 0.0), (0.0, 0.05), (0.05, 0.0)]),
+    ]
+    index = FenceIndex(docs, cell_size=0.01)
+    fences = [CompiledFence(doc) for doc in docs]
+    rng = random.Random(3)
+    points = [(i * 0.005, j * 0.005) for i in range(-2, 25) for j in range(-2, 25)]
+    points += [(rng.uniform(-0.01, 0.12), rng.uniform(-0.01, 0.12)) for _ in range(2000)]
+    for lat, lng in points:
+        expected = {fence.id for fence in fences if fence.contains(lng, lat)}
+        assert {fence.id for fence in index.containing(lat, lng)} == expected, (lat, lng)
+
+
+def test_fences_over_the_cell_limit_are_checked_by_bounding_box(monkeypatch):
+    monkeypatch.setattr(geofences, "GEOFENCE_MAX_CELLS", 4)
+    index = FenceIndex([square("large", 0, 0, 0.1), square("small", 0.001, 0.001, 0.005)], cell_size=0.01)
+    assert [fence.id for fence in index.large] == ["large"]
+    assert {fence.id for fence in index.containing(0.05, 0.05)} == {"large"}
+    assert {fence.id for fence in index.containing(0.002, 0.002)} == {"large", "small"}
+
+
+class UpdateResult:
+    modified_count = 1
+
+
+class FakeVehicles:
+    def __init__(self, doc):
+        self.doc = doc
+
+    async def find_one(self, query, projection=None):
+        return dict(self.doc)
+
+    async def update_one(self, query, update):
+        self.doc.update(update["$set"])
+        return UpdateResult()
+
+
+class FakeEvents:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+
+class FakeDB(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+class Fix:
+    def __init__(self, timestamp, latitude, longitude):
+        self.timestamp, self.latitude, self.longitude = timestamp, latitude, longitude
+
+
+@pytest.fixture
+def engine():
+    engine = GeofenceEngine()
+    engine._indexes.set("c1", FenceIndex([square("site", 0, 0, 1)]))
+    return engine
+
+
+def test_evaluate_compares_offset_fixes_in_utc(engine):
+    vehicles = FakeVehicles({"geofence_ids": [], "geofence_checked_at": "2026-01-01T10:00:00+00:00"})
+    db = FakeDB(vehicles=vehicles, geofence_events=FakeEvents())
+    plus3 = timezone(timedelta(hours=3))
+    # 12:30+03:00 is 09:30Z, before the checkpoint, although its ISO string sorts after it
+    late = Fix(datetime(2026, 1, 1, 12, 30, tzinfo=plus3), 0.5, 0.5)
+    assert asyncio.run(engine.evaluate(db, "c1", "v1", None, [late])) == []
+    fresh = Fix(datetime(2026, 1, 1, 13, 30, tzinfo=plus3), 0.5, 0.5)
+    events = asyncio.run(engine.evaluate(db, "c1", "v1", "d1", [fresh]))
+    assert [(event["event"], event["geofence_name"]) for event in events] == [("enter", "SITE")]
+    assert vehicles.doc["geofence_checked_at"] == "2026-01-01T10:30:00+00:00"
+    assert vehicles.doc["geofence_ids"] == ["site"]
+
+
+def test_evaluate_orders_fixes_by_time(engine):
+    vehicles = FakeVehicles({"geofence_ids": [], "geofence_checked_at": None})
+    db = FakeDB(vehicles=vehicles, geofence_events=FakeEvents())
+    at = datetime(2026, 1, 1, 10, tzinfo=timezone.utc)
+    fixes = [Fix(at + timedelta(minutes=2), 2, 2), Fix(at, 0.5, 0.5), Fix(at + timedelta(minutes=1), 0.6, 0.6)]
+    events = asyncio.run(engine.evaluate(db, "c1", "v1", None, fixes))
+    assert [event["event"] for event in events] == ["enter", "exit"]
+    assert vehicles.doc["geofence_ids"] == []
@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from org_tree import build_tree, move_department, rebuild_department_paths
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for field, value in query.items():
+        stored = doc.get(field)
+        if isinstance(stored, list) and not isinstance(value, list):
+            if value not in stored:
+                return False
+        elif stored != value:
+            return False
+    return True
+
+
+def project(doc: dict, projection) -> dict:
+    doc = {key: value for key, value in doc.items() if key != "_id"}
+    fields = [field for field, include in (projection or {}).items() if include and field != "_id"]
+    return {field: doc[field] for field in fields if field in doc} if fields else doc
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        async def iterate():
+            for doc in self.docs:
+                yield doc
+        return iterate()
+
+    async def to_list(self, length):
+        return list(self.docs)
+
+
+class Collection:
+    def __init__(self, docs=()):
+        self.docs = [dict(doc) for doc in docs]
+
+    async def find_one(self, query, projection=None):
+        for doc in self.docs:
+            if matches(doc, query):
+                return project(doc, projection)
+        return None
+
+    def find(self, query, projection=None):
+        return Cursor([project(doc, projection) for doc in self.docs if matches(doc, query)])
+
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if matches(doc, query):
+                for field, value in update.get("$set", {}).items():
+                    doc[field] = value
+                for field, value in update.get("$inc", {}).items():
+                    doc[field] = doc.get(field, 0) + value
+                return
+
+    async def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            await self.update_one(operation._filter, operation._doc)
+
+
+class FakeDB:
+    def __init__(self, departments):
+        self.departments = Collection(departments)
+        self.companies = Collection([{"id": "c1", "department_tree_version": 0}])
+
+
+def department(department_id, code, parent=None):
+    return {"id": department_id, "company_id": "c1", "code": code, "parent_department_id": parent, "is_active": True}
+
+
+def org_chart():
+    """OPS > (QRY > CRS), FIN"""
+    return [
+        department("ops", "OPS"),
+        department("qry", "QRY", "ops"),
+        department("crs", "CRS", "qry"),
+        department("fin", "FIN"),
+    ]
+
+
+def by_id(db):
+    return {doc["id"]: doc for doc in db.departments.docs}
+
+
+def test_rebuild_computes_ancestors_paths_and_levels():
+    db = FakeDB(org_chart())
+    assert asyncio.run(rebuild_department_paths(db, "c1")) == 4
+    departments = by_id(db)
+    assert departments["crs"]["ancestor_ids"] == ["ops", "qry"]
+    assert departments["crs"]["path"] == "OPS/QRY/CRS"
+    assert departments["crs"]["level"] == 3
+    assert departments["fin"]["path"] == "FIN"
+    assert db.companies.docs[0]["department_tree_version"] == 1
+
+
+def test_rebuild_stops_at_cycles():
+    db = FakeDB([department("a", "A", "b"), department("b", "B", "a")])
+    asyncio.run(rebuild_department_paths(db, "c1"))
+    assert by_id(db)["a"]["path"] == "B/A"
+    assert by_id(db)["b"]["path"] == "A/B"
+
+
+def test_move_rewrites_the_subtree():
+    db = FakeDB(org_chart())
+    asyncio.run(rebuild_department_paths(db, "c1"))
+    moved = asyncio.run(move_department(db, "c1", "qry", "fin"))
+    assert moved["path"] == "FIN/QRY"
+    crs = by_id(db)["crs"]
+    assert crs["ancestor_ids"] == ["fin", "qry"]
+    assert crs["path"] == "FIN/QRY/CRS"
+    assert crs["level"] == 3
+    # The move bumps the version again so cached trees are dropped
+    assert db.companies.docs[0]["department_tree_version"] == 2
+
+    asyncio.run(move_department(db, "c1", "qry", None))
+    crs = by_id(db)["crs"]
+    assert (crs["ancestor_ids"], crs["path"], crs["level"]) == (["qry"], "QRY/CRS", 2)
+
+
+@pytest.mark.parametrize("department_id, parent_id", [("qry", "qry"), ("ops", "crs")])
+def test_move_rejects_cycles(department_id, parent_id):
+    db = FakeDB(org_chart())
+    asyncio.run(rebuild_department_paths(db, "c1"))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(move_department(db, "c1", department_id, parent_id))
+    assert error.value.status_code == 400
+
+
+def test_build_tree_nests_children_and_drops_orphans():
+    db = FakeDB(org_chart() + [department("lost", "LST", "inactive-parent")])
+    asyncio.run(rebuild_department_paths(db, "c1"))
+    tree = build_tree(db.departments.docs)
+    assert [node["id"] for node in tree] == ["fin", "ops"]
+    ops = tree[1]
+    assert [child["id"] for child in ops["children"]] == ["qry"]
+    assert [child["id"] for child in ops["children"][0]["children"]] == ["crs"]
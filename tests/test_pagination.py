@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from pagination import encode_cursor, decode_cursor, keyset_filter, normalize_sort
+
+
+def matches(doc: dict, query: dict) -> bool:
+    """Evaluate the subset of MongoDB query operators keyset_filter emits"""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, branch) for branch in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = doc.get(key)
+            for op, operand in condition.items():
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$exists" and (key in doc) != operand:
+                    return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+def paginate(docs, sort_keys, limit):
+    """Walk every page the way fetch_page does and return the ids in order"""
+    def sort_key(doc):
+        # MongoDB puts nulls first in ascending order
+        return tuple((doc.get(field) is not None, doc.get(field) or 0) for field, _ in sort_keys)
+    ordered = sorted(docs, key=sort_key, reverse=sort_keys[0][1] == -1)
+    seen, cursor = [], None
+    while True:
+        remaining = ordered
+        if cursor is not None:
+            values = decode_cursor(cursor, len(sort_keys))
+            remaining = [doc for doc in ordered if matches(doc, keyset_filter(sort_keys, values))]
+        page = remaining[:limit]
+        seen.extend(doc["id"] for doc in page)
+        if len(remaining) <= limit:
+            return seen
+        cursor = encode_cursor([page[-1].get(field) for field, _ in sort_keys])
+
+
+def test_cursor_round_trip_keeps_datetimes_and_strings():
+    at = datetime(2026, 3, 1, 8, 30, tzinfo=timezone.utc)
+    cursor = encode_cursor([at, "b-42"])
+    assert "=" not in cursor
+    assert decode_cursor(cursor, 2) == [at, "b-42"]
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor(["only-one"]), encode_cursor({"a": 1})])
+def test_decode_cursor_rejects_malformed_cursors(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, 2)
+    assert error.value.status_code == 400
+
+
+def test_normalize_sort_appends_id_tie_breaker_in_sort_direction():
+    assert normalize_sort("created_at", -1) == [("created_at", -1), ("id", -1)]
+    assert normalize_sort([("id", 1)]) == [("id", 1)]
+
+
+def test_keyset_filter_breaks_ties_on_id():
+    sort_keys = normalize_sort("created_at")
+    assert keyset_filter(sort_keys, [5, "b"]) == {"$or": [
+        {"created_at": {"$gt": 5}},
+        {"$and": [{"created_at": 5}, {"id": {"$gt": "b"}}]},
+    ]}
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+def test_pages_cover_tied_records_exactly_once(direction):
+    docs = [{"id": f"{i:02d}", "created_at": i // 4} for i in range(15)]
+    sort_keys = normalize_sort("created_at", direction)
+    ids = paginate(docs, sort_keys, limit=3)
+    assert sorted(ids) == [doc["id"] for doc in docs]
+    assert len(ids) == len(set(ids))
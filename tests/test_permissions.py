@@ -0,0 +1,41 @@
+import pytest
+
+from models import ROLE_PERMISSIONS, ROLE_PERMISSION_MATRIX, User, UserRole, compile_role_permissions
+
+RESOURCES = sorted({resource for permissions in ROLE_PERMISSIONS.values() for resource in permissions} | {"unknown"})
+ACTIONS = sorted({action for permissions in ROLE_PERMISSIONS.values()
+                  for actions in permissions.values() for action in actions} | {"unknown"})
+
+
+def dict_lookup(role: UserRole, resource: str, action: str) -> bool:
+    """The permission check as it was before the bitmaps"""
+    if role == UserRole.SUPERADMIN:
+        return True
+    return action in ROLE_PERMISSIONS.get(role, {}).get(resource, [])
+
+
+def make_user(role: UserRole) -> User:
+    return User(username="u", email="u@example.com", full_name="U", role=role)
+
+
+@pytest.mark.parametrize("role", list(UserRole))
+def test_bitmaps_agree_with_dict_lookup(role):
+    user = make_user(role)
+    pairs = [(resource, action) for resource in RESOURCES for action in ACTIONS]
+    expected = [dict_lookup(role, resource, action) for resource, action in pairs]
+    assert [user.has_permission(resource, action) for resource, action in pairs] == expected
+    assert user.has_permissions(pairs) == expected
+
+
+def test_compile_shares_bits_between_roles():
+    bits, masks, matrix = compile_role_permissions({
+        UserRole.OWNER: {"vehicles": ["read", "update"]},
+        UserRole.DRIVER: {"vehicles": ["read"], "attendance": ["create"]},
+    })
+    assert bits == {"vehicles": {"read": 1, "update": 2}, "attendance": {"create": 4}}
+    assert masks == {UserRole.OWNER: 3, UserRole.DRIVER: 5}
+    assert matrix[UserRole.DRIVER] == {"vehicles": ["read"], "attendance": ["create"]}
+
+
+def test_matrix_matches_role_permissions():
+    assert ROLE_PERMISSION_MATRIX == {role: dict(permissions) for role, permissions in ROLE_PERMISSIONS.items()}
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+
+import orjson
+import pytest
+
+from models import Invoice
+from responses import dump_trusted, list_adapter
+
+
+def validated(model, docs) -> bytes:
+    adapter = list_adapter(model)
+    return adapter.dump_json(adapter.validate_python(docs))
+
+
+INVOICE = {
+    "id": "inv-1",
+    "company_id": "c1",
+    "invoice_number": "INV-1",
+    "type": "SALE",
+    "client_name": "Client",
+    "amount": 10.5,
+    "created_at": "2026-03-01T08:30:00+00:00",
+    "updated_at": "2026-03-01T08:30:00.250000+00:00",
+}
+
+
+@pytest.mark.parametrize("date", [
+    "2026-03-01T08:30:00+00:00",
+    "2026-03-01T08:30:00.123456+03:00",
+    "2026-03-01T08:30:00",
+    datetime(2026, 3, 1, 8, 30, tzinfo=timezone.utc),
+])
+def test_datetimes_encode_like_the_validated_path(date):
+    docs = [{**INVOICE, "date": date, "due_date": date}]
+    assert dump_trusted(Invoice, docs) == validated(Invoice, docs)
+
+
+def test_int_floats_and_missing_fields_encode_like_the_validated_path():
+    docs = [{**INVOICE, "date": INVOICE["created_at"], "amount": 100, "quantity": 2, "vat_amount": None}]
+    assert dump_trusted(Invoice, docs) == validated(Invoice, docs)
+    row = orjson.loads(dump_trusted(Invoice, docs))[0]
+    assert row["amount"] == 100.0
+    assert row["status"] == "DRAFT"
+
+
+def test_extra_stored_fields_are_dropped():
+    docs = [{**INVOICE, "date": INVOICE["created_at"], "amount": 1.5, "_internal": "x"}]
+    assert "_internal" not in orjson.loads(dump_trusted(Invoice, docs))[0]
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from rollups import TOTAL, _increments, bucket_avg, month_of, previous_year_month, rollup_operations
+
+
+@pytest.mark.parametrize("value, month", [
+    ("2026-02-01T01:00:00+03:00", "2026-01"),
+    ("2026-01-31T23:30:00-02:00", "2026-02"),
+    ("2026-02-01T00:00:00", "2026-02"),
+    ("2026-02-01", "2026-02"),
+    (datetime(2026, 2, 1, 1, tzinfo=timezone(timedelta(hours=3))), "2026-01"),
+    (datetime(2026, 2, 1), "2026-02"),
+    (None, None),
+    ("not a date", None),
+])
+def test_month_of_buckets_by_utc_month(value, month):
+    assert month_of(value) == month
+
+
+def test_previous_year_month():
+    assert previous_year_month("2026-03") == "2025-03"
+    assert previous_year_month(None) is None
+
+
+def test_increments_cover_total_and_dimension_buckets():
+    doc = {"date": "2026-03-05T10:00:00+00:00", "category": "fuel", "amount": 40}
+    increments = _increments("expenses", "c1", doc)
+    assert increments == [
+        ({"company_id": "c1", "source": "expenses", "month": "2026-03", "dimension": TOTAL, "key": None},
+         {"count": 1, "sums.amount": 40, "counts.amount": 1}),
+        ({"company_id": "c1", "source": "expenses", "month": "2026-03", "dimension": "category", "key": "fuel"},
+         {"count": 1, "sums.amount": 40, "counts.amount": 1}),
+    ]
+
+
+def test_increments_skip_non_numeric_fields_and_undated_docs():
+    doc = {"date": "2026-03-05T10:00:00+00:00", "status": "PAID", "amount": 10, "vat_amount": None,
+           "total_amount": True}
+    inc = _increments("invoices", "c1", doc)[0][1]
+    assert inc == {"count": 1, "sums.amount": 10, "counts.amount": 1}
+    assert _increments("invoices", "c1", {"amount": 10}) == []
+
+
+def test_rollup_operations_merge_rows_per_bucket_and_month():
+    docs = [
+        {"date": "2026-03-01T00:00:00+00:00", "category": "fuel", "amount": 10},
+        {"date": "2026-03-31T23:00:00+00:00", "category": "fuel", "amount": 5},
+        {"date": "2026-04-01T01:00:00+03:00", "category": "tyres", "amount": 7},
+    ]
+    operations = {
+        (op._filter["month"], op._filter["dimension"], op._filter["key"]): op._doc["$inc"]
+        for op in rollup_operations("expenses", "c1", docs)
+    }
+    assert operations == {
+        ("2026-03", TOTAL, None): {"count": 3, "sums.amount": 22, "counts.amount": 3},
+        ("2026-03", "category", "fuel"): {"count": 2, "sums.amount": 15, "counts.amount": 2},
+        ("2026-03", "category", "tyres"): {"count": 1, "sums.amount": 7, "counts.amount": 1},
+    }
+
+
+def test_removal_negates_increments():
+    doc = {"date": "2026-03-01T00:00:00+00:00", "category": "fuel", "amount": 10}
+    operation = rollup_operations("expenses", "c1", [doc], sign=-1)[0]
+    assert operation._doc["$inc"] == {"count": -1, "sums.amount": -10, "counts.amount": -1}
+
+
+def test_bucket_avg_uses_per_field_counts():
+    assert bucket_avg({"sums": {"amount": 30}, "counts": {"amount": 2}}, "amount") == 15
+    assert bucket_avg(None, "amount") == 0
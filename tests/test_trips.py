@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from trips import MEAN_EARTH_RADIUS_M, Track, douglas_peucker, haversine_m, segment_trips, simplify_track
+
+START = datetime(2026, 3, 1, 6, 0, tzinfo=timezone.utc)
+
+
+def make_track(lngs, speeds, step_s=60, gaps=None):
+    """Fixes along the equator every step_s seconds; gaps adds extra seconds before given indexes"""
+    offsets, elapsed = [], 0
+    for i in range(len(lngs)):
+        elapsed += (gaps or {}).get(i, 0)
+        offsets.append(elapsed)
+        elapsed += step_s
+    return Track([START + timedelta(seconds=s) for s in offsets], [0.0] * len(lngs), lngs, speeds)
+
+
+def stop_drive_stop(moving_fixes=10, step_deg=0.01):
+    lngs = [0.0] * 10 + [step_deg * (i + 1) for i in range(moving_fixes)]
+    lngs += [step_deg * (moving_fixes + 1)] * 10
+    speeds = [0] * 10 + [60] * moving_fixes + [0] * 10
+    return make_track(lngs, speeds)
+
+
+def test_trip_runs_from_last_stop_fix_to_first_stop_fix():
+    track = stop_drive_stop()
+    result = segment_trips(track)
+    assert len(result["stops"]) == 2
+    [trip] = result["trips"]
+    assert trip["start_time"] == track.timestamps[9]
+    assert trip["end_time"] == track.timestamps[20]
+    assert trip["point_count"] == 12
+    assert trip["duration_s"] == 660
+    assert trip["distance_m"] == pytest.approx(float(haversine_m(0, 0, 0, 0.11)), abs=0.1)
+    assert trip["max_speed_kmh"] == 60
+
+
+def test_long_gap_splits_a_trip():
+    lngs = [0.01 * i for i in range(20)]
+    track = make_track(lngs, [60] * 20, gaps={10: 2000})
+    trips = segment_trips(track)["trips"]
+    assert [trip["point_count"] for trip in trips] == [10, 10]
+
+
+def test_short_stops_and_drift_are_not_reported():
+    # A two-minute halt does not end the trip
+    lngs = [0.01 * i for i in range(5)] + [0.04] * 2 + [0.04 + 0.01 * i for i in range(1, 5)]
+    speeds = [60] * 5 + [0] * 2 + [60] * 4
+    result = segment_trips(make_track(lngs, speeds))
+    assert result["stops"] == []
+    assert len(result["trips"]) == 1
+    # Yard drift below TRIP_MIN_DISTANCE_M is not a trip
+    drift = make_track([0.0, 0.0001, 0.0002, 0.0001], [10] * 4)
+    assert segment_trips(drift)["trips"] == []
+
+
+def test_missing_speeds_are_derived_from_positions():
+    track = make_track([0.0, 0.01], [None, None])
+    assert track.speed_kmh[1] == pytest.approx(float(haversine_m(0, 0, 0, 0.01)) / 60 * 3.6)
+
+
+def reference_douglas_peucker(x, y, tolerance, start, end, keep):
+    """Textbook recursive Douglas-Peucker on a plane"""
+    keep.add(start)
+    keep.add(end)
+    if end - start < 2:
+        return
+    dx, dy = x[end] - x[start], y[end] - y[start]
+    length = np.hypot(dx, dy)
+    distances = [
+        np.hypot(x[i] - x[start], y[i] - y[start]) if length == 0
+        else abs(dx * (y[i] - y[start]) - dy * (x[i] - x[start])) / length
+        for i in range(start + 1, end)
+    ]
+    farthest = int(np.argmax(distances))
+    if distances[farthest] > tolerance:
+        index = start + 1 + farthest
+        reference_douglas_peucker(x, y, tolerance, start, index, keep)
+        reference_douglas_peucker(x, y, tolerance, index, end, keep)
+
+
+def test_douglas_peucker_drops_collinear_points_and_keeps_spikes():
+    lat = np.zeros(11)
+    lng = np.linspace(0, 0.01, 11)
+    assert douglas_peucker(lat, lng, 1.0).tolist() == [0, 10]
+    lat[5] = 0.001  # about 111 m off the line
+    assert douglas_peucker(lat, lng, 100.0).tolist() == [0, 5, 10]
+    assert douglas_peucker(lat, lng, 500.0).tolist() == [0, 10]
+
+
+def test_douglas_peucker_matches_recursive_reference():
+    rng = np.random.default_rng(7)
+    lat = 31.9 + np.cumsum(rng.normal(0, 0.0005, 400))
+    lng = 35.9 + np.cumsum(rng.normal(0, 0.0005, 400))
+    origin = np.radians(lat.mean())
+    x = np.radians(lng) * np.cos(origin) * MEAN_EARTH_RADIUS_M
+    y = np.radians(lat) * MEAN_EARTH_RADIUS_M
+    expected = set()
+    reference_douglas_peucker(x, y, 25.0, 0, len(lat) - 1, expected)
+    assert douglas_peucker(lat, lng, 25.0).tolist() == sorted(expected)
+
+
+def test_simplify_track_keeps_timestamps_of_kept_points():
+    track = stop_drive_stop()
+    simplified = simplify_track(track, 10.0)
+    assert simplified["original_points"] == 30
+    assert simplified["points"][0] == [0.0, 0.0, track.timestamps[0]]
+    assert simplified["points"][-1][2] == track.timestamps[-1]